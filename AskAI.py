@@ -1,59 +1,172 @@
 # xbase_ai.py
-# pip install python-dotenv langchain-openai langchain-core langchain-community faiss-cpu
+# pip install python-dotenv langchain-openai langchain-core langchain-community faiss-cpu httpx
 
 import os, traceback
+import json
+import time
+import asyncio
+import contextvars
+import concurrent.futures
 from dotenv import load_dotenv
 import requests
+import httpx
 
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableParallel
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.messages import ToolMessage
-from langchain_community.vectorstores import FAISS
-
-from RunSQL import run_sql
+from langchain_core.messages import AIMessage, ToolMessage, messages_to_dict, messages_from_dict
+
+from LLMBackend import get_chat_model, chat_model_id
+from RunSQL import run_sql_limited, run_sql_limited_async
+from RunnerPool import execute_code, execute_code_sync, RunnerUnavailable
+from RAGIndex import retrieve_context
+from LLMCache import create_llm_cache, make_key
+from ChatHistory import HistoryManager
+from DataContext import (
+    build_data_context, abuild_data_context, invalidate_schema, is_ddl, bucket_url_from_db_info,
+)
+import CSVSQL
+from Timing import phase
+from Tracing import span, record_span, current_traceparent
+from Metrics import LLM_REQUESTS, LLM_SECONDS
+from ToolOutput import (
+    AI_SQL_CLIENT_ROW_CAP, AI_SQL_STATEMENT_TIMEOUT_MS,
+    shape_tool_output, client_sql_rows,
+)
 
 # --------------------------------------------------
 # Load environment
 # --------------------------------------------------
 load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY missing")
 
 # --------------------------------------------------
-# Load RAG documents
+# Chat model (LLM_BACKEND=openai | fake, see LLMBackend.py)
 # --------------------------------------------------
-with open("SQL_documentation.txt", "r", encoding="utf-8") as f:
-    SQL_RAG_TEXT = f.read()
-
-with open("CSV_documentation.txt", "r", encoding="utf-8") as f:
-    CSV_RAG_TEXT = f.read()
+# Created on first use, so importing this module needs neither
+# OPENAI_API_KEY nor network access.
+_chat_llm = None
+_llm_chain = None
 
-emb = OpenAIEmbeddings(openai_api_key=api_key)
-chat_llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
 
-sql_vecstore = FAISS.from_texts([SQL_RAG_TEXT], emb)
-csv_vecstore = FAISS.from_texts([CSV_RAG_TEXT], emb)
+def get_chat_llm():
+    global _chat_llm
+    if _chat_llm is None:
+        _chat_llm = get_chat_model()
+    return _chat_llm
 
-sql_retriever = sql_vecstore.as_retriever(search_kwargs={"k": 3})
-csv_retriever = csv_vecstore.as_retriever(search_kwargs={"k": 3})
+# --------------------------------------------------
+# RAG retrievers
+# --------------------------------------------------
+# Built offline with `python RAGIndex.py build` and loaded lazily on the
+# first /ask_ai call (see RAGIndex.py) instead of embedding at import time.
+# Only the doc sections relevant to the question are put in the prompt,
+# capped at RAG_TOKEN_BUDGET tokens.
 
 # --------------------------------------------------
 # Tools
 # --------------------------------------------------
-@tool
-def Run_Python(bucket_url: str, input: str, image_box: list[str] | None = None) -> dict:
-    """Execute Python via external runner API."""
+# Each tool has a sync implementation (CLI / sync Ask_AI) and an async one
+# (Ask_AI_async, used by /ask_ai) so waiting on I/O never holds a thread.
+# Run_Python executes on the local runner pool (RunnerPool.py), the same path
+# /run uses. RUNNER_REMOTE_URL (e.g. https://pythonbackend-xbase.onrender.com/run)
+# is only used as a fallback when the local runner can't start
+# (RunnerUnavailable), or always when RUNNER_MODE=remote. A timeout or an
+# error in the user's code is the answer, not a reason to run it again.
+RUNNER_MODE = os.getenv("RUNNER_MODE", "local")   # local | remote
+RUNNER_REMOTE_URL = os.getenv("RUNNER_REMOTE_URL")
+RUNNER_TIMEOUT = 30
+
+# Monotonic deadline of the tool batch a call belongs to (run_tool_calls*).
+# Runner and SQL timeouts are cut to what is left of it, so a call that has
+# already timed out for the model stops soon after, freeing its worker.
+_tool_deadline = contextvars.ContextVar("tool_deadline", default=None)
+
+
+def _time_left(limit: float) -> float:
+    """`limit` seconds, or less if the tool batch's deadline comes first."""
+    deadline = _tool_deadline.get()
+    if deadline is None:
+        return limit
+    return max(0.001, min(limit, deadline - time.monotonic()))
+
+
+def _sql_timeout_ms() -> int:
+    # never 0: statement_timeout = 0 means no timeout
+    return max(1, int(_time_left(AI_SQL_STATEMENT_TIMEOUT_MS / 1000) * 1000))
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP client (keeps connections to the remote runner alive)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=RUNNER_TIMEOUT)
+    return _http_client
+
+
+def _trace_headers() -> dict:
+    """traceparent for the remote runner, so its spans join this trace."""
+    traceparent = current_traceparent()
+    return {"traceparent": traceparent} if traceparent else {}
+
+
+def _run_python_remote(bucket_url: str, code: str) -> dict:
+    resp = requests.post(
+        RUNNER_REMOTE_URL,
+        json={"code": code, "bucket_url": bucket_url},
+        headers=_trace_headers(),
+        timeout=_time_left(RUNNER_TIMEOUT),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _arun_python_remote(bucket_url: str, code: str) -> dict:
+    resp = await get_http_client().post(
+        RUNNER_REMOTE_URL,
+        json={"code": code, "bucket_url": bucket_url},
+        headers=_trace_headers(),
+        timeout=_time_left(RUNNER_TIMEOUT),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _run_python(bucket_url: str, input: str, image_box: list[str] | None = None) -> dict:
+    """Execute Python on the runner with the CSV loaded as `df`."""
     try:
-        resp = requests.post(
-            "https://pythonbackend-xbase.onrender.com/run",
-            json={"code": input, "bucket_url": bucket_url},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        if RUNNER_MODE == "remote":
+            data = _run_python_remote(bucket_url, input)
+        else:
+            try:
+                data = execute_code_sync(input, bucket_url, timeout=_time_left(RUNNER_TIMEOUT))
+            except RunnerUnavailable:
+                if not RUNNER_REMOTE_URL:
+                    raise
+                data = _run_python_remote(bucket_url, input)
+
+        images = data.get("images", [])
+        if isinstance(image_box, list):
+            image_box.extend(images)
+        return data
+    except Exception as e:
+        return {"output": None, "error": str(e), "images": [], "bucket_url": bucket_url}
+
+
+async def _arun_python(bucket_url: str, input: str, image_box: list[str] | None = None) -> dict:
+    """Execute Python on the runner with the CSV loaded as `df`."""
+    try:
+        if RUNNER_MODE == "remote":
+            data = await _arun_python_remote(bucket_url, input)
+        else:
+            try:
+                data = await execute_code(input, bucket_url, timeout=_time_left(RUNNER_TIMEOUT))
+            except RunnerUnavailable:
+                if not RUNNER_REMOTE_URL:
+                    raise
+                data = await _arun_python_remote(bucket_url, input)
+
         images = data.get("images", [])
         if isinstance(image_box, list):
             image_box.extend(images)
@@ -62,37 +175,124 @@ def Run_Python(bucket_url: str, input: str, image_box: list[str] | None = None)
         return {"output": None, "error": str(e), "images": [], "bucket_url": bucket_url}
 
 
-@tool
-def Run_SQL(parent_id: str, input: str):
-    """Run SQL query inside schema."""
+def _run_sql(parent_id: str, input: str, bucket_url: str = ""):
+    """Run SQL query inside schema (or on the CSV dataset as table `df`)."""
+    if bucket_url:
+        try:
+            with phase("sql", **{"db.engine": "duckdb"}):
+                res = CSVSQL.run_sql_limited(
+                    bucket_url, input,
+                    max_rows=AI_SQL_CLIENT_ROW_CAP,
+                    statement_timeout_ms=_sql_timeout_ms(),
+                    tag="ai",
+                )
+            return "Query executed" if res is None else res
+        except Exception:
+            return "SQL error:\n" + traceback.format_exc()
+
     schema = "schema" + parent_id.replace("-", "_")
     try:
-        run_sql(f"CREATE SCHEMA IF NOT EXISTS {schema}")
-        run_sql(f"SET search_path TO {schema}")
-        res = run_sql(input)
+        with phase("sql"):
+            res = run_sql_limited(
+                input,
+                schema=schema,
+                max_rows=AI_SQL_CLIENT_ROW_CAP,
+                statement_timeout_ms=_sql_timeout_ms(),
+                tag="ai",
+            )
+        if is_ddl(input):
+            invalidate_schema(parent_id)
         if res is None:
             return "Query executed"
-        return [list(r) for r in res]
+        return res
     except Exception:
         return "SQL error:\n" + traceback.format_exc()
 
 
+async def _arun_sql(parent_id: str, input: str, bucket_url: str = ""):
+    """Run SQL query inside schema (or on the CSV dataset as table `df`)."""
+    if bucket_url:
+        try:
+            with phase("sql", **{"db.engine": "duckdb"}):
+                res = await asyncio.to_thread(
+                    CSVSQL.run_sql_limited,
+                    bucket_url, input,
+                    max_rows=AI_SQL_CLIENT_ROW_CAP,
+                    statement_timeout_ms=_sql_timeout_ms(),
+                    tag="ai",
+                )
+            return "Query executed" if res is None else res
+        except Exception:
+            return "SQL error:\n" + traceback.format_exc()
+
+    schema = "schema" + parent_id.replace("-", "_")
+    try:
+        with phase("sql"):
+            res = await run_sql_limited_async(
+                input,
+                schema=schema,
+                max_rows=AI_SQL_CLIENT_ROW_CAP,
+                statement_timeout_ms=_sql_timeout_ms(),
+                tag="ai",
+            )
+        if is_ddl(input):
+            invalidate_schema(parent_id)
+        if res is None:
+            return "Query executed"
+        return res
+    except Exception:
+        return "SQL error:\n" + traceback.format_exc()
+
+
+Run_Python = StructuredTool.from_function(
+    func=_run_python,
+    coroutine=_arun_python,
+    name="Run_Python",
+    description="Execute Python on the runner with the CSV loaded as `df`.",
+)
+
+Run_SQL = StructuredTool.from_function(
+    func=_run_sql,
+    coroutine=_arun_sql,
+    name="Run_SQL",
+    description="Run SQL query inside schema, or on a CSV dataset as the table `df`.",
+)
+
+
 TOOLS = [Run_Python, Run_SQL]
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
 
 # --------------------------------------------------
 # Prompt
 # --------------------------------------------------
+# With CSV_SQL=on (CSVSQL.py) CSV datasets can also be queried with SQL
+# (DuckDB, table `df`); the server fills in Run_SQL's bucket_url.
+if CSVSQL.CSV_SQL == "on":
+    CSV_RULE = (
+        "1) If db_info starts with 'CSV:', this is a CSV dataset, NOT the SQL database.\n"
+        "   - For filtering, aggregation and counts, prefer SQL with Run_SQL:\n"
+        "     the dataset is the read-only table `df` (DuckDB SQL dialect)\n"
+        "   - For charts or pandas-specific work, use Python with Run_Python on DataFrame `df`\n"
+        "   - Never write to the dataset with SQL\n\n"
+    )
+else:
+    CSV_RULE = (
+        "1) If db_info starts with 'CSV:', this is NOT a SQL database.\n"
+        "   - NEVER generate SQL\n"
+        "   - ONLY generate Python using pandas DataFrame `df`\n"
+        "   - ALWAYS use Run_Python\n\n"
+    )
+
 prompt = ChatPromptTemplate.from_messages([
     (
         "system",
         "You are XBase AI.\n\n"
         "DATABASE INFO:\n{db_info}\n\n"
+        "SCHEMA / DATASET (auto-detected; use it instead of querying for columns):\n"
+        "{data_context}\n\n"
 
         "ABSOLUTE RULES:\n"
-        "1) If db_info starts with 'CSV:', this is NOT a SQL database.\n"
-        "   - NEVER generate SQL\n"
-        "   - ONLY generate Python using pandas DataFrame `df`\n"
-        "   - ALWAYS use Run_Python\n\n"
+        + CSV_RULE +
 
         "2) If db_info starts with 'SQL:', this IS a SQL database.\n"
         "   - Use SQL\n"
@@ -118,35 +318,375 @@ prompt = ChatPromptTemplate.from_messages([
 # --------------------------------------------------
 # Build agent with CONDITIONAL RAG
 # --------------------------------------------------
-def build_chat_agent():
-    retrieval = RunnableParallel({
+def build_retrieval():
+    return RunnableParallel({
         "context": lambda x: (
-            sql_retriever.invoke(x["input"])
+            retrieve_context("sql", x["input"])
             if x["db_info"].startswith("SQL")
-            else csv_retriever.invoke(x["input"])
+            else retrieve_context("csv", x["input"])
             if x["db_info"].startswith("CSV")
             else ""
         ),
         "input": lambda x: x["input"],
         "db_info": lambda x: x["db_info"],
+        "data_context": lambda x: x.get("data_context") or "(not available)",
         "chat_history": lambda x: x.get("chat_history", []),
         "agent_scratchpad": lambda x: x.get("agent_scratchpad", []),
     })
 
-    return retrieval | prompt | chat_llm.bind_tools(TOOLS, tool_choice="auto")
+
+def get_llm_chain():
+    global _llm_chain
+    if _llm_chain is None:
+        _llm_chain = prompt | get_chat_llm().bind_tools(TOOLS, tool_choice="auto")
+    return _llm_chain
+
+
+def build_chat_agent():
+    return build_retrieval() | get_llm_chain()
+
+
+RETRIEVAL = build_retrieval()
+
+# --------------------------------------------------
+# Cached LLM calls (planning + summarization)
+# --------------------------------------------------
+# RAG retrieval runs first so the retrieved context is part of the cache key;
+# only the LLM round trip is skipped on a hit.
+LLM_CACHE = create_llm_cache()
+
+
+def _cache_key(prepared: dict) -> str:
+    def as_dicts(messages):
+        return [m.model_dump() if hasattr(m, "model_dump") else m for m in messages]
+
+    return make_key(
+        model=chat_model_id(),
+        prompt=prompt.pretty_repr(),
+        input=prepared["input"],
+        db_info=prepared["db_info"],
+        data_context=prepared["data_context"],
+        context=prepared["context"],
+        chat_history=as_dicts(prepared["chat_history"]),
+        agent_scratchpad=as_dicts(prepared["agent_scratchpad"]),
+    )
 
 
-CHAT_AGENT = build_chat_agent()
+def _load_cached(value: str):
+    return messages_from_dict(json.loads(value))[0]
+
+
+def _dump_message(message) -> str:
+    return json.dumps(messages_to_dict([message]), default=str)
+
+
+def _cached_message(key: str, kind: str):
+    """The cached response for `key` or None, counted as a hit / miss of `kind`."""
+    with phase("llm-cache"):
+        cached = LLM_CACHE.get(key)
+    LLM_REQUESTS.inc(kind, "miss" if cached is None else "hit")
+    return None if cached is None else _load_cached(cached)
+
+
+def call_agent(inputs: dict):
+    with phase("rag"):
+        prepared = RETRIEVAL.invoke(inputs)
+    key = _cache_key(prepared)
+
+    cached = _cached_message(key, "agent")
+    if cached is not None:
+        return cached
+
+    with phase("llm", **{"llm.model": chat_model_id()}), LLM_SECONDS.time("agent"):
+        response = get_llm_chain().invoke(prepared)
+    LLM_CACHE.set(key, _dump_message(response))
+    return response
+
+
+async def acall_agent(inputs: dict):
+    with phase("rag"):
+        prepared = await RETRIEVAL.ainvoke(inputs)
+    key = _cache_key(prepared)
+
+    cached = await asyncio.to_thread(_cached_message, key, "agent")
+    if cached is not None:
+        return cached
+
+    with phase("llm", **{"llm.model": chat_model_id()}), LLM_SECONDS.time("agent"):
+        response = await get_llm_chain().ainvoke(prepared)
+    await asyncio.to_thread(LLM_CACHE.set, key, _dump_message(response))
+    return response
+
+
+async def astream_agent(inputs: dict):
+    """Like acall_agent, but yields ("token", text) while the model writes and
+    finally ("message", AIMessage). A cache hit yields its content as one token.
+    """
+    with phase("rag"):
+        prepared = await RETRIEVAL.ainvoke(inputs)
+    key = _cache_key(prepared)
+
+    cached = await asyncio.to_thread(_cached_message, key, "agent_stream")
+    if cached is not None:
+        if cached.content:
+            yield "token", cached.content
+        yield "message", cached
+        return
+
+    started = time.perf_counter()
+    started_ns = time.time_ns()
+    gathered = None
+    async for chunk in get_llm_chain().astream(prepared):
+        gathered = chunk if gathered is None else gathered + chunk
+        if chunk.content:
+            yield "token", chunk.content
+    LLM_SECONDS.observe(time.perf_counter() - started, "agent_stream")
+    # recorded afterwards: a span must not stay open across the yields above
+    record_span("llm", started_ns, time.time_ns(), **{"llm.model": chat_model_id(), "llm.stream": True})
+
+    # AIMessageChunk -> AIMessage (tool_call chunks are merged into tool_calls)
+    message = None
+    if gathered is not None:
+        message = AIMessage(
+            content=gathered.content,
+            tool_calls=gathered.tool_calls,
+            additional_kwargs=gathered.additional_kwargs,
+            id=gathered.id,
+        )
+        await asyncio.to_thread(LLM_CACHE.set, key, _dump_message(message))
+    yield "message", message
+
+# --------------------------------------------------
+# Chat history compaction
+# --------------------------------------------------
+# Prompts get HISTORY.compact(chat_history): recent turns verbatim, older
+# turns folded into a cached running summary (see ChatHistory.py). The
+# history returned to the client is never modified.
+summary_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "Condense this conversation between a user and XBase AI into a short "
+        "summary (at most ~150 words). Keep table, column and file names, the "
+        "SQL/Python that was run, key results and any open questions."
+    ),
+    ("human", "Previous summary:\n{summary}\n\nNew messages:\n{messages}"),
+])
+
+
+def _summary_inputs(summary, messages):
+    return {
+        "summary": summary or "(none)",
+        "messages": "\n".join(f"{m.type}: {m.content}" for m in messages),
+    }
+
+
+def summarize_history(summary, messages) -> str:
+    LLM_REQUESTS.inc("history", "uncached")
+    with phase("llm-history"), LLM_SECONDS.time("history"):
+        return (summary_prompt | get_chat_llm()).invoke(_summary_inputs(summary, messages)).content
+
+
+async def asummarize_history(summary, messages) -> str:
+    LLM_REQUESTS.inc("history", "uncached")
+    with phase("llm-history"), LLM_SECONDS.time("history"):
+        result = await (summary_prompt | get_chat_llm()).ainvoke(_summary_inputs(summary, messages))
+    return result.content
+
+
+HISTORY = HistoryManager(summarize=summarize_history, asummarize=asummarize_history)
 
 # --------------------------------------------------
 # Tool executor
 # --------------------------------------------------
+# Tool calls from one model turn are independent, so they run concurrently
+# (each bounded by AI_TOOL_TIMEOUT, passed down to the runner / SQL timeouts
+# through _tool_deadline). Results are always collected in the order the
+# model emitted the calls.
+TOOL_TIMEOUT = float(os.getenv("AI_TOOL_TIMEOUT", "60"))
+
+_tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+
 def execute_tool(tool_obj, args):
     try:
-        return tool_obj.invoke(args)
+        with span("tool", **{"tool.name": tool_obj.name}):
+            return tool_obj.invoke(args)
     except Exception:
         return "Tool execution error:\n" + traceback.format_exc()
 
+
+async def execute_tool_async(tool_obj, args):
+    try:
+        with span("tool", **{"tool.name": tool_obj.name}):
+            return await tool_obj.ainvoke(args)
+    except Exception:
+        return "Tool execution error:\n" + traceback.format_exc()
+
+
+async def _in_phase(name, awaitable):
+    with phase(name):
+        return await awaitable
+
+
+def _tool_args(call, parent_id, bucket_url=None):
+    args = dict(call["args"])
+    if call["name"] == "Run_SQL":
+        args["parent_id"] = parent_id
+        # CSV dataset: set by the server, never taken from the model
+        args["bucket_url"] = bucket_url or ""
+    return args
+
+
+def _csv_sql_bucket(db_info: str) -> str | None:
+    """bucket_url Run_SQL should query, when db_info is a CSV dataset."""
+    if CSVSQL.CSV_SQL == "on" and db_info.startswith("CSV"):
+        return bucket_url_from_db_info(db_info)
+    return None
+
+
+def _timeout_message(tool_name):
+    return f"Tool execution error:\n{tool_name} timed out after {TOOL_TIMEOUT:g}s"
+
+
+def run_tool_calls(tool_calls, parent_id, bucket_url=None):
+    """Run tool calls concurrently on threads; outputs in call order."""
+    deadline = time.monotonic() + TOOL_TIMEOUT
+    futures = []
+    for call in tool_calls:
+        tool = TOOLS_BY_NAME.get(call["name"])
+        if tool is None:
+            futures.append(None)
+            continue
+        # copy_context: the worker thread keeps this request's timings / trace
+        context = contextvars.copy_context()
+        context.run(_tool_deadline.set, deadline)
+        futures.append(_tool_executor.submit(
+            context.run, execute_tool, tool, _tool_args(call, parent_id, bucket_url)
+        ))
+
+    # one deadline for the whole batch: calls run in parallel, so each one
+    # gets TOOL_TIMEOUT from submission, not from when the previous finished
+    concurrent.futures.wait([f for f in futures if f is not None], timeout=TOOL_TIMEOUT)
+
+    outs = []
+    for call, future in zip(tool_calls, futures):
+        if future is None:
+            outs.append(f"Tool execution error:\nUnknown tool {call['name']}")
+        elif future.done():
+            outs.append(future.result())
+        else:
+            future.cancel()   # only helps if it never got a worker thread
+            outs.append(_timeout_message(call["name"]))
+    return outs
+
+
+async def run_tool_call_async(call, parent_id, bucket_url=None):
+    tool = TOOLS_BY_NAME.get(call["name"])
+    if tool is None:
+        return f"Tool execution error:\nUnknown tool {call['name']}"
+    # runs as its own task (gather / create_task), so the value stays local
+    _tool_deadline.set(time.monotonic() + TOOL_TIMEOUT)
+    try:
+        return await asyncio.wait_for(
+            execute_tool_async(tool, _tool_args(call, parent_id, bucket_url)),
+            timeout=TOOL_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        return _timeout_message(call["name"])
+
+
+async def run_tool_calls_async(tool_calls, parent_id, bucket_url=None):
+    """Run tool calls concurrently on the event loop; outputs in call order."""
+    return await asyncio.gather(*(
+        run_tool_call_async(call, parent_id, bucket_url) for call in tool_calls
+    ))
+
+
+def collect_tool_results(tool_calls, outs, image_box, sql_res, py_res):
+    """Build ToolMessages + summary text and split outputs per tool.
+
+    The model sees size-budgeted text (ToolOutput.py); sql_res / py_res keep
+    the full results for the client.
+    """
+    tool_messages = []
+    results_text = ""
+
+    for call, out in zip(tool_calls, outs):
+        tool_name = call["name"]
+        shaped = shape_tool_output(tool_name, out)
+        results_text += f"[{tool_name} OUTPUT]\n{shaped}\n\n"
+
+        if tool_name == "Run_SQL":
+            sql_res.append(client_sql_rows(out))
+        if tool_name == "Run_Python":
+            py_res.append(out)
+            if isinstance(out, dict):
+                image_box.extend(out.get("images") or [])
+
+        tool_messages.append(ToolMessage(
+            content=shaped,
+            tool_call_id=call["id"]
+        ))
+
+    return tool_messages, results_text
+
+# --------------------------------------------------
+# One Ask_AI turn
+# --------------------------------------------------
+# The three entry points below differ only in how they wait (blocking,
+# awaited, streamed). What goes into the prompts, whether tools run and how
+# their results reach the summary call is decided here, once.
+class _Turn:
+    def __init__(self, db_info, parent_id, query, prompt_history, data_context):
+        self.db_info = db_info
+        self.parent_id = parent_id
+        self.query = query
+        self.prompt_history = prompt_history
+        self.data_context = data_context
+        self.csv_bucket = _csv_sql_bucket(db_info)
+
+    @classmethod
+    def prepare(cls, db_info, parent_id, query, chat_history, conversation_id):
+        with phase("history"):
+            prompt_history = HISTORY.compact(chat_history, conversation_id)
+        with phase("context"):
+            data_context = build_data_context(db_info, parent_id)
+        return cls(db_info, parent_id, query, prompt_history, data_context)
+
+    @classmethod
+    async def aprepare(cls, db_info, parent_id, query, chat_history, conversation_id):
+        prompt_history, data_context = await asyncio.gather(
+            _in_phase("history", HISTORY.acompact(chat_history, conversation_id)),
+            _in_phase("context", abuild_data_context(db_info, parent_id)),
+        )
+        return cls(db_info, parent_id, query, prompt_history, data_context)
+
+    def _inputs(self, input, agent_scratchpad):
+        return {
+            "input": input,
+            "db_info": self.db_info,
+            "data_context": self.data_context,
+            "chat_history": self.prompt_history,
+            "agent_scratchpad": agent_scratchpad,
+        }
+
+    def plan_inputs(self) -> dict:
+        return self._inputs(self.query, [])
+
+    def summary_inputs(self, response, tool_calls, outs, image_box, sql_res, py_res) -> dict:
+        tool_messages, results_text = collect_tool_results(
+            tool_calls, outs, image_box, sql_res, py_res
+        )
+        return self._inputs(f"Summarize what happened:\n{results_text}", [response, *tool_messages])
+
+
+def _tool_calls(response, permission: bool) -> list:
+    """Tool calls to run for the planning response ([] = answer as is)."""
+    if not permission:
+        return []
+    return getattr(response, "tool_calls", None) or []
+
+
 # --------------------------------------------------
 # MAIN ENTRY
 # --------------------------------------------------
@@ -156,62 +696,138 @@ def Ask_AI(
     query: str,
     chat_history=None,
     permission: bool = True,
-    image_box: list[str] | None = None
+    image_box: list[str] | None = None,
+    conversation_id: str | None = None
 ):
     if chat_history is None:
         chat_history = []
     if image_box is None:
         image_box = []
-
     sql_res = []
     py_res = []
 
-    response = CHAT_AGENT.invoke({
-        "input": query,
-        "db_info": db_info,
-        "chat_history": chat_history,
-        "agent_scratchpad": [],
-    })
+    turn = _Turn.prepare(db_info, parent_id, query, chat_history, conversation_id)
+    response = call_agent(turn.plan_inputs())
+    tool_calls = _tool_calls(response, permission)
+    if not tool_calls:
+        return response.content, chat_history, image_box, sql_res, py_res
+
+    with phase("tools"):
+        outs = run_tool_calls(tool_calls, parent_id, turn.csv_bucket)
+    final = call_agent(turn.summary_inputs(response, tool_calls, outs, image_box, sql_res, py_res))
+    return final.content, chat_history, image_box, sql_res, py_res
+
 
-    tool_calls = getattr(response, "tool_calls", [])
+async def Ask_AI_async(
+    db_info: str,
+    parent_id: str,
+    query: str,
+    chat_history=None,
+    permission: bool = True,
+    image_box: list[str] | None = None,
+    conversation_id: str | None = None
+):
+    """Async Ask_AI: same contract, but LLM calls, HTTP and SQL are awaited."""
+    if chat_history is None:
+        chat_history = []
+    if image_box is None:
+        image_box = []
+    sql_res = []
+    py_res = []
 
-    if not tool_calls or not permission:
+    turn = await _Turn.aprepare(db_info, parent_id, query, chat_history, conversation_id)
+    response = await acall_agent(turn.plan_inputs())
+    tool_calls = _tool_calls(response, permission)
+    if not tool_calls:
         return response.content, chat_history, image_box, sql_res, py_res
 
-    tool_messages = []
-    results_text = ""
+    with phase("tools"):
+        outs = await run_tool_calls_async(tool_calls, parent_id, turn.csv_bucket)
+    final = await acall_agent(turn.summary_inputs(response, tool_calls, outs, image_box, sql_res, py_res))
+    return final.content, chat_history, image_box, sql_res, py_res
 
-    for call in tool_calls:
-        tool_name = call["name"]
-        args = dict(call["args"])
-        if tool_name == "Run_SQL":
-            args["parent_id"] = parent_id
-        if tool_name == "Run_Python":
-            args.setdefault("image_box", image_box)
+# --------------------------------------------------
+# STREAMING ENTRY (/ask_ai/stream)
+# --------------------------------------------------
+async def Ask_AI_stream(
+    db_info: str,
+    parent_id: str,
+    query: str,
+    chat_history=None,
+    permission: bool = True,
+    conversation_id: str | None = None,
+):
+    """Async generator of (event, data) pairs for one Ask_AI turn.
 
-        tool = {t.name: t for t in TOOLS}[tool_name]
-        out = execute_tool(tool, args)
+    Events: start, planning_token, tool_start, tool_result, summary_token,
+    done. Images are sent once, inside the tool_result of the Run_Python call
+    that produced them, as {"index", "data"}; `done` only carries their count.
+    """
+    if chat_history is None:
+        chat_history = []
 
-        results_text += f"[{tool_name} OUTPUT]\n{out}\n\n"
+    image_box = []
+    sql_res = []
+    py_res = []
 
-        if tool_name == "Run_SQL":
-            sql_res.append(out)
-        if tool_name == "Run_Python":
-            py_res.append(out)
+    yield "start", {}
 
-        tool_messages.append(ToolMessage(
-            content=str(out),
-            tool_call_id=call["id"]
-        ))
+    turn = await _Turn.aprepare(db_info, parent_id, query, chat_history, conversation_id)
 
-    final = CHAT_AGENT.invoke({
-        "input": f"Summarize what happened:\n{results_text}",
-        "db_info": db_info,
-        "chat_history": chat_history,
-        "agent_scratchpad": [response, *tool_messages],
-    })
+    response = None
+    async for kind, value in astream_agent(turn.plan_inputs()):
+        if kind == "token":
+            yield "planning_token", {"text": value}
+        else:
+            response = value
 
-    return final.content, chat_history, image_box, sql_res, py_res
+    tool_calls = _tool_calls(response, permission)
+    if not tool_calls:
+        yield "done", {
+            "response": response.content if response else "",
+            "chat_history": chat_history,
+            "image_count": 0,
+            "sql_res": sql_res,
+        }
+        return
+
+    for call in tool_calls:
+        yield "tool_start", {"id": call["id"], "name": call["name"], "args": call["args"]}
+
+    async def indexed(i, call):
+        return i, await run_tool_call_async(call, parent_id, turn.csv_bucket)
+
+    outs = [None] * len(tool_calls)
+    tasks = [asyncio.create_task(indexed(i, call)) for i, call in enumerate(tool_calls)]
+    for next_done in asyncio.as_completed(tasks):
+        i, out = await next_done
+        outs[i] = out
+        call = tool_calls[i]
+
+        event = {"id": call["id"], "name": call["name"], "output": out}
+        if isinstance(out, dict) and out.get("images"):
+            event["images"] = [
+                {"index": len(image_box) + n, "data": img}
+                for n, img in enumerate(out["images"])
+            ]
+            event["output"] = {k: v for k, v in out.items() if k != "images"}
+            image_box.extend(out["images"])
+        yield "tool_result", event
+
+    # images were numbered in completion order above; keep that order
+    final = None
+    async for kind, value in astream_agent(turn.summary_inputs(response, tool_calls, outs, [], sql_res, py_res)):
+        if kind == "token":
+            yield "summary_token", {"text": value}
+        else:
+            final = value
+
+    yield "done", {
+        "response": final.content if final else "",
+        "chat_history": chat_history,
+        "image_count": len(image_box),
+        "sql_res": sql_res,
+    }
 
 # --------------------------------------------------
 # Interactive mode
@@ -1,8 +1,17 @@
 import uuid
-from sqlalchemy import text, select
+import hashlib
+import base64
+import json
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import text, select, func, tuple_, update
 from sqlalchemy.exc import SQLAlchemyError
 from ConnectToDB import engine, AsyncSessionLocal
-from models import File, Folder, UserRoot
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import File, Folder, UserRoot, FileProfile
+from Timing import timed
+import QueryLog
 
 
 # ------------------------------------------------
@@ -14,6 +23,7 @@ load_dotenv()  # loads .env from project root
 DATABASE_URL = os.getenv("DATABASE_URL")
 from sqlalchemy import create_engine, text
 engine = create_engine(DATABASE_URL, future=True)
+QueryLog.instrument(engine, "crud")
 def run_sql(query: str):
     try:
         with engine.begin() as conn:
@@ -67,9 +77,171 @@ def run_sql(query: str):
 
 
 
+# ------------------------------------------------
+# LISTING VERSIONS (ETag for /files and /folders)
+# ------------------------------------------------
+# Bumped on every write that changes the contents of a folder. The counter is
+# per-process, so the ETag also folds in count + max(created_at) from the DB;
+# that keeps ETags correct when another worker did the write.
+#
+# Only the FOLDER_VERSIONS_SIZE most recently written folders are kept; any
+# other folder reports 0, so its ETag depends on that folder alone. That is
+# safe because the writes here create or delete rows: each one moves count or
+# max(created_at), which stay in the ETag after the version is evicted.
+#
+# Paged requests (limit set) don't use that aggregate: it scans the whole
+# folder, which would make every keyset page O(folder size). Their ETag is a
+# hash of the page itself (page_etag), computed after the page query.
+FOLDER_VERSIONS_SIZE = int(os.getenv("FOLDER_VERSIONS_SIZE", "10000"))
+_FOLDER_VERSIONS = OrderedDict()   # parent_id -> version of its last write
+_folder_version_seq = itertools.count(1)
+
+
+def bump_folder_version(parent_id):
+    parent_uuid = parent_id if isinstance(parent_id, uuid.UUID) else uuid.UUID(str(parent_id))
+    _FOLDER_VERSIONS[parent_uuid] = next(_folder_version_seq)
+    _FOLDER_VERSIONS.move_to_end(parent_uuid)
+    while len(_FOLDER_VERSIONS) > FOLDER_VERSIONS_SIZE:
+        _FOLDER_VERSIONS.popitem(last=False)
+
+
+def folder_version(parent_uuid: uuid.UUID) -> int:
+    return _FOLDER_VERSIONS.get(parent_uuid, 0)
+
+
+@timed("db-etag")
+async def folder_listing_etag(model, parent_uuid: uuid.UUID, *variant) -> str:
+    """Weak ETag for the listing of `model` rows under `parent_uuid`."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(func.count(), func.max(model.created_at))
+            .where(model.parent_id == parent_uuid)
+        )
+        count, max_created = result.one()
+
+    raw = "|".join([
+        model.__tablename__,
+        str(parent_uuid),
+        str(folder_version(parent_uuid)),
+        str(count),
+        max_created.isoformat() if max_created else "",
+        *[str(v) for v in variant],
+    ])
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def page_etag(model, parent_uuid: uuid.UUID, rows: list[dict], next_cursor, *variant) -> str:
+    """Weak ETag for one page of a listing, from the rows it contains."""
+    digest = hashlib.sha1("|".join([
+        model.__tablename__,
+        str(parent_uuid),
+        str(next_cursor),
+        *[str(v) for v in variant],
+    ]).encode("utf-8"))
+    for row in rows:
+        digest.update(b"\n")
+        digest.update("|".join(
+            v.isoformat() if isinstance(v, datetime) else str(v) for v in row.values()
+        ).encode("utf-8"))
+    return 'W/"' + digest.hexdigest() + '"'
+
+
+# ------------------------------------------------
+# KEYSET PAGINATION for /files and /folders
+# ------------------------------------------------
+# Cursors are opaque base64 of (sort, last sort key, last id). Each page is an
+# index range scan on (parent_id, <sort col>, id), so page latency does not
+# depend on how many rows came before it. The row comparison skips NULL sort
+# keys, so created_at and name are NOT NULL (startup.py backfills old rows).
+LISTING_SORTS = {
+    "created_at": ("created_at", False),
+    "-created_at": ("created_at", True),
+    "name": ("name", False),
+    "-name": ("name", True),
+}
+
+
+def encode_cursor(sort: str, key, row_id) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([sort, key, str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """(last sort key, last id) from a cursor. Raises ValueError for anything
+    that isn't a cursor encode_cursor issued for `sort`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cur_sort, key, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        row_id = uuid.UUID(row_id)
+        if cur_sort == sort and LISTING_SORTS[sort][0] == "created_at":
+            key = datetime.fromisoformat(key)
+        elif not isinstance(key, str):
+            raise TypeError(key)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if cur_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return key, row_id
+
+
+def listing_columns(model):
+    """Columns returned by /files and /folders (Core select, no ORM hydration)."""
+    cols = [model.id, model.name, model.parent_id, model.created_at]
+    if hasattr(model, "bucket_url"):
+        cols.append(model.bucket_url)
+    return cols
+
+
+@timed("db")
+async def list_folder_page(model, parent_uuid: uuid.UUID, limit: int | None = None,
+                           cursor: str | None = None, sort: str = "created_at"):
+    """One page of `model` rows under `parent_uuid` as plain dicts.
+
+    Returns (rows, next_cursor). Values are left as UUID/datetime; the
+    response class serializes them.
+    """
+    if sort not in LISTING_SORTS:
+        raise ValueError(f"Invalid sort: {sort}")
+    col_name, desc = LISTING_SORTS[sort]
+    sort_col = getattr(model, col_name)
+
+    query = select(*listing_columns(model)).where(model.parent_id == parent_uuid)
+
+    if cursor:
+        key, row_id = decode_cursor(cursor, sort)
+        position = tuple_(sort_col, model.id)
+        query = query.where(position < (key, row_id) if desc else position > (key, row_id))
+
+    if desc:
+        query = query.order_by(sort_col.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_col.asc(), model.id.asc())
+
+    if limit:
+        # one extra row tells us whether there is a next page
+        query = query.limit(limit + 1)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(query)
+        keys = list(result.keys())
+        rows = [dict(zip(keys, row)) for row in result.all()]
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last[col_name], last["id"])
+
+    return rows, next_cursor
+
+
 # ------------------------------------------------
 # USER ROOT: Get or create root folder
 # ------------------------------------------------
+@timed("db")
 async def get_or_create_user_root(user_id: str):
     async with AsyncSessionLocal() as session:
         result = await session.execute(
@@ -97,6 +269,7 @@ async def get_or_create_user_root(user_id: str):
 # ------------------------------------------------
 # CREATE FOLDER
 # ------------------------------------------------
+@timed("db")
 async def create_folder(folder_name: str, parent_id: str):
     parent_uuid = uuid.UUID(parent_id)
 
@@ -109,12 +282,14 @@ async def create_folder(folder_name: str, parent_id: str):
         session.add(new_folder)
         await session.commit()
 
+    bump_folder_version(parent_uuid)
     return {"folder_id": str(new_folder.id), "name": folder_name}
 
 
 # ------------------------------------------------
 # CREATE TABLE + REGISTER IN FILE ORM
 # ------------------------------------------------
+@timed("db")
 async def create_table(table_name: str, parent_id: str, columns: list[str]):
     parent_uuid = uuid.UUID(parent_id)
 
@@ -140,12 +315,14 @@ async def create_table(table_name: str, parent_id: str, columns: list[str]):
         session.add(new_file)
         await session.commit()
 
+    bump_folder_version(parent_uuid)
     return {"table": table_name, "status": "created"}
 
 
 # ------------------------------------------------
 # READ ROWS
 # ------------------------------------------------
+@timed("db")
 async def read_rows(table_name: str):
     query = f"SELECT * FROM {table_name};"
     rows = await run_sql(query)
@@ -155,6 +332,7 @@ async def read_rows(table_name: str):
 # ------------------------------------------------
 # INSERT ROW
 # ------------------------------------------------
+@timed("db")
 async def insert_row(table_name: str, data: dict):
     col_names = ", ".join(data.keys())
     col_vals = ", ".join([f"'{v}'" for v in data.values()])
@@ -171,6 +349,7 @@ async def insert_row(table_name: str, data: dict):
 # ------------------------------------------------
 # UPDATE ROW
 # ------------------------------------------------
+@timed("db")
 async def update_row(table_name: str, row_id: int, column: str, value: str):
     query = f"""
     UPDATE {table_name}
@@ -185,6 +364,7 @@ async def update_row(table_name: str, row_id: int, column: str, value: str):
 # ------------------------------------------------
 # DELETE ROW
 # ------------------------------------------------
+@timed("db")
 async def delete_row(table_name: str, row_id: int):
     query = f"DELETE FROM {table_name} WHERE id = {row_id};"
     await run_sql(query)
@@ -194,6 +374,7 @@ async def delete_row(table_name: str, row_id: int):
 # ------------------------------------------------
 # ADD COLUMN
 # ------------------------------------------------
+@timed("db")
 async def add_column(table_name: str, col_name: str, col_type: str):
     query = f"""
     ALTER TABLE {table_name}
@@ -207,6 +388,7 @@ async def add_column(table_name: str, col_name: str, col_type: str):
 # ------------------------------------------------
 # DELETE COLUMN
 # ------------------------------------------------
+@timed("db")
 async def delete_column(table_name: str, col_name: str):
     query = f"""
     ALTER TABLE {table_name}
@@ -220,15 +402,63 @@ async def delete_column(table_name: str, col_name: str):
 # ------------------------------------------------
 # DELETE TABLE (And remove from File ORM)
 # ------------------------------------------------
+@timed("db")
 async def delete_table(table_name: str):
     drop_query = f"DROP TABLE IF EXISTS {table_name} CASCADE;"
     await run_sql(drop_query)
 
     async with AsyncSessionLocal() as session:
-        await session.execute(
-            text("DELETE FROM files WHERE name = :t"),
+        result = await session.execute(
+            text("DELETE FROM files WHERE name = :t RETURNING parent_id"),
             {"t": table_name}
         )
+        parent_ids = [r[0] for r in result.fetchall()]
         await session.commit()
 
+    for parent_id in parent_ids:
+        bump_folder_version(parent_id)
+
     return {"status": "table_deleted", "table": table_name}
+
+
+# ------------------------------------------------
+# FILE PROFILES / PARQUET (written by Ingestion.py)
+# ------------------------------------------------
+@timed("db")
+async def set_file_parquet(file_id: uuid.UUID, status: str, parquet_url: str | None = None):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(File).where(File.id == file_id)
+            .values(parquet_status=status, parquet_url=parquet_url)
+        )
+        await session.commit()
+
+
+@timed("db")
+async def upsert_file_profile(file_id: uuid.UUID, bucket_url: str, status: str,
+                              profile: dict | None = None, error: str | None = None):
+    values = {"bucket_url": bucket_url, "status": status, "profile": profile,
+              "error": error, "updated_at": func.now()}
+    stmt = pg_insert(FileProfile).values(file_id=file_id, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=[FileProfile.file_id], set_=values)
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+@timed("db")
+async def get_file_bucket_url(file_id: uuid.UUID):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(File.bucket_url).where(File.id == file_id))
+        return result.scalar_one_or_none()
+
+
+@timed("db")
+async def get_file_profile(file_id: uuid.UUID):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(FileProfile.status, FileProfile.profile, FileProfile.error, FileProfile.updated_at)
+            .where(FileProfile.file_id == file_id)
+        )
+        row = result.first()
+    return dict(row._mapping) if row else None
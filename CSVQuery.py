@@ -0,0 +1,217 @@
+# CSVQuery.py
+# Declarative queries over CSV datasets (POST /csv/query), run with pandas
+# on the DataFrame held by DatasetCache: no runner subprocess, no exec.
+#
+#   {
+#     "bucket_url": "user/sales.csv",
+#     "filters":   [{"column": "region", "op": "eq", "value": "EU"}],
+#     "group_by":  ["country"],
+#     "aggregates": [{"column": "amount", "func": "sum", "alias": "total"}],
+#     "sort":      [{"column": "total", "desc": true}],
+#     "limit": 100, "page_size": 50
+#   }
+#
+# Order of evaluation: filters -> group_by / aggregates -> select -> sort ->
+# limit -> page. The cached DataFrame is shared, so nothing here mutates it.
+# The full result of a query is kept in a small LRU (CSV_QUERY_CACHE_SIZE)
+# so following next_cursor does not recompute it. Entries hold only a weak
+# reference to the source DataFrame: once DatasetCache drops it, they are
+# stale and purged, and never keep the dataset alive.
+
+import os
+import json
+import base64
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import DatasetCache
+
+CSV_QUERY_CACHE_SIZE = int(os.getenv("CSV_QUERY_CACHE_SIZE", "16"))
+
+FILTER_OPS = {
+    "eq": lambda s, v: s == v,
+    "ne": lambda s, v: s != v,
+    "lt": lambda s, v: s < v,
+    "le": lambda s, v: s <= v,
+    "gt": lambda s, v: s > v,
+    "ge": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(v if isinstance(v, list) else [v]),
+    "not_in": lambda s, v: ~s.isin(v if isinstance(v, list) else [v]),
+    "contains": lambda s, v: s.astype(str).str.contains(str(v), case=False, regex=False, na=False),
+    "startswith": lambda s, v: s.astype(str).str.startswith(str(v), na=False),
+    "is_null": lambda s, v: s.isna(),
+    "not_null": lambda s, v: s.notna(),
+}
+
+AGG_FUNCS = {"count", "sum", "mean", "min", "max", "median", "nunique", "std"}
+
+_lock = threading.Lock()
+_results = OrderedDict()   # (bucket_url, fingerprint) -> (weakref to source df, result df)
+
+
+class QueryError(ValueError):
+    """Invalid query spec (unknown column, operator, bad cursor, ...)."""
+
+
+def fingerprint(spec: dict) -> str:
+    """Identifies a query independently of paging."""
+    key = {k: v for k, v in spec.items() if k not in ("cursor", "page_size")}
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(fp: str, offset: int) -> str:
+    raw = json.dumps([fp, offset], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, fp: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cur_fp, offset = json.loads(base64.urlsafe_b64decode(padded))
+        offset = int(offset)
+    except Exception:
+        raise QueryError("Invalid cursor")
+    if cur_fp != fp:
+        raise QueryError("Cursor was issued for a different query")
+    return offset
+
+
+def _column(df, name: str):
+    if name not in df.columns:
+        raise QueryError(f"Unknown column: {name}")
+    return df[name]
+
+
+def _apply_filters(df, filters):
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for f in filters:
+        op = FILTER_OPS.get(f["op"])
+        if op is None:
+            raise QueryError(f"Unknown filter op: {f['op']}")
+        try:
+            mask &= op(_column(df, f["column"]), f.get("value"))
+        except TypeError as e:
+            raise QueryError(f"Cannot compare column {f['column']} with {f.get('value')!r}: {e}")
+    return df[mask]
+
+
+def _aggregate(df, group_by, aggregates):
+    named = {}
+    for a in aggregates:
+        func = a["func"]
+        if func not in AGG_FUNCS:
+            raise QueryError(f"Unknown aggregate: {func}")
+        column = a.get("column") or "*"
+        if column == "*":
+            if func != "count":
+                raise QueryError("Only count can be used with column '*'")
+            column = group_by[0] if group_by else df.columns[0]
+            func = "size"
+        else:
+            _column(df, column)
+        alias = a.get("alias") or ("count" if func == "size" else f"{func}_{column}")
+        named[alias] = (column, func)
+
+    for name in group_by:
+        _column(df, name)
+
+    try:
+        if group_by:
+            return df.groupby(group_by, dropna=False, sort=False).agg(**named).reset_index()
+        return pd.DataFrame({alias: [df[col].agg(func) if func != "size" else len(df)]
+                             for alias, (col, func) in named.items()})
+    except TypeError as e:
+        raise QueryError(f"Aggregate not supported for this column type: {e}")
+
+
+def run_query(df, spec: dict):
+    """Full (unpaged) result of `spec` on `df`."""
+    out = _apply_filters(df, spec.get("filters"))
+
+    group_by = spec.get("group_by") or []
+    aggregates = spec.get("aggregates") or []
+    if group_by and not aggregates:
+        aggregates = [{"column": "*", "func": "count", "alias": "count"}]
+    if aggregates:
+        out = _aggregate(out, group_by, aggregates)
+
+    select = spec.get("select")
+    if select:
+        for name in select:
+            _column(out, name)
+        out = out[select]
+
+    sort = spec.get("sort") or []
+    if sort:
+        for s in sort:
+            _column(out, s["column"])
+        out = out.sort_values(
+            [s["column"] for s in sort],
+            ascending=[not s.get("desc") for s in sort],
+            kind="stable",
+            na_position="last",
+        )
+
+    if spec.get("limit"):
+        out = out.head(spec["limit"])
+    return out
+
+
+def _cached_result(bucket_url: str, fp: str, df, spec: dict):
+    key = (bucket_url, fp)
+    with _lock:
+        entry = _results.get(key)
+        # a reloaded dataset (TTL / invalidate) is a new DataFrame object
+        if entry is not None and entry[0]() is df:
+            _results.move_to_end(key)
+            return entry[1]
+
+    result = run_query(df, spec)
+    if result is df:
+        return result   # nothing computed, nothing to cache
+    with _lock:
+        for stale in [k for k, (ref, _) in _results.items() if ref() is None]:
+            del _results[stale]
+        _results[key] = (weakref.ref(df), result)
+        while len(_results) > CSV_QUERY_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
+
+
+def _rows(page) -> list[list]:
+    """JSON-ready rows: NaN -> None, datetimes as ISO strings."""
+    page = page.copy()
+    for name, dtype in page.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            page[name] = page[name].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return page.astype(object).where(page.notna(), None).values.tolist()
+
+
+def query(spec: dict) -> dict | None:
+    """One page of the query result, or None if the dataset can't be loaded.
+    Raises QueryError for an invalid spec."""
+    df = DatasetCache.get_dataframe(spec["bucket_url"])
+    if df is None:
+        return None
+
+    fp = fingerprint(spec)
+    offset = decode_cursor(spec["cursor"], fp) if spec.get("cursor") else 0
+    result = _cached_result(spec["bucket_url"], fp, df, spec)
+
+    page_size = spec.get("page_size") or 100
+    page = result.iloc[offset:offset + page_size]
+    end = offset + len(page)
+
+    return {
+        "columns": [str(c) for c in result.columns],
+        "rows": _rows(page),
+        "total_rows": int(len(result)),
+        "offset": offset,
+        "next_cursor": encode_cursor(fp, end) if end < len(result) else None,
+    }
@@ -0,0 +1,325 @@
+# CSVSQL.py
+# SQL over CSV datasets with an embedded columnar engine (DuckDB).
+# Used by POST /csv/sql and by AskAI's Run_SQL when db_info starts with "CSV:".
+#
+# On first use a dataset is downloaded once and loaded into a local DuckDB
+# database file (CSV_SQL_DIR) as the table `df`; after that every query is a
+# columnar, multi-threaded scan of that file instead of a CSV download +
+# pandas parse in the runner. When the dataset has a Parquet version
+# (Ingestion.py) that is loaded instead, keeping the types it was written with.
+# Queries run on read-only connections with
+# external access disabled, so SQL can't touch other files or the network.
+#
+# Each process builds its own database files (unique names) and closes and
+# deletes one when it is evicted or reloaded, once the queries still running
+# on it are done. Files older than CSV_SQL_TTL are never handed out again, so
+# the first load in a process removes those left behind by dead workers.
+#
+#   CSV_SQL=on|off           expose CSV datasets to Run_SQL (default on)
+#   CSV_SQL_DIR              where the .duckdb files live (.csv_sql/)
+#   CSV_SQL_TTL              seconds before a dataset is reloaded from storage
+#   CSV_SQL_MAX_BYTES        disk budget for the .duckdb files (LRU)
+#   CSV_SQL_MAX_DATASETS     datasets open at once per process (LRU, default 8)
+#   CSV_SQL_MEMORY_LIMIT     DuckDB memory_limit per dataset, e.g. 1GB
+#   CSV_SQL_THREADS          DuckDB threads per dataset (default: min(4, cores))
+#   CSV_SQL_STATEMENT_TIMEOUT_MS   /csv/sql query timeout (AI uses AI_SQL_STATEMENT_TIMEOUT_MS)
+#
+# pip install duckdb
+
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from Metrics import record_download
+from Tracing import span
+import QueryLog
+import DatasetCache
+
+CSV_SQL = os.getenv("CSV_SQL", "on")
+CSV_SQL_DIR = os.getenv(
+    "CSV_SQL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".csv_sql")
+)
+CSV_SQL_TTL = float(os.getenv("CSV_SQL_TTL", "600"))
+CSV_SQL_MAX_BYTES = int(os.getenv("CSV_SQL_MAX_BYTES", str(4 * 1024 ** 3)))
+CSV_SQL_MAX_DATASETS = int(os.getenv("CSV_SQL_MAX_DATASETS", "8"))
+CSV_SQL_MEMORY_LIMIT = os.getenv("CSV_SQL_MEMORY_LIMIT", "1GB")
+CSV_SQL_THREADS = int(os.getenv("CSV_SQL_THREADS", str(min(4, os.cpu_count() or 1))))
+CSV_SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("CSV_SQL_STATEMENT_TIMEOUT_MS", "30000"))
+
+TABLE = "df"
+
+_lock = threading.Lock()
+_datasets = OrderedDict()   # bucket_url -> _Dataset
+_load_locks = {}            # bucket_url -> [Lock, waiters]; only datasets being loaded
+
+_swept = False              # stale files removed (first load in this process)
+
+stats = {"hits": 0, "loads": 0, "evictions": 0, "load_errors": 0}
+
+
+class DatasetNotFound(Exception):
+    """The dataset could not be downloaded or parsed."""
+
+
+class _Dataset:
+    """An open database file and the queries running on it."""
+
+    def __init__(self, conn, path: str):
+        self.loaded_at = time.time()
+        self.conn = conn
+        self.path = path
+        self.users = 0
+        self.retired = False   # evicted or replaced: close when users reaches 0
+
+    def fresh(self) -> bool:
+        return time.time() - self.loaded_at <= CSV_SQL_TTL
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def _load_lock(bucket_url: str):
+    """One download per dataset at a time; the entry goes away with its last waiter."""
+    with _lock:
+        entry = _load_locks.get(bucket_url)
+        if entry is None:
+            entry = _load_locks[bucket_url] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if not entry[1]:
+                _load_locks.pop(bucket_url, None)
+
+
+def _sweep():
+    """Delete files under CSV_SQL_DIR older than CSV_SQL_TTL (left by dead workers)."""
+    cutoff = time.time() - CSV_SQL_TTL
+    for entry in os.scandir(CSV_SQL_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _connect(path: str):
+    import duckdb
+    return duckdb.connect(path, read_only=True, config={
+        "enable_external_access": False,
+        "memory_limit": CSV_SQL_MEMORY_LIMIT,
+        "threads": CSV_SQL_THREADS,
+    })
+
+
+def _download(bucket_url: str):
+    """(raw bytes, "parquet" | "csv"); the Parquet version when there is one."""
+    from python_runner.runner import download_from_supabase
+
+    parquet_url = DatasetCache.parquet_url_sync(bucket_url)
+    if parquet_url:
+        with span("storage.download", bucket_url=parquet_url):
+            raw = download_from_supabase(parquet_url)
+        if raw:
+            return raw, "parquet"
+    with span("storage.download", bucket_url=bucket_url):
+        return download_from_supabase(bucket_url), "csv"
+
+
+def _build(bucket_url: str) -> str:
+    """Download the dataset and load it into a new database file; return its path."""
+    global _swept
+    import duckdb
+
+    raw, data_format = _download(bucket_url)
+    if not raw:
+        raise DatasetNotFound(f"Could not download {bucket_url}")
+    record_download("csv_sql", len(raw))
+
+    os.makedirs(CSV_SQL_DIR, exist_ok=True)
+    if not _swept:
+        _swept = True
+        _sweep()
+    # unique names: other workers may be building the same dataset right now.
+    # The database shares the stem mkstemp reserved for the source file.
+    name = hashlib.sha1(bucket_url.encode("utf-8")).hexdigest()
+    fd, src_path = tempfile.mkstemp(dir=CSV_SQL_DIR, prefix=name + ".", suffix="." + data_format)
+    path = src_path[:-len(data_format)] + "duckdb"
+    # mkstemp names are [a-z0-9_] under CSV_SQL_DIR, safe to inline
+    if data_format == "parquet":
+        source = f"read_parquet('{src_path}')"
+    else:
+        source = f"read_csv('{src_path}', auto_detect = true, ignore_errors = true, sample_size = 20480)"
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        del raw
+        with span("csv_sql.load", format=data_format):
+            conn = duckdb.connect(path)
+            try:
+                conn.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM {source}")
+            except duckdb.Error as e:
+                raise DatasetNotFound(f"Could not parse {bucket_url}: {e}")
+            finally:
+                conn.close()
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        os.remove(src_path)
+    return path
+
+
+def _retire(dataset: _Dataset, closing: list):
+    """Call with _lock held. Closed now if idle, else by its last query."""
+    dataset.retired = True
+    if not dataset.users:
+        closing.append(dataset)
+
+
+def _evict(closing: list):
+    """Call with _lock held. Drop least recently used datasets while over
+    CSV_SQL_MAX_DATASETS or CSV_SQL_MAX_BYTES; the newest always stays."""
+    sizes = {url: os.path.getsize(d.path) for url, d in _datasets.items() if os.path.exists(d.path)}
+    total = sum(sizes.values())
+    while len(_datasets) > 1 and (len(_datasets) > CSV_SQL_MAX_DATASETS or total > CSV_SQL_MAX_BYTES):
+        url, dataset = _datasets.popitem(last=False)
+        total -= sizes.get(url, 0)
+        stats["evictions"] += 1
+        _retire(dataset, closing)
+
+
+def _acquire(bucket_url: str) -> _Dataset:
+    with _lock:
+        dataset = _datasets.get(bucket_url)
+        if dataset and dataset.fresh():
+            _datasets.move_to_end(bucket_url)
+            stats["hits"] += 1
+            dataset.users += 1
+            return dataset
+
+    with _load_lock(bucket_url):
+        with _lock:
+            dataset = _datasets.get(bucket_url)
+            if dataset and dataset.fresh():
+                dataset.users += 1
+                return dataset
+
+        try:
+            path = _build(bucket_url)
+        except Exception:
+            with _lock:
+                stats["load_errors"] += 1
+            raise
+        try:
+            dataset = _Dataset(_connect(path), path)
+        except Exception:
+            os.remove(path)
+            raise
+        dataset.users = 1
+
+        closing = []
+        with _lock:
+            stats["loads"] += 1
+            old = _datasets.pop(bucket_url, None)
+            if old:
+                _retire(old, closing)
+            _datasets[bucket_url] = dataset
+            _evict(closing)
+        for idle in closing:
+            idle.close()
+        return dataset
+
+
+def _release(dataset: _Dataset):
+    with _lock:
+        dataset.users -= 1
+        idle = dataset.retired and not dataset.users
+    if idle:
+        dataset.close()
+
+
+@contextmanager
+def connection(bucket_url: str):
+    """Read-only DuckDB connection to the dataset (table `df`), kept open
+    until the block exits. Raises DatasetNotFound."""
+    dataset = _acquire(bucket_url)
+    try:
+        yield dataset.conn
+    finally:
+        _release(dataset)
+
+
+def run_sql_limited(bucket_url: str, query: str, max_rows: int | None = None,
+                    statement_timeout_ms: int | None = None, tag: str | None = None):
+    """Run `query` against the dataset; same contract as RunSQL.run_sql_limited.
+
+    Returns {"columns", "rows", "truncated"}, or None for statements that
+    return no rows. Errors (duckdb.Error, DatasetNotFound) are raised.
+    """
+    with connection(bucket_url) as conn:
+        return _run(conn.cursor(), query, max_rows, statement_timeout_ms, tag)
+
+
+def _run(cursor, query, max_rows, statement_timeout_ms, tag):
+    timer = None
+    if statement_timeout_ms:
+        timer = threading.Timer(statement_timeout_ms / 1000, cursor.interrupt)
+        timer.daemon = True
+        timer.start()
+
+    started, started_ns = time.perf_counter(), time.time_ns()
+    try:
+        cursor.execute(query)
+        if cursor.description is None:
+            rows, columns = None, None
+        else:
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchmany(max_rows + 1) if max_rows else cursor.fetchall()
+    except Exception as e:
+        QueryLog.record("duckdb", tag or "app", query, (time.perf_counter() - started) * 1000,
+                        started_ns, error=str(e)[:500])
+        cursor.close()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+
+    def explain():
+        try:
+            return "\n".join(str(row[1]) for row in cursor.execute("EXPLAIN " + query).fetchall())
+        except Exception as e:
+            return f"(EXPLAIN failed: {e})"
+
+    QueryLog.record("duckdb", tag or "app", query, (time.perf_counter() - started) * 1000,
+                    started_ns, None if rows is None else len(rows), explain=explain)
+    cursor.close()
+
+    if rows is None:
+        return None
+    truncated = bool(max_rows) and len(rows) > max_rows
+    if truncated:
+        rows = rows[:max_rows]
+    return {"columns": columns, "rows": [list(r) for r in rows], "truncated": truncated}
+
+
+def cache_stats() -> dict:
+    with _lock:
+        return {**stats, "datasets": len(_datasets)}
@@ -0,0 +1,158 @@
+# ChatHistory.py
+# Token-budgeted chat history for Ask_AI prompts.
+#
+# The client sends the whole conversation on every /ask_ai call. Before it
+# goes into a prompt, HistoryManager keeps the most recent turns verbatim and
+# folds older turns into a running summary (or drops them) so the history
+# stays under HISTORY_TOKEN_BUDGET tokens.
+#
+# Summaries are cached per conversation together with how many messages they
+# cover. Next turn only the messages that newly fell out of the window are
+# folded in, and when the window is compacted it shrinks to half the budget,
+# so most turns reuse the cached summary without any LLM call.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import SystemMessage, convert_to_messages
+
+from Tokens import count_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_KEEP_RECENT = int(os.getenv("HISTORY_KEEP_RECENT", "4"))
+HISTORY_COMPACTION = os.getenv("HISTORY_COMPACTION", "summarize")  # summarize | drop
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "2048"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def message_tokens(message) -> int:
+    # ~4 tokens of per-message overhead in the chat format
+    return count_tokens(str(message.content)) + 4
+
+
+def _prefix_hash(messages) -> str:
+    h = hashlib.sha256()
+    for m in messages:
+        h.update(m.type.encode("utf-8"))
+        h.update(b"\0")
+        h.update(str(m.content).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class HistoryManager:
+    """Compacts chat history to a token budget.
+
+    summarize(previous_summary, messages) -> str and its async twin
+    asummarize are only needed when compaction == "summarize".
+    """
+
+    def __init__(self, summarize=None, asummarize=None, budget=HISTORY_TOKEN_BUDGET,
+                 keep_recent=HISTORY_KEEP_RECENT, compaction=HISTORY_COMPACTION,
+                 cache_size=HISTORY_CACHE_SIZE):
+        self.summarize = summarize
+        self.asummarize = asummarize
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.compaction = compaction
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._states = OrderedDict()   # conversation key -> (covered, prefix_hash, summary)
+
+    # -------------------------------------------------
+    # cache
+    # -------------------------------------------------
+    def _conversation_key(self, conversation_id, messages):
+        if conversation_id:
+            return conversation_id
+        # no id from the client: the first message identifies the conversation
+        return "first:" + _prefix_hash(messages[:1])
+
+    def _load_state(self, key, messages):
+        with self._lock:
+            state = self._states.get(key)
+            if state:
+                self._states.move_to_end(key)
+        if not state:
+            return 0, None
+        covered, prefix_hash, summary = state
+        if covered <= len(messages) and _prefix_hash(messages[:covered]) == prefix_hash:
+            return covered, summary
+        return 0, None   # history was edited/truncated client-side
+
+    def _save_state(self, key, messages, covered, summary):
+        with self._lock:
+            self._states[key] = (covered, _prefix_hash(messages[:covered]), summary)
+            self._states.move_to_end(key)
+            while len(self._states) > self.cache_size:
+                self._states.popitem(last=False)
+
+    # -------------------------------------------------
+    # planning
+    # -------------------------------------------------
+    def _summary_message(self, summary):
+        return [SystemMessage(content=SUMMARY_PREFIX + summary)] if summary else []
+
+    def _fits(self, summary, tail) -> bool:
+        used = sum(message_tokens(m) for m in self._summary_message(summary))
+        used += sum(message_tokens(m) for m in tail)
+        return used <= self.budget
+
+    def _new_boundary(self, messages, covered) -> int:
+        """Index from which messages stay verbatim after compaction.
+
+        Keeps the newest messages that fit in half the budget (at least
+        keep_recent of them), leaving room to grow before the next compaction.
+        """
+        target = self.budget // 2
+        used = 0
+        boundary = len(messages)
+        for i in range(len(messages) - 1, covered - 1, -1):
+            kept = len(messages) - i
+            used += message_tokens(messages[i])
+            if used > target and kept > self.keep_recent:
+                break
+            boundary = i
+        return max(boundary, covered)
+
+    def _prepare(self, chat_history, conversation_id):
+        messages = convert_to_messages(chat_history or [])
+        key = self._conversation_key(conversation_id, messages)
+        covered, summary = self._load_state(key, messages)
+        return messages, key, covered, summary
+
+    # -------------------------------------------------
+    # public
+    # -------------------------------------------------
+    def compact(self, chat_history, conversation_id=None):
+        messages, key, covered, summary = self._prepare(chat_history, conversation_id)
+        if self._fits(summary, messages[covered:]):
+            return self._summary_message(summary) + messages[covered:]
+
+        boundary = self._new_boundary(messages, covered)
+        folded = messages[covered:boundary]
+        if folded and self.compaction == "summarize" and self.summarize:
+            summary = self.summarize(summary, folded)
+        elif folded:
+            summary = None
+
+        self._save_state(key, messages, boundary, summary)
+        return self._summary_message(summary) + messages[boundary:]
+
+    async def acompact(self, chat_history, conversation_id=None):
+        messages, key, covered, summary = self._prepare(chat_history, conversation_id)
+        if self._fits(summary, messages[covered:]):
+            return self._summary_message(summary) + messages[covered:]
+
+        boundary = self._new_boundary(messages, covered)
+        folded = messages[covered:boundary]
+        if folded and self.compaction == "summarize" and self.asummarize:
+            summary = await self.asummarize(summary, folded)
+        elif folded:
+            summary = None
+
+        self._save_state(key, messages, boundary, summary)
+        return self._summary_message(summary) + messages[boundary:]
@@ -3,6 +3,7 @@ from sqlalchemy.orm import sessionmaker
 import ssl
 import os
 from dotenv import load_dotenv
+import QueryLog
 
 # SSL for Neon
 ssl_context = ssl.create_default_context()
@@ -11,6 +12,10 @@ ssl_context.verify_mode = ssl.CERT_NONE
 
 load_dotenv()  # loads .env from project root
 DATABASE_URL = os.getenv("DATABASE_URL")
+# "disable" for a local PostgreSQL without TLS (benchmarks, dev)
+DATABASE_SSL = os.getenv("DATABASE_SSL", "require")
+# statement echo is off by default; QueryLog.py records durations / slow queries
+DB_ECHO = os.getenv("DB_ECHO", "off") == "on"
 
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set in environment (.env)")
@@ -18,9 +23,10 @@ if not DATABASE_URL:
 # 1. Create ASYNC engine
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
-    connect_args={"ssl": ssl_context}
+    echo=DB_ECHO,
+    connect_args={"ssl": ssl_context} if DATABASE_SSL != "disable" else {}
 )
+QueryLog.instrument(engine, "async")
 
 # 2. Create ASYNC session factory
 AsyncSessionLocal = sessionmaker(
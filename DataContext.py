@@ -0,0 +1,239 @@
+# DataContext.py
+# Schema / dataset context injected into Ask_AI prompts, so the model can
+# write the real query straight away instead of spending a tool round trip
+# on `SELECT column_name ...` or `print(df.columns)`.
+#
+#   SQL:  tables + columns of schema<parent_id> from information_schema
+#         (cached for SCHEMA_CACHE_TTL seconds, invalidated on DDL via Run_SQL)
+#   CSV:  the file's stored profile (file_profiles, see Ingestion.py): types,
+#         null ratios, ranges, distinct counts, top values; without one,
+#         row count + column names/dtypes/nulls from DatasetCache
+
+import os
+import re
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+import DatasetCache
+from Tokens import count_tokens
+
+DATA_CONTEXT = os.getenv("DATA_CONTEXT", "on")   # on | off
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "300"))
+SCHEMA_CACHE_SIZE = 1024
+DATA_CONTEXT_TOKEN_BUDGET = int(os.getenv("DATA_CONTEXT_TOKEN_BUDGET", "600"))
+# Don't hold up the first LLM call on a slow dataset download; the load
+# keeps going in the background and the next question gets the context.
+DATA_CONTEXT_TIMEOUT = float(os.getenv("DATA_CONTEXT_TIMEOUT", "3"))
+
+_BUCKET_URL = re.compile(r"bucket_url\s*:\s*(\S+)")
+_DDL = re.compile(r"^\s*(create|alter|drop|rename)\b", re.IGNORECASE)
+
+_schema_lock = threading.Lock()
+_schemas = OrderedDict()   # schema name -> (loaded_at, text)
+
+PROFILE_QUERY = """
+    SELECT profile FROM file_profiles
+    WHERE bucket_url = :bucket_url AND status = 'ready'
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+
+COLUMNS_QUERY = """
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = :schema
+    ORDER BY table_name, ordinal_position
+"""
+
+
+def schema_name(parent_id: str) -> str:
+    # validates parent_id, which is interpolated into SQL elsewhere
+    return "schema" + str(uuid.UUID(parent_id)).replace("-", "_")
+
+
+def bucket_url_from_db_info(db_info: str) -> str | None:
+    m = _BUCKET_URL.search(db_info or "")
+    return m.group(1) if m else None
+
+
+def is_ddl(query: str) -> bool:
+    return bool(_DDL.match(query or ""))
+
+
+def _fit_budget(lines, budget=None) -> str:
+    budget = DATA_CONTEXT_TOKEN_BUDGET if budget is None else budget
+    out, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            out.append("... (truncated)")
+            break
+        out.append(line)
+        used += tokens
+    return "\n".join(out)
+
+
+# ---------------------------------------------------------
+# SQL schemas
+# ---------------------------------------------------------
+def _format_schema(rows) -> str:
+    tables = {}
+    for table_name, column_name, data_type in rows:
+        tables.setdefault(table_name, []).append(f"{column_name} {data_type}")
+    if not tables:
+        return "(no tables yet)"
+    return _fit_budget([f"{t}({', '.join(cols)})" for t, cols in tables.items()])
+
+
+def _cached_schema(schema: str):
+    with _schema_lock:
+        entry = _schemas.get(schema)
+        if entry:
+            _schemas.move_to_end(schema)
+    if entry and time.time() - entry[0] <= SCHEMA_CACHE_TTL:
+        return entry[1]
+    return None
+
+
+def _store_schema(schema: str, text_: str):
+    with _schema_lock:
+        _schemas[schema] = (time.time(), text_)
+        _schemas.move_to_end(schema)
+        while len(_schemas) > SCHEMA_CACHE_SIZE:
+            _schemas.popitem(last=False)
+
+
+def invalidate_schema(parent_id: str):
+    try:
+        schema = schema_name(parent_id)
+    except ValueError:
+        return
+    with _schema_lock:
+        _schemas.pop(schema, None)
+
+
+def sql_schema_context(parent_id: str) -> str:
+    from RunSQL import engine
+
+    schema = schema_name(parent_id)
+    cached = _cached_schema(schema)
+    if cached is not None:
+        return cached
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(COLUMNS_QUERY), {"schema": schema}).fetchall()
+    formatted = _format_schema(rows)
+    _store_schema(schema, formatted)
+    return formatted
+
+
+async def asql_schema_context(parent_id: str) -> str:
+    from ConnectToDB import engine as async_engine
+
+    schema = schema_name(parent_id)
+    cached = _cached_schema(schema)
+    if cached is not None:
+        return cached
+
+    async with async_engine.connect() as conn:
+        result = await conn.execute(text(COLUMNS_QUERY), {"schema": schema})
+        rows = result.fetchall()
+    formatted = _format_schema(rows)
+    _store_schema(schema, formatted)
+    return formatted
+
+
+# ---------------------------------------------------------
+# CSV datasets
+# ---------------------------------------------------------
+def format_dataset_summary(summary: dict) -> str:
+    lines = [f"df: {summary['rows']} rows x {summary['column_count']} columns"]
+    for col in summary["columns"]:
+        line = f"- {col['name']} ({col['dtype']}, {col['nulls']} nulls)"
+        if col.get("example") is not None:
+            line += f" e.g. {col['example']!r}"
+        lines.append(line)
+    return _fit_budget(lines)
+
+
+def _range(col) -> str:
+    if col.get("min") is None:
+        return ""
+    if col["min"] == col["max"]:
+        return f", always {col['min']!r}"
+    return f", {col['min']!r}..{col['max']!r}"
+
+
+def format_profile(profile: dict) -> str:
+    lines = [f"df: {profile['rows']} rows x {profile['column_count']} columns"]
+    for col in profile["columns"]:
+        distinct = ("" if col.get("distinct_exact") else "~") + str(col["distinct"])
+        line = (f"- {col['name']} ({col['type']}, {col['null_ratio']:.0%} null"
+                f"{_range(col)}, {distinct} distinct)")
+        if col.get("top_values"):
+            line += " top: " + ", ".join(repr(v) for v, _ in col["top_values"][:5])
+        lines.append(line)
+    return _fit_budget(lines)
+
+
+def stored_profile(bucket_url: str) -> dict | None:
+    from RunSQL import engine
+
+    with engine.connect() as conn:
+        row = conn.execute(text(PROFILE_QUERY), {"bucket_url": bucket_url}).first()
+    return row[0] if row else None
+
+
+def csv_dataset_context(bucket_url: str) -> str:
+    try:
+        profile = stored_profile(bucket_url)
+    except Exception as e:
+        print("DATA CONTEXT PROFILE ERROR:", e)
+        profile = None
+    if profile:
+        return format_profile(profile)
+
+    summary = DatasetCache.get_summary(bucket_url)
+    return format_dataset_summary(summary) if summary else ""
+
+
+# ---------------------------------------------------------
+# Entry points used by Ask_AI
+# ---------------------------------------------------------
+def build_data_context(db_info: str, parent_id: str) -> str:
+    if DATA_CONTEXT == "off":
+        return ""
+    try:
+        if db_info.startswith("SQL"):
+            return sql_schema_context(parent_id)
+        if db_info.startswith("CSV"):
+            bucket_url = bucket_url_from_db_info(db_info)
+            return csv_dataset_context(bucket_url) if bucket_url else ""
+    except Exception as e:
+        print("DATA CONTEXT ERROR:", e)
+    return ""
+
+
+async def abuild_data_context(db_info: str, parent_id: str) -> str:
+    if DATA_CONTEXT == "off":
+        return ""
+    try:
+        if db_info.startswith("SQL"):
+            return await asyncio.wait_for(asql_schema_context(parent_id), DATA_CONTEXT_TIMEOUT)
+        if db_info.startswith("CSV"):
+            bucket_url = bucket_url_from_db_info(db_info)
+            if not bucket_url:
+                return ""
+            # shield: a timeout only stops waiting, the load finishes and is cached
+            task = asyncio.ensure_future(asyncio.to_thread(csv_dataset_context, bucket_url))
+            return await asyncio.wait_for(asyncio.shield(task), DATA_CONTEXT_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    except Exception as e:
+        print("DATA CONTEXT ERROR:", e)
+    return ""
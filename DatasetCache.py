@@ -0,0 +1,253 @@
+# DatasetCache.py
+# In-process cache of parsed CSV datasets and their column summaries, keyed
+# by bucket_url. Used by the API process (Ask_AI prompt context); datasets
+# are loaded with the runner's own loader so parsing matches what `df` is
+# inside /run.
+#
+#   DATASET_CACHE_MAX_BYTES  memory budget for cached DataFrames (LRU)
+#   DATASET_CACHE_TTL        seconds before a cached DataFrame is reloaded
+#
+# It also answers "is there a Parquet version of this CSV?" (files.parquet_url,
+# written by Ingestion.py) for the runner, CSVSQL and its own loads:
+#
+#   PARQUET_LOOKUP_TTL       seconds a lookup (hit or miss) is cached
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from Metrics import record_download
+from Tracing import span
+
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DATASET_CACHE_TTL = float(os.getenv("DATASET_CACHE_TTL", "600"))
+SUMMARY_CACHE_SIZE = 1024
+PARQUET_LOOKUP_CACHE_SIZE = 4096
+PARQUET_LOOKUP_TTL = float(os.getenv("PARQUET_LOOKUP_TTL", "60"))
+
+PARQUET_QUERY = """
+    SELECT parquet_url FROM files
+    WHERE bucket_url = :bucket_url AND parquet_status = 'ready' AND parquet_url IS NOT NULL
+    LIMIT 1
+"""
+
+_lock = threading.Lock()
+_frames = OrderedDict()      # bucket_url -> (loaded_at, df, nbytes)
+_frames_bytes = 0
+_summaries = OrderedDict()   # bucket_url -> (loaded_at, summary)
+_load_locks = {}             # bucket_url -> [Lock, waiters]; only datasets being loaded
+_parquet_urls = OrderedDict()   # bucket_url -> (checked_at, parquet_url or None)
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "load_errors": 0}
+
+
+@contextmanager
+def _load_lock(bucket_url: str):
+    """One download per dataset at a time. The entry is dropped when the
+    last thread waiting on it is done, so the dict stays small."""
+    with _lock:
+        entry = _load_locks.get(bucket_url)
+        if entry is None:
+            entry = _load_locks[bucket_url] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if not entry[1]:
+                _load_locks.pop(bucket_url, None)
+
+
+def _cached_frame(bucket_url: str):
+    with _lock:
+        entry = _frames.get(bucket_url)
+        if entry and time.time() - entry[0] <= DATASET_CACHE_TTL:
+            _frames.move_to_end(bucket_url)
+            stats["hits"] += 1
+            return entry[1]
+    return None
+
+
+def _store_frame(bucket_url: str, df):
+    global _frames_bytes
+    # deep=True: object/string columns are counted by their contents, not
+    # 8 bytes per pointer. Computed once here, outside the lock.
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    with _lock:
+        old = _frames.pop(bucket_url, None)
+        if old:
+            _frames_bytes -= old[2]
+        _frames[bucket_url] = (time.time(), df, nbytes)
+        _frames_bytes += nbytes
+        while len(_frames) > 1 and _frames_bytes > DATASET_CACHE_MAX_BYTES:
+            _, (_, _, dropped) = _frames.popitem(last=False)
+            _frames_bytes -= dropped
+            stats["evictions"] += 1
+
+
+# ---------------------------------------------------------
+# Parquet companions
+# ---------------------------------------------------------
+def _cached_parquet_url(bucket_url: str):
+    """(True, url or None) if looked up recently, else (False, None)."""
+    with _lock:
+        entry = _parquet_urls.get(bucket_url)
+        if entry:
+            _parquet_urls.move_to_end(bucket_url)
+    if entry and time.time() - entry[0] <= PARQUET_LOOKUP_TTL:
+        return True, entry[1]
+    return False, None
+
+
+def set_parquet_url(bucket_url: str, parquet_url: str | None):
+    with _lock:
+        _parquet_urls[bucket_url] = (time.time(), parquet_url)
+        _parquet_urls.move_to_end(bucket_url)
+        while len(_parquet_urls) > PARQUET_LOOKUP_CACHE_SIZE:
+            _parquet_urls.popitem(last=False)
+
+
+def parquet_url_sync(bucket_url: str) -> str | None:
+    found, url = _cached_parquet_url(bucket_url)
+    if found:
+        return url
+    from sqlalchemy import text
+    from RunSQL import engine
+
+    try:
+        with engine.connect() as conn:
+            url = conn.execute(text(PARQUET_QUERY), {"bucket_url": bucket_url}).scalar()
+    except Exception as e:
+        print("PARQUET LOOKUP ERROR:", e)
+        return None
+    set_parquet_url(bucket_url, url)
+    return url
+
+
+async def parquet_url(bucket_url: str) -> str | None:
+    found, url = _cached_parquet_url(bucket_url)
+    if found:
+        return url
+    from sqlalchemy import text
+    from ConnectToDB import engine as async_engine
+
+    try:
+        async with async_engine.connect() as conn:
+            result = await conn.execute(text(PARQUET_QUERY), {"bucket_url": bucket_url})
+            url = result.scalar()
+    except Exception as e:
+        print("PARQUET LOOKUP ERROR:", e)
+        return None
+    set_parquet_url(bucket_url, url)
+    return url
+
+
+# ---------------------------------------------------------
+# DataFrames
+# ---------------------------------------------------------
+def _load(bucket_url: str):
+    from python_runner.runner import download_from_supabase, csv_bytes_to_df, parquet_bytes_to_df
+
+    parquet = parquet_url_sync(bucket_url)
+    if parquet:
+        with span("storage.download", bucket_url=parquet) as s:
+            raw = download_from_supabase(parquet)
+            if s is not None:
+                s.set(bytes=len(raw or b""))
+        if raw:
+            record_download("dataset_cache", len(raw))
+            with span("parquet.read"):
+                df = parquet_bytes_to_df(raw)
+            if df is not None:
+                return df
+
+    with span("storage.download", bucket_url=bucket_url) as s:
+        raw = download_from_supabase(bucket_url)
+        if s is not None:
+            s.set(bytes=len(raw or b""))
+    if raw:
+        record_download("dataset_cache", len(raw))
+    with span("csv.parse"):
+        return csv_bytes_to_df(raw)
+
+
+def get_dataframe(bucket_url: str):
+    """Parsed DataFrame for `bucket_url`, or None if it can't be loaded."""
+    if not bucket_url:
+        return None
+
+    df = _cached_frame(bucket_url)
+    if df is not None:
+        return df
+
+    with _load_lock(bucket_url):
+        df = _cached_frame(bucket_url)
+        if df is not None:
+            return df
+
+        with _lock:
+            stats["misses"] += 1
+        df = _load(bucket_url)
+        if df is None:
+            with _lock:
+                stats["load_errors"] += 1
+            return None
+
+        _store_frame(bucket_url, df)
+        return df
+
+
+def summarize_dataframe(df, max_columns: int = 60) -> dict:
+    columns = []
+    for name in list(df.columns)[:max_columns]:
+        series = df[name]
+        non_null = series.dropna()
+        columns.append({
+            "name": str(name),
+            "dtype": str(series.dtype),
+            "nulls": int(series.isna().sum()),
+            "example": str(non_null.iloc[0])[:40] if len(non_null) else None,
+        })
+    return {
+        "rows": int(len(df)),
+        "column_count": int(df.shape[1]),
+        "columns": columns,
+    }
+
+
+def get_summary(bucket_url: str) -> dict | None:
+    """Column/dtype summary of a dataset (cached separately from the frame)."""
+    with _lock:
+        entry = _summaries.get(bucket_url)
+        if entry and time.time() - entry[0] <= DATASET_CACHE_TTL:
+            _summaries.move_to_end(bucket_url)
+            return entry[1]
+
+    df = get_dataframe(bucket_url)
+    if df is None:
+        return None
+
+    summary = summarize_dataframe(df)
+    with _lock:
+        _summaries[bucket_url] = (time.time(), summary)
+        while len(_summaries) > SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return summary
+
+
+def invalidate(bucket_url: str):
+    global _frames_bytes
+    with _lock:
+        old = _frames.pop(bucket_url, None)
+        if old:
+            _frames_bytes -= old[2]
+        _summaries.pop(bucket_url, None)
+
+
+def cache_stats() -> dict:
+    with _lock:
+        return {**stats, "datasets": len(_frames), "bytes": _frames_bytes}
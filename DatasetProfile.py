@@ -0,0 +1,185 @@
+# DatasetProfile.py
+# Column profile of a CSV in one streaming pass: chunks of PROFILE_CHUNK_ROWS
+# rows parsed with the runner's own options (python_runner.runner.
+# iter_csv_chunks), so the profile describes the same `df` that /run and
+# Ask_AI see, while memory stays at one chunk plus bounded per-column state:
+#
+#   type          integer | float | boolean | string (pandas dtype per chunk, merged)
+#   null_ratio    nulls / rows
+#   min / max     exact
+#   distinct      estimate from a KMV sketch (exact below PROFILE_SKETCH_SIZE values)
+#   histogram     numeric: PROFILE_BINS bins over [min, max], from a uniform
+#                 sample of PROFILE_SAMPLE_SIZE values, scaled to the row count
+#   top_values    string / boolean: most frequent values (approximate counts),
+#                 omitted when every value is unique
+#
+# Pure computation; Ingestion.py runs it after /files/create and stores the
+# result in file_profiles.
+
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+PROFILE_VERSION = 2   # 2: parsed with the runner's CSV options
+PROFILE_CHUNK_ROWS = int(os.getenv("PROFILE_CHUNK_ROWS", "100000"))
+PROFILE_SKETCH_SIZE = 1024
+PROFILE_SAMPLE_SIZE = 10000
+PROFILE_BINS = 10
+PROFILE_TOP_VALUES = 10
+_TOP_KEEP = 1000   # candidates kept between chunks for top_values
+
+_HASH_SPACE = float(2 ** 64)
+
+
+def _kind(series) -> str | None:
+    if series.isna().all():
+        return None   # all-null chunk says nothing about the type
+    kind = series.dtype.kind
+    if kind in "iu":
+        return "integer"
+    if kind == "f":
+        return "float"
+    if kind == "b" or pd.api.types.infer_dtype(series, skipna=True) == "boolean":
+        return "boolean"   # object dtype when the chunk has nulls
+    return "string"
+
+
+def _merge_kind(a, b):
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {"integer", "float"}:
+        return "float"
+    return "string"
+
+
+class _Column:
+    def __init__(self, name):
+        self.name = name
+        self.kind = None
+        self.rows = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.sketch = np.empty(0, dtype=np.uint64)      # KMV: smallest distinct hashes
+        self.sample_keys = np.empty(0)                  # bottom-k sampling keys
+        self.sample = np.empty(0)
+        self.top = {}
+
+    def add(self, series, rng):
+        self.rows += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        self.kind = _merge_kind(self.kind, _kind(series))
+        if values.empty:
+            return
+
+        numeric = values.dtype.kind in "iuf"
+        if not numeric:
+            values = values.astype(str)
+
+        self.min = _extreme(min, self.min, values.min())
+        self.max = _extreme(max, self.max, values.max())
+
+        hashes = np.unique(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        self.sketch = np.unique(np.concatenate([self.sketch, hashes[:PROFILE_SKETCH_SIZE]]))[:PROFILE_SKETCH_SIZE]
+
+        if numeric:
+            keys = rng.random(len(values))
+            all_keys = np.concatenate([self.sample_keys, keys])
+            all_values = np.concatenate([self.sample, values.to_numpy(dtype=float)])
+            keep = np.argsort(all_keys)[:PROFILE_SAMPLE_SIZE]
+            self.sample_keys, self.sample = all_keys[keep], all_values[keep]
+        else:
+            for value, count in values.value_counts().head(_TOP_KEEP).items():
+                self.top[value] = self.top.get(value, 0) + int(count)
+            if len(self.top) > 2 * _TOP_KEEP:
+                self.top = dict(sorted(self.top.items(), key=lambda kv: -kv[1])[:_TOP_KEEP])
+
+    def distinct(self) -> int:
+        if len(self.sketch) < PROFILE_SKETCH_SIZE:
+            return int(len(self.sketch))
+        kth = float(self.sketch[-1]) / _HASH_SPACE
+        return min(int((PROFILE_SKETCH_SIZE - 1) / kth), self.rows - self.nulls)
+
+    def histogram(self):
+        if self.kind not in ("integer", "float") or not len(self.sample):
+            return None
+        lo, hi = float(self.min), float(self.max)
+        counts, edges = np.histogram(self.sample, bins=PROFILE_BINS, range=(lo, hi) if hi > lo else None)
+        scale = (self.rows - self.nulls) / len(self.sample)
+        return {
+            "edges": [round(float(e), 6) for e in edges],
+            "counts": [int(round(c * scale)) for c in counts],
+        }
+
+    def result(self) -> dict:
+        out = {
+            "name": str(self.name),
+            "type": self.kind or "empty",
+            "nulls": self.nulls,
+            "null_ratio": round(self.nulls / self.rows, 4) if self.rows else 0.0,
+            "min": _plain(self.min),
+            "max": _plain(self.max),
+            "distinct": self.distinct(),
+            "distinct_exact": len(self.sketch) < PROFILE_SKETCH_SIZE,
+        }
+        histogram = self.histogram()
+        if histogram:
+            out["histogram"] = histogram
+        elif self.top:
+            top = sorted(self.top.items(), key=lambda kv: -kv[1])[:PROFILE_TOP_VALUES]
+            if top[0][1] > 1:   # not for id-like columns
+                out["top_values"] = [[_plain(v), c] for v, c in top]
+        return out
+
+
+def _extreme(fn, current, value):
+    if current is None:
+        return value
+    try:
+        return fn(current, value)
+    except TypeError:   # column turned from numbers into text in a later chunk
+        return fn(str(current), str(value))
+
+
+def _plain(value):
+    """numpy scalars -> Python, long strings cut."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str) and len(value) > 80:
+        value = value[:80] + "..."
+    return value
+
+
+def profile_chunks(chunks, nbytes: int | None = None) -> dict:
+    """Profile a dataset given as an iterable of DataFrame chunks.
+    `nbytes` is the size of the source file, reported as-is."""
+    rng = np.random.default_rng(0)
+    columns = {}
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        for name in chunk.columns:
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = _Column(name)
+            column.add(chunk[name], rng)
+
+    return {
+        "version": PROFILE_VERSION,
+        "profiled_at": datetime.now(timezone.utc).isoformat(),
+        "bytes": nbytes,
+        "rows": rows,
+        "column_count": len(columns),
+        "columns": [c.result() for c in columns.values()],
+    }
+
+
+def profile_csv(raw: bytes) -> dict:
+    """Profile CSV bytes in one streaming pass over PROFILE_CHUNK_ROWS-row chunks."""
+    from python_runner.runner import iter_csv_chunks
+    return profile_chunks(iter_csv_chunks(raw, PROFILE_CHUNK_ROWS), len(raw))
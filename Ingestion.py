@@ -0,0 +1,157 @@
+# Ingestion.py
+# Background work on a CSV after /files/create. The file is downloaded once;
+# both steps stream it in chunks with the runner's own parser options
+# (iter_csv_chunks), so memory is the raw bytes plus one chunk, never the
+# whole DataFrame:
+#
+#   profile   column profile (DatasetProfile.py), stored in file_profiles and
+#             served by GET /files/{id}/profile and the Ask_AI data context
+#   parquet   typed, zstd-compressed Parquet copy uploaded next to the CSV
+#             (<bucket_url>.parquet), tracked in files.parquet_url/parquet_status.
+#             Column types come from the profile (merged over all chunks), and
+#             each chunk is written as a row group.
+#             The runner, DatasetCache and CSVSQL load it instead of parsing text.
+#
+#   INGEST=on|off          run jobs after /files/create (default on)
+#   INGEST_PARQUET=on|off  write the Parquet copy (default on)
+#   INGEST_CONCURRENCY     jobs running at once per process (default 2)
+#
+# Jobs are asyncio tasks in the API process; the download and the pandas
+# work run on threads. A CSV that can't be converted keeps its profile; one
+# that can't be profiled gets no Parquet copy. Readers fall back to the CSV. A job lost
+# to a restart leaves its rows "pending"; POST /files/{id}/profile starts it again.
+
+import os
+import time
+import asyncio
+
+from Metrics import Counter, Histogram, record_download
+from Tracing import span
+from CRUD import upsert_file_profile, set_file_parquet
+import DatasetCache
+
+INGEST = os.getenv("INGEST", "on")
+INGEST_PARQUET = os.getenv("INGEST_PARQUET", "on")
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+
+INGEST_JOBS = Counter("xbase_ingest_jobs_total", "Ingestion steps by outcome.", ["step", "outcome"])
+INGEST_SECONDS = Histogram("xbase_ingest_step_duration_seconds", "Ingestion step duration.", ["step"])
+
+_slots = None    # asyncio.Semaphore, created on the running loop
+_tasks = set()   # keeps running jobs referenced until they finish
+
+
+def _download(bucket_url: str) -> bytes:
+    from python_runner.runner import download_from_supabase
+
+    raw = download_from_supabase(bucket_url)
+    if not raw:
+        raise RuntimeError(f"Could not download {bucket_url}")
+    record_download("ingest", len(raw))
+    return raw
+
+
+def _profile(raw: bytes) -> dict:
+    import DatasetProfile
+    return DatasetProfile.profile_csv(raw)
+
+
+def _arrow_schema(profile: dict):
+    """Parquet schema matching what csv_bytes_to_df would give for the whole file."""
+    import pyarrow as pa
+
+    types = {"integer": pa.int64(), "float": pa.float64(), "boolean": pa.bool_(), "string": pa.string()}
+    fields = []
+    for column in profile["columns"]:
+        kind = column["type"]
+        if kind == "integer" and column["nulls"]:
+            kind = "float"   # pandas reads integers with gaps as float
+        fields.append(pa.field(column["name"], types.get(kind, pa.float64())))
+    return pa.schema(fields)
+
+
+def _parquet(bucket_url: str, raw: bytes, profile: dict) -> str:
+    """Upload the dataset as Parquet, one row group per chunk; return its path."""
+    import io
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from DatasetProfile import PROFILE_CHUNK_ROWS
+    from python_runner.runner import iter_csv_chunks, upload_to_supabase
+
+    schema = _arrow_schema(profile)
+    # text columns are read as text, so "007" stays "007" in every chunk
+    strings = {field.name: str for field in schema if field.type == pa.string()}
+    buf = io.BytesIO()
+    with pq.ParquetWriter(buf, schema, compression="zstd") as writer:
+        for chunk in iter_csv_chunks(raw, PROFILE_CHUNK_ROWS, dtype=strings):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    parquet_url = bucket_url + ".parquet"
+    upload_to_supabase(parquet_url, buf.getvalue(), "application/vnd.apache.parquet")
+    return parquet_url
+
+
+async def _step(name: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        with span(f"ingest.{name}"):
+            result = await asyncio.to_thread(fn, *args)
+    except Exception:
+        INGEST_JOBS.inc(name, "error")
+        raise
+    INGEST_JOBS.inc(name, "ok")
+    INGEST_SECONDS.observe(time.perf_counter() - started, name)
+    return result
+
+
+async def ingest_file(file_id, bucket_url: str):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+    parquet = INGEST_PARQUET != "off"
+    try:
+        await upsert_file_profile(file_id, bucket_url, "pending")
+        if parquet:
+            await set_file_parquet(file_id, "pending")
+        async with _slots:
+            try:
+                raw = await _step("download", _download, bucket_url)
+            except Exception as e:
+                print("INGEST ERROR:", bucket_url, e)
+                await upsert_file_profile(file_id, bucket_url, "failed", error=str(e)[:500])
+                if parquet:
+                    await set_file_parquet(file_id, "failed")
+                return
+
+            profile = None
+            try:
+                profile = await _step("profile", _profile, raw)
+                await upsert_file_profile(file_id, bucket_url, "ready", profile=profile)
+            except Exception as e:
+                print("INGEST ERROR:", bucket_url, e)
+                await upsert_file_profile(file_id, bucket_url, "failed", error=str(e)[:500])
+
+            if parquet and profile is None:
+                await set_file_parquet(file_id, "failed")
+            elif parquet:
+                try:
+                    parquet_url = await _step("parquet", _parquet, bucket_url, raw, profile)
+                except Exception as e:
+                    print("INGEST ERROR:", bucket_url, e)
+                    await set_file_parquet(file_id, "failed")
+                else:
+                    await set_file_parquet(file_id, "ready", parquet_url)
+                    DatasetCache.set_parquet_url(bucket_url, parquet_url)
+    except Exception as e:
+        # the database itself failed; nothing to record the error in
+        print("INGEST ERROR:", bucket_url, e)
+
+
+def schedule(file_id, bucket_url: str):
+    """Start ingest_file in the background (no-op with INGEST=off)."""
+    if INGEST == "off":
+        return None
+    task = asyncio.create_task(ingest_file(file_id, bucket_url))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
@@ -0,0 +1,253 @@
+# LLMBackend.py
+# Pluggable chat / embedding backends for Ask_AI and RAGIndex.
+#
+#   LLM_BACKEND=openai (default)  ChatOpenAI; needs OPENAI_API_KEY on first use
+#   LLM_BACKEND=fake              FakeChatModel: local, deterministic, no network
+#
+#   RAG_EMBEDDINGS=openai | local | huggingface
+#       (defaults to local when LLM_BACKEND=fake, openai otherwise)
+#
+# FakeChatModel knobs (for load tests):
+#   FAKE_LLM_LATENCY_MS        delay before each response
+#   FAKE_LLM_TOKEN_LATENCY_MS  delay between streamed tokens
+#   FAKE_LLM_TOOL_CALLS        tool calls per planning turn (0 = plain answer)
+#   FAKE_LLM_SCRIPT            JSON file with {"plan": [...], "summary": [...]}
+#                              responses ({"content", "tool_calls"}) used in turn
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import itertools
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+EMBEDDINGS_BACKEND = os.getenv("RAG_EMBEDDINGS") or ("local" if LLM_BACKEND == "fake" else "openai")
+HF_MODEL = os.getenv("RAG_HF_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def chat_model_id() -> str:
+    """Identifies the model in cache keys."""
+    return f"{LLM_BACKEND}:{CHAT_MODEL}"
+
+
+# ---------------------------------------------------------
+# Chat models
+# ---------------------------------------------------------
+def get_chat_model():
+    if LLM_BACKEND == "openai":
+        from langchain_openai import ChatOpenAI
+        if not os.getenv("OPENAI_API_KEY"):
+            raise RuntimeError("OPENAI_API_KEY missing (or set LLM_BACKEND=fake)")
+        return ChatOpenAI(model=CHAT_MODEL, temperature=0)
+
+    if LLM_BACKEND == "fake":
+        return _fake_chat_model_cls()(
+            latency=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")) / 1000,
+            token_latency=float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "0")) / 1000,
+            tool_calls_per_turn=int(os.getenv("FAKE_LLM_TOOL_CALLS", "1")),
+            script_path=os.getenv("FAKE_LLM_SCRIPT") or None,
+        )
+
+    raise ValueError(f"Unknown LLM_BACKEND: {LLM_BACKEND}")
+
+
+_BUCKET_URL = re.compile(r"bucket_url\s*:\s*(\S+)")
+
+
+def _fake_chat_model_cls():
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    class FakeChatModel(BaseChatModel):
+        """Deterministic stand-in for the chat model.
+
+        Planning turns (no ToolMessage in the prompt) emit tool calls that
+        match db_info: Run_SQL for "SQL:", Run_Python for "CSV:". Turns that
+        already contain tool results get a short summary. A script file,
+        if given, replaces these defaults turn by turn.
+        """
+
+        latency: float = 0.0
+        token_latency: float = 0.0
+        tool_calls_per_turn: int = 1
+        script_path: str | None = None
+
+        _script: dict | None = None
+        _cursor: dict | None = None
+        _lock: object = None
+
+        @property
+        def _llm_type(self) -> str:
+            return "xbase-fake"
+
+        def bind_tools(self, tools, **kwargs):
+            # tool calls come from the script / heuristics, not a schema
+            return self
+
+        # -------------------------------------------------
+        # deterministic responses
+        # -------------------------------------------------
+        def _scripted(self, phase):
+            if not self.script_path:
+                return None
+            if self._script is None:
+                with open(self.script_path, "r", encoding="utf-8") as f:
+                    self._script = json.load(f)
+                self._cursor = {k: itertools.cycle(v) for k, v in self._script.items() if v}
+                self._lock = threading.Lock()
+            if phase not in self._cursor:
+                return None
+            with self._lock:
+                return next(self._cursor[phase])
+
+        def _respond(self, messages):
+            text = "\n".join(str(m.content) for m in messages)
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+            tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+
+            if tool_results:
+                step = self._scripted("summary")
+                if step:
+                    return AIMessage(content=step.get("content", ""))
+                first = str(tool_results[0].content).splitlines()[:3]
+                return AIMessage(content=(
+                    f"Ran {len(tool_results)} tool call(s). First result: " + " / ".join(first)
+                ))
+
+            step = self._scripted("plan")
+            if step:
+                calls = [
+                    {"name": c["name"], "args": c.get("args", {}), "id": f"call_{digest}_{i}"}
+                    for i, c in enumerate(step.get("tool_calls", []))
+                ]
+                return AIMessage(content=step.get("content", ""), tool_calls=calls)
+
+            system = str(messages[0].content) if messages else ""
+            is_csv = "DATABASE INFO:\nCSV" in system
+            m = _BUCKET_URL.search(system)
+            bucket_url = m.group(1) if m else ""
+
+            calls = []
+            for i in range(self.tool_calls_per_turn):
+                if is_csv:
+                    calls.append({
+                        "name": "Run_Python",
+                        "args": {"bucket_url": bucket_url, "input": f"print(df.head({i + 5}))"},
+                        "id": f"call_{digest}_{i}",
+                    })
+                else:
+                    calls.append({
+                        "name": "Run_SQL",
+                        "args": {"input": f"SELECT {i + 1} AS n"},
+                        "id": f"call_{digest}_{i}",
+                    })
+            content = "Here is the query I will run." if calls else "This is a fake answer."
+            return AIMessage(content=content, tool_calls=calls)
+
+        # -------------------------------------------------
+        # BaseChatModel hooks
+        # -------------------------------------------------
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+        def _chunks(self, message):
+            tokens = re.findall(r"\S+\s*", message.content) or [""]
+            for token in tokens:
+                yield AIMessageChunk(content=token)
+            if message.tool_calls:
+                yield AIMessageChunk(content="", tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                    for i, c in enumerate(message.tool_calls)
+                ])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            if self.latency:
+                time.sleep(self.latency)
+            for chunk in self._chunks(self._respond(messages)):
+                if self.token_latency:
+                    time.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=chunk)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for chunk in self._chunks(self._respond(messages)):
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=chunk)
+
+    return FakeChatModel
+
+
+# ---------------------------------------------------------
+# Embeddings
+# ---------------------------------------------------------
+def _hashing_embeddings_cls():
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+
+    class HashingEmbeddings(Embeddings):
+        """Offline bag-of-words embeddings (feature hashing, L2-normalised).
+
+        No network, no model download, deterministic across processes.
+        """
+
+        def __init__(self, dim: int = 1024):
+            self.dim = dim
+
+        def _embed(self, text: str):
+            vec = np.zeros(self.dim, dtype="float32")
+            for token in re.findall(r"[a-z0-9_]+", text.lower()):
+                h = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:8], "little")
+                vec[h % self.dim] += 1.0 if (h >> 63) == 0 else -1.0
+            norm = float(np.linalg.norm(vec))
+            return (vec / norm if norm else vec).tolist()
+
+        def embed_documents(self, texts):
+            return [self._embed(t) for t in texts]
+
+        def embed_query(self, text):
+            return self._embed(text)
+
+    return HashingEmbeddings
+
+
+def get_embeddings(backend: str | None = None):
+    backend = backend or EMBEDDINGS_BACKEND
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY missing (or set RAG_EMBEDDINGS=local)")
+        return OpenAIEmbeddings(openai_api_key=api_key)
+
+    if backend == "local":
+        return _hashing_embeddings_cls()()
+
+    if backend == "huggingface":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=HF_MODEL)
+
+    raise ValueError(f"Unknown embeddings backend: {backend}")
+
+
+def embeddings_id(backend: str | None = None) -> str:
+    backend = backend or EMBEDDINGS_BACKEND
+    return f"{backend}:{HF_MODEL}" if backend == "huggingface" else backend
@@ -0,0 +1,254 @@
+# LLMCache.py
+# Response cache for Ask_AI's planning and summarization LLM calls.
+#
+# Keyed on a hash of model, prompt, db_info, chat history, retrieved context
+# and scratchpad, so a hit is only possible when the model would see exactly
+# the same input. Backends:
+#   LLM_CACHE=sqlite (default)  local SQLite file, shared by all workers
+#   LLM_CACHE=memory            per-process dict
+#   LLM_CACHE=off               disabled
+# Entries expire after LLM_CACHE_TTL seconds; when LLM_CACHE_MAX_ENTRIES or
+# LLM_CACHE_MAX_BYTES is exceeded the least recently used entries are evicted.
+# The SQLite backend evicts in batches, down to LLM_CACHE_EVICT_TO (0.9) of
+# both limits, so a full cache doesn't pay for an eviction on every insert.
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE = os.getenv("LLM_CACHE", "sqlite")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3")
+)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LLM_CACHE_EVICT_TO = float(os.getenv("LLM_CACHE_EVICT_TO", "0.9"))
+
+
+def make_key(**parts) -> str:
+    """Stable hash of the call inputs (anything json can't encode goes through str)."""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------
+# Backends
+# ---------------------------------------------------------
+class BaseLLMCache:
+    """get/set of serialized responses plus hit-rate counters."""
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def _count(self, field: str, n: int = 1):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class NullLLMCache(BaseLLMCache):
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryLLMCache(BaseLLMCache):
+    def __init__(self, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_bytes=LLM_CACHE_MAX_BYTES):
+        super().__init__()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (created_at, value)
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and time.time() - entry[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self._count("hits")
+                return entry[1]
+            if entry:
+                self._bytes -= len(entry[1])
+                del self._data[key]
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old:
+                self._bytes -= len(old[1])
+            self._data[key] = (time.time(), value)
+            self._bytes += len(value)
+            evicted = 0
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, dropped) = self._data.popitem(last=False)
+                self._bytes -= len(dropped)
+                evicted += 1
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            size = {"entries": len(self._data), "bytes": self._bytes}
+        return {**super().stats(), **size}
+
+
+class SQLiteLLMCache(BaseLLMCache):
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL,
+                 max_entries=LLM_CACHE_MAX_ENTRIES, max_bytes=LLM_CACHE_MAX_BYTES):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            # WAL: several worker processes can share one cache file
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)"
+            )
+            # TTL purge on every set is a range delete, not a table scan
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_created_at ON llm_cache (created_at)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute(
+                    "UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._count("hits")
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            evicted = self._evict(now)
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, now) -> int:
+        evicted = self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return evicted
+
+        # drop least recently used rows down to LLM_CACHE_EVICT_TO of both
+        # limits; rows are read lazily off ix_llm_cache_last_access
+        max_count = int(self.max_entries * LLM_CACHE_EVICT_TO)
+        max_total = int(self.max_bytes * LLM_CACHE_EVICT_TO)
+        victims = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        ):
+            if count <= max_count and total <= max_total:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        return evicted + len(victims)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        return {**super().stats(), "entries": count, "bytes": total}
+
+
+# ---------------------------------------------------------
+# Factory
+# ---------------------------------------------------------
+def create_llm_cache(kind: str | None = None) -> BaseLLMCache:
+    kind = kind or LLM_CACHE
+    if kind == "sqlite":
+        return SQLiteLLMCache()
+    if kind == "memory":
+        return MemoryLLMCache()
+    if kind == "off":
+        return NullLLMCache()
+    raise ValueError(f"Unknown LLM_CACHE backend: {kind}")
@@ -0,0 +1,245 @@
+# Metrics.py
+# In-process metrics in the Prometheus text format, served on GET /metrics.
+#
+# Counters / histograms are plain dicts behind one lock per metric, so an
+# update on a hot path is a dict lookup and an add. Values that already live
+# elsewhere (DB pools, cache stats) are read by collectors at scrape time
+# only. Metrics are per process: with several uvicorn workers, scrape each
+# worker or aggregate by instance.
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []     # metrics, in registration order
+_collectors = []   # callables returning [(name, type, help, [(labels, value), ...])]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {} if labelnames else {(): 0}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def expose(self):
+        lines = super().expose()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+        if not labelnames:
+            self._values[()] = [0] * (len(self.buckets) + 1) + [0.0]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def expose(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = [("le", _number(float(bound)))]
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(row[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def register_collector(fn):
+    """fn() -> [(name, "gauge"|"counter", help, [(labels_dict, value), ...]), ...]"""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines += metric.expose()
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {_escape(e)}")
+            continue
+        for name, kind, help, samples in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                label_str = _labels(list(labels), list(labels.values()))
+                lines.append(f"{name}{label_str} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# Shared metrics
+# ---------------------------------------------------------
+HTTP_REQUESTS = Counter(
+    "xbase_http_requests_total", "HTTP requests by route, method and status.",
+    ["route", "method", "status"],
+)
+HTTP_SECONDS = Histogram(
+    "xbase_http_request_duration_seconds", "HTTP request latency by route (until the last body byte).",
+    ["route", "method"],
+)
+HTTP_IN_FLIGHT = Gauge("xbase_http_requests_in_flight", "Requests being handled.")
+
+RUNNER_QUEUED = Gauge("xbase_runner_queued", "Runner jobs waiting for a pool slot.")
+RUNNER_ACTIVE = Gauge("xbase_runner_active", "Runner subprocesses currently running.")
+RUNNER_RUNS = Counter("xbase_runner_runs_total", "Runner jobs by outcome.", ["outcome"])
+RUNNER_SECONDS = Histogram("xbase_runner_duration_seconds", "Runner subprocess wall time.")
+
+LLM_REQUESTS = Counter("xbase_llm_requests_total", "Ask_AI LLM calls by kind and cache result.",
+                       ["kind", "cache"])
+LLM_SECONDS = Histogram("xbase_llm_request_duration_seconds",
+                        "Latency of LLM calls that reached the model.", ["kind"])
+
+STORAGE_BYTES = Counter("xbase_storage_downloaded_bytes_total",
+                        "Bytes downloaded from Supabase storage.", ["source"])
+STORAGE_DOWNLOADS = Counter("xbase_storage_downloads_total",
+                            "Downloads from Supabase storage.", ["source"])
+
+
+def record_download(source: str, nbytes: int):
+    STORAGE_DOWNLOADS.inc(source)
+    STORAGE_BYTES.inc(source, amount=nbytes)
+
+
+# ---------------------------------------------------------
+# Collectors for values kept elsewhere
+# ---------------------------------------------------------
+def pool_collector(engines: dict):
+    """Connection pool usage for {"name": engine} (sync or async engines)."""
+    def collect():
+        families = {
+            "xbase_db_pool_size": ("gauge", "Configured pool size.", []),
+            "xbase_db_pool_checked_out": ("gauge", "Connections in use.", []),
+            "xbase_db_pool_checked_in": ("gauge", "Idle connections in the pool.", []),
+            "xbase_db_pool_overflow": ("gauge", "Connections above pool_size.", []),
+        }
+        for name, engine in engines.items():
+            pool = getattr(engine, "sync_engine", engine).pool
+            for metric, attr in (("size", "size"), ("checked_out", "checkedout"),
+                                 ("checked_in", "checkedin"), ("overflow", "overflow")):
+                fn = getattr(pool, attr, None)
+                if fn is not None:
+                    families[f"xbase_db_pool_{metric}"][2].append(({"engine": name}, fn()))
+        return [(n, kind, help, samples) for n, (kind, help, samples) in families.items()]
+    return collect
+
+
+def stats_collector(prefix: str, help: str, stats_fn, counters=(), labels=None):
+    """Numeric fields of a stats() dict as gauges (or counters for `counters`)."""
+    def collect():
+        families = []
+        for key, value in stats_fn().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            kind = "counter" if key in counters else "gauge"
+            name = f"{prefix}_{key}" + ("_total" if kind == "counter" else "")
+            families.append((name, kind, f"{help} ({key}).", [(labels or {}, value)]))
+        return families
+    return collect
+
+
+# ---------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------
+class MetricsMiddleware:
+    """Per-route request counts and latency (route template, not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # raw paths would give every scanner probe its own label
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(path, method, str(status))
+            HTTP_SECONDS.observe(time.perf_counter() - start, path, method)
@@ -0,0 +1,174 @@
+# QueryLog.py
+# Structured query instrumentation on SQLAlchemy engine events (replaces
+# echo=True; set DB_ECHO=on to get SQLAlchemy's statement echo back).
+#
+#   every statement     -> xbase_db_queries_total / duration histogram (Metrics)
+#   QUERY_SAMPLE_RATE   -> fraction of statements kept in the "sampled" ring
+#   SLOW_QUERY_MS       -> statements slower than this go to the "slow" ring
+#                          with their EXPLAIN plan (SLOW_QUERY_EXPLAIN=off to skip)
+#   SLOW_AI_QUERY_MS    -> same for AI-generated SQL (Run_SQL), tagged "ai"
+#   QUERY_LOG_SIZE      -> entries kept per ring
+#   tracing on          -> every statement is a "db.query" span (Tracing.py)
+#
+# Tag a connection with conn.execution_options(query_tag="ai"). The EXPLAIN
+# runs on a fresh DBAPI cursor of the same connection, right after the slow
+# statement, so it sees the same search_path and bind parameters and does
+# not go through these events again. The events only see execute(); a
+# statement read through a server-side cursor (stream_results / conn.stream)
+# does its real work while rows are fetched. Such statements are executed
+# with execution_options(query_log="manual") and timed by the caller around
+# execute + fetch, which then calls record() (RunSQL.run_sql_limited).
+
+import os
+import re
+import time
+import random
+import threading
+from collections import deque
+
+from sqlalchemy import event
+
+from Metrics import Counter, Histogram
+from Tracing import record_span
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_AI_QUERY_MS = float(os.getenv("SLOW_AI_QUERY_MS", str(SLOW_QUERY_MS)))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "on")   # on | off
+QUERY_SAMPLE_RATE = float(os.getenv("QUERY_SAMPLE_RATE", "0.01"))
+QUERY_LOG_SIZE = int(os.getenv("QUERY_LOG_SIZE", "200"))
+QUERY_TEXT_CHARS = 2000
+
+# plain DML/queries only; EXPLAIN without ANALYZE never executes them
+_EXPLAINABLE = re.compile(r"^\s*(select|with|insert|update|delete|values|table)\b", re.IGNORECASE)
+
+DB_QUERIES = Counter("xbase_db_queries_total", "SQL statements by engine, tag and outcome.",
+                     ["engine", "tag", "outcome"])
+DB_QUERY_SECONDS = Histogram("xbase_db_query_duration_seconds", "SQL statement execute time.",
+                             ["engine", "tag"])
+
+_lock = threading.Lock()
+_slow = deque(maxlen=QUERY_LOG_SIZE)
+_sampled = deque(maxlen=QUERY_LOG_SIZE)
+
+
+def _tag(conn, context) -> str:
+    options = context.execution_options if context is not None else conn.get_execution_options()
+    return options.get("query_tag") or "app"
+
+
+def explain(conn, statement, parameters=None) -> str | None:
+    """EXPLAIN plan of `statement` on a sync SQLAlchemy connection."""
+    if SLOW_QUERY_EXPLAIN == "off" or not _EXPLAINABLE.match(statement):
+        return None
+    try:
+        explain_cursor = conn.connection.cursor()
+        try:
+            if parameters is None:
+                explain_cursor.execute("EXPLAIN " + statement)
+            else:
+                explain_cursor.execute("EXPLAIN " + statement, parameters)
+            return "\n".join(str(row[0]) for row in explain_cursor.fetchall())
+        finally:
+            explain_cursor.close()
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+
+
+def _entry(engine_name, tag, statement, ms, rows=None, error=None, plan=None) -> dict:
+    return {
+        "at": time.time(),
+        "engine": engine_name,
+        "tag": tag,
+        "duration_ms": round(ms, 2),
+        "rows": rows if rows is not None and rows >= 0 else None,
+        "statement": statement[:QUERY_TEXT_CHARS],
+        "error": error,
+        "plan": plan,
+    }
+
+
+def is_slow(tag: str, ms: float) -> bool:
+    return ms >= (SLOW_AI_QUERY_MS if tag == "ai" else SLOW_QUERY_MS)
+
+
+def _manual(context) -> bool:
+    return context is not None and context.execution_options.get("query_log") == "manual"
+
+
+def record(engine_name: str, tag: str, statement: str, ms: float, started_ns: int,
+           rows=None, error: str | None = None, explain=None):
+    """Metrics, trace span and ring entry for one statement. Also used for
+    engines outside SQLAlchemy (CSVSQL's DuckDB). `explain()` returns the
+    plan and is only called for slow statements."""
+    DB_QUERIES.inc(engine_name, tag, "error" if error else "ok")
+    record_span("db.query", started_ns, time.time_ns(), error=error, **{
+        "db.engine": engine_name, "db.tag": tag, "db.statement": statement[:QUERY_TEXT_CHARS],
+        "db.rows": rows if rows is not None and rows >= 0 else None,
+    })
+
+    if error:
+        # failed AI SQL and slow failures (timeouts) are kept without a plan:
+        # the transaction is aborted, so nothing more can run on it
+        if tag == "ai" or ms >= SLOW_QUERY_MS:
+            with _lock:
+                _slow.append(_entry(engine_name, tag, statement, ms, error=error))
+        return
+
+    DB_QUERY_SECONDS.observe(ms / 1000, engine_name, tag)
+    if is_slow(tag, ms):
+        plan = explain() if explain is not None else None
+        with _lock:
+            _slow.append(_entry(engine_name, tag, statement, ms, rows, plan=plan))
+    elif random.random() < QUERY_SAMPLE_RATE:
+        with _lock:
+            _sampled.append(_entry(engine_name, tag, statement, ms, rows))
+
+
+def instrument(engine, name: str):
+    """Attach the query log to a sync or async engine."""
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if _manual(context):
+            return
+        conn.info.setdefault("query_start", []).append((time.perf_counter(), time.time_ns()))
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if _manual(context):
+            return
+        started, started_ns = conn.info["query_start"].pop()
+        ms = (time.perf_counter() - started) * 1000
+        explain_plan = None if executemany else (lambda: explain(conn, statement, parameters))
+        record(name, _tag(conn, context), statement, ms, started_ns, cursor.rowcount,
+               explain=explain_plan)
+
+    @event.listens_for(target, "handle_error")
+    def on_error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if not starts:
+            return
+        started, started_ns = starts.pop()
+        ms = (time.perf_counter() - started) * 1000
+        record(name, _tag(conn, exception_context.execution_context),
+               exception_context.statement or "", ms, started_ns,
+               error=str(exception_context.original_exception)[:500])
+
+    return engine
+
+
+def entries(kind: str = "slow", limit: int = 50, tag: str | None = None) -> list[dict]:
+    """Newest first."""
+    with _lock:
+        items = list(_slow if kind == "slow" else _sampled)
+    if tag:
+        items = [e for e in items if e["tag"] == tag]
+    return items[::-1][:limit]
+
+
+def clear():
+    with _lock:
+        _slow.clear()
+        _sampled.clear()
@@ -0,0 +1,372 @@
+# RAGIndex.py
+# Persistent FAISS indexes over SQL_documentation.txt / CSV_documentation.txt.
+#
+# Build offline (once per docs change / deploy):
+#   python RAGIndex.py build            # uses RAG_EMBEDDINGS (see LLMBackend.py)
+#   python RAGIndex.py build --backend local --force
+#   python RAGIndex.py status
+#
+# Each doc is split into one chunk per numbered item / heading / "# ---"
+# banner section, with per-chunk metadata. At runtime AskAI calls
+# retrieve_context("sql" | "csv", query), which loads the saved index on first
+# use (memory-mapped where FAISS supports it) and returns only the relevant
+# sections under RAG_TOKEN_BUDGET. If the docs' content hash no longer matches
+# the saved manifest, the index is rebuilt and saved before use.
+#
+# On disk every build is its own directory, INDEX_DIR/<name>-<built at>-<pid>,
+# and INDEX_DIR/<name>.current holds the name of the live one. A build
+# writes its directory completely, then swaps the pointer file with
+# os.replace, so readers see either the old index or the new one and a
+# crash mid-build leaves the old one in place.
+
+import os
+import re
+import sys
+import json
+import hashlib
+import pickle
+import shutil
+import threading
+import argparse
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from Tokens import count_tokens
+from LLMBackend import EMBEDDINGS_BACKEND, get_embeddings, embeddings_id
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, ".rag_index"))
+
+# Embedding backend: RAG_EMBEDDINGS=openai | local | huggingface (LLMBackend.py)
+# Max tokens of documentation put into one prompt, and max tokens per chunk
+RAG_TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", "600"))
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "300"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+
+# Bump when the on-disk layout or the way documents are split changes
+INDEX_FORMAT = 2
+
+DOCS = {
+    "sql": "SQL_documentation.txt",
+    "csv": "CSV_documentation.txt",
+}
+
+_STORES = {}
+_LOCK = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Content hashing / manifest
+# ---------------------------------------------------------
+def _read_doc(name: str) -> str:
+    with open(os.path.join(BASE_DIR, DOCS[name]), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def docs_hash(name: str, backend: str | None = None) -> str:
+    backend = backend or EMBEDDINGS_BACKEND
+    h = hashlib.sha256()
+    h.update(f"format={INDEX_FORMAT};backend={embeddings_id(backend)};".encode("utf-8"))
+    h.update(_read_doc(name).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _current_file(name: str) -> str:
+    return os.path.join(INDEX_DIR, f"{name}.current")
+
+
+def _index_path(name: str) -> str:
+    """Directory of the live index for `name`."""
+    try:
+        with open(_current_file(name), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return os.path.join(INDEX_DIR, version)
+    except OSError:
+        pass
+    return os.path.join(INDEX_DIR, name)   # layout before versioned builds
+
+
+def read_manifest(name: str) -> dict | None:
+    try:
+        with open(os.path.join(_index_path(name), "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(name: str, backend: str | None = None) -> bool:
+    manifest = read_manifest(name)
+    return manifest is None or manifest.get("hash") != docs_hash(name, backend)
+
+
+# ---------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------
+_NUMBERED = re.compile(r"^\s*(\d+)\)\s*(.+?):?\s*$")      # "3) Show column names:"
+_CAPS_HEADING = re.compile(r"^([A-Z][A-Z0-9 /&_-]+):\s*$")   # "GENERAL RULES:"
+_BANNER_RULE = re.compile(r"^#\s*-{3,}\s*$")                # "# ------"
+_BANNER_TITLE = re.compile(r"^#\s+(\S.*?)\s*$")             # "# CREATE FOLDER"
+
+
+def split_sections(text: str):
+    """Split a doc into [{"title", "text", "pinned"}] by heading.
+
+    Headings are numbered items ("N) ..."), ALL-CAPS lines ending in ":" and
+    "# ---" / "# TITLE" / "# ---" banners. Sections under an ALL-CAPS heading
+    are general rules and are marked pinned (always sent to the model).
+    """
+    lines = text.splitlines()
+    sections = []
+    current = {"title": "Overview", "lines": [], "pinned": True}
+
+    def flush():
+        body = "\n".join(current["lines"]).strip()
+        if body:
+            sections.append({"title": current["title"], "text": body, "pinned": current["pinned"]})
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        if (
+            _BANNER_RULE.match(line)
+            and i + 2 < len(lines)
+            and _BANNER_TITLE.match(lines[i + 1])
+            and _BANNER_RULE.match(lines[i + 2])
+        ):
+            flush()
+            title = _BANNER_TITLE.match(lines[i + 1]).group(1)
+            current = {"title": title, "lines": [], "pinned": False}
+            i += 3
+            continue
+
+        m = _NUMBERED.match(line)
+        if m:
+            flush()
+            current = {"title": f"{m.group(1)}) {m.group(2)}", "lines": [line], "pinned": False}
+            i += 1
+            continue
+
+        m = _CAPS_HEADING.match(line)
+        if m:
+            flush()
+            current = {"title": m.group(1), "lines": [line], "pinned": True}
+            i += 1
+            continue
+
+        current["lines"].append(line)
+        i += 1
+
+    flush()
+
+    # ALL-CAPS headings that only introduce numbered items carry no text
+    sections = [s for s in sections if not (s["pinned"] and s["text"] == f"{s['title']}:")]
+    return _split_oversized(sections)
+
+
+def _split_oversized(sections):
+    """Break sections larger than RAG_CHUNK_TOKENS on blank lines."""
+    out = []
+    for section in sections:
+        if count_tokens(section["text"]) <= RAG_CHUNK_TOKENS:
+            out.append(section)
+            continue
+
+        part, part_no = [], 1
+        for block in re.split(r"\n\s*\n", section["text"]):
+            candidate = "\n\n".join(part + [block])
+            if part and count_tokens(candidate) > RAG_CHUNK_TOKENS:
+                out.append({**section, "title": f"{section['title']} ({part_no})", "text": "\n\n".join(part)})
+                part, part_no = [], part_no + 1
+            part.append(block)
+        if part:
+            title = f"{section['title']} ({part_no})" if part_no > 1 else section["title"]
+            out.append({**section, "title": title, "text": "\n\n".join(part)})
+    return out
+
+
+def split_documents(name: str):
+    """Return (texts, metadatas) for DOCS[name], one entry per chunk."""
+    texts, metadatas = [], []
+    for chunk_no, section in enumerate(split_sections(_read_doc(name))):
+        texts.append(section["text"])
+        metadatas.append({
+            "source": DOCS[name],
+            "section": section["title"],
+            "chunk": chunk_no,
+            "pinned": section["pinned"],
+            "tokens": count_tokens(section["text"]),
+        })
+    return texts, metadatas
+
+
+# ---------------------------------------------------------
+# Build / load
+# ---------------------------------------------------------
+def build_index(name: str, backend: str | None = None, force: bool = False) -> bool:
+    """Embed DOCS[name] into a new version under INDEX_DIR. Returns True if built."""
+    from langchain_community.vectorstores import FAISS
+
+    backend = backend or EMBEDDINGS_BACKEND
+    if not force and not is_stale(name, backend):
+        return False
+
+    texts, metadatas = split_documents(name)
+    store = FAISS.from_texts(texts, get_embeddings(backend), metadatas=metadatas)
+
+    # Write a new version directory, then point <name>.current at it
+    previous = _index_path(name)
+    version = f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{os.getpid()}"
+    path = os.path.join(INDEX_DIR, version)
+    store.save_local(path)
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "hash": docs_hash(name, backend),
+            "backend": embeddings_id(backend),
+            "source": DOCS[name],
+            "chunks": len(texts),
+            "built_at": datetime.now(timezone.utc).isoformat(),
+        }, f, indent=2)
+
+    pointer_tmp = f"{_current_file(name)}.tmp-{os.getpid()}"
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, _current_file(name))
+
+    _prune(name, keep={path, previous})
+    return True
+
+
+def _prune(name: str, keep: set):
+    """Remove index versions older than the one just replaced. That one is
+    kept for readers that resolved it before the swap; newer directories may
+    be another process's build in progress."""
+    previous = [p for p in keep if os.path.isdir(p)]
+    if len(previous) < 2:
+        return
+    cutoff = min(os.path.getmtime(p) for p in previous)
+    legacy = os.path.join(INDEX_DIR, name)
+    for entry in os.listdir(INDEX_DIR):
+        candidate = os.path.join(INDEX_DIR, entry)
+        if candidate in keep or not os.path.isdir(candidate):
+            continue
+        if (entry.startswith(f"{name}-") or candidate == legacy) and os.path.getmtime(candidate) < cutoff:
+            shutil.rmtree(candidate, ignore_errors=True)
+
+
+def load_index(name: str, backend: str | None = None):
+    """Load a saved index, memory-mapping the FAISS file when possible."""
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    path = _index_path(name)   # resolved once, so both files come from one version
+    index_file = os.path.join(path, "index.faiss")
+    try:
+        index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except Exception:
+        # not every index type supports mmap
+        index = faiss.read_index(index_file)
+
+    # index.pkl is written by FAISS.save_local from our own build step
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    return FAISS(
+        embedding_function=get_embeddings(backend),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def get_store(name: str):
+    """Lazily load (and rebuild if the docs changed) the vector store for `name`."""
+    store = _STORES.get(name)
+    if store is not None:
+        return store
+
+    with _LOCK:
+        store = _STORES.get(name)
+        if store is None:
+            if is_stale(name):
+                build_index(name, force=True)
+            store = load_index(name)
+            _STORES[name] = store
+    return store
+
+
+# ---------------------------------------------------------
+# Retrieval under a token budget
+# ---------------------------------------------------------
+def retrieve_chunks(name: str, query: str, budget: int | None = None, k: int | None = None):
+    """Pinned rule sections + the top-k relevant sections that fit in `budget` tokens.
+
+    Returned in document order so numbered examples read naturally.
+    """
+    budget = RAG_TOKEN_BUDGET if budget is None else budget
+    store = get_store(name)
+
+    pinned = [d for d in store.docstore._dict.values() if d.metadata.get("pinned")]
+    ranked = store.similarity_search(query, k=k or RAG_TOP_K)
+
+    chosen, seen, used = [], set(), 0
+    for doc in [*sorted(pinned, key=lambda d: d.metadata["chunk"]), *ranked]:
+        chunk_no = doc.metadata.get("chunk")
+        if chunk_no in seen:
+            continue
+        tokens = doc.metadata.get("tokens") or count_tokens(doc.page_content)
+        if used + tokens > budget:
+            continue
+        chosen.append(doc)
+        seen.add(chunk_no)
+        used += tokens
+
+    return sorted(chosen, key=lambda d: d.metadata.get("chunk", 0))
+
+
+def format_chunks(docs) -> str:
+    return "\n\n".join(f"### {d.metadata.get('section', '')}\n{d.page_content}" for d in docs)
+
+
+def retrieve_context(name: str, query: str, budget: int | None = None) -> str:
+    return format_chunks(retrieve_chunks(name, query, budget=budget))
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build / inspect the AskAI RAG indexes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build indexes whose docs changed")
+    build.add_argument("--backend", default=EMBEDDINGS_BACKEND,
+                       choices=["openai", "local", "huggingface"])
+    build.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    build.add_argument("names", nargs="*", default=list(DOCS))
+
+    sub.add_parser("status", help="show whether each index is up to date")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        for name in args.names:
+            built = build_index(name, backend=args.backend, force=args.force)
+            print(f"{name}: {'built' if built else 'up to date'} ({_index_path(name)})")
+        return 0
+
+    for name in DOCS:
+        manifest = read_manifest(name)
+        state = "missing" if manifest is None else ("stale" if is_stale(name) else "ok")
+        print(f"{name}: {state} {json.dumps(manifest) if manifest else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
 import os
+import re
+import time
 from dotenv import load_dotenv
+import QueryLog
 load_dotenv()  # loads .env from project root
 SYNC_DATABASE_URL = os.getenv("SYNC_DATABASE_URL")
 from sqlalchemy import create_engine, text
 engine = create_engine(SYNC_DATABASE_URL, future=True)
+QueryLog.instrument(engine, "sync")
 def run_sql(query: str):
     try:
         with engine.begin() as conn:
@@ -14,4 +18,208 @@ def run_sql(query: str):
                 return None
     except Exception as e:
         print("SQL ERROR:", e)
-        return None
\ No newline at end of file
+        return None
+
+
+# ---------------------------------------------------------
+# Statement splitting
+# ---------------------------------------------------------
+# asyncpg prepares every statement and rejects "a; b", and a server-side
+# cursor can only wrap one statement, so multi-statement strings are split
+# here and run in order on the same connection. Semicolons inside quotes,
+# quoted identifiers, dollar-quoted bodies and comments don't split.
+_DOLLAR_TAG = re.compile(r"\$[A-Za-z_]*\$")
+
+
+def split_statements(query: str) -> list[str]:
+    statements, start, i, n = [], 0, 0, len(query)
+    while i < n:
+        c = query[i]
+        if c == "'":
+            # E'...' strings also take backslash escapes
+            backslash = query[i - 1:i] in ("e", "E") and not query[i - 2:i - 1].isalnum()
+            i += 1
+            while i < n:
+                if backslash and query[i] == "\\":
+                    i += 2
+                    continue
+                if query[i] == "'":
+                    if query.startswith("''", i):
+                        i += 2
+                        continue
+                    break
+                i += 1
+        elif c == '"':
+            end = query.find('"', i + 1)
+            i = n if end < 0 else end
+        elif query.startswith("--", i):
+            end = query.find("\n", i)
+            i = n if end < 0 else end
+        elif query.startswith("/*", i):
+            end = query.find("*/", i + 2)
+            i = n if end < 0 else end + 1
+        elif c == "$" and (tag := _DOLLAR_TAG.match(query, i)):
+            end = query.find(tag.group(), tag.end())
+            i = n if end < 0 else end + len(tag.group()) - 1
+        elif c == ";":
+            statements.append(query[start:i])
+            start = i + 1
+        i += 1
+    statements.append(query[start:])
+    return [stmt.strip() for stmt in statements if _has_code(stmt)]
+
+
+def _has_code(stmt: str) -> bool:
+    """False for empty pieces and pieces that are only comments."""
+    stmt = re.sub(r"/\*.*?\*/", "", stmt, flags=re.DOTALL)
+    stmt = re.sub(r"--[^\n]*", "", stmt)
+    return bool(stmt.strip())
+
+
+def _split_last(query: str):
+    """(statements before the last one, last statement)."""
+    statements = split_statements(query) or [query]
+    return statements[:-1], statements[-1]
+
+
+# ---------------------------------------------------------
+# Async variant (async Ask_AI pipeline, uses the asyncpg engine)
+# ---------------------------------------------------------
+from ConnectToDB import engine as async_engine
+
+
+async def run_sql_async(query: str, schema: str | None = None):
+    """Run `query` (optionally inside `schema`) on one pooled async connection.
+
+    Unlike run_sql, errors are raised so the caller can report them. Several
+    statements run in order in one transaction; the last one's rows are returned.
+    """
+    head, last = _split_last(query)
+    async with async_engine.begin() as conn:
+        if schema:
+            await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+            # SET LOCAL: scoped to this transaction, never leaks to the pool
+            await conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        for stmt in head:
+            await conn.execute(text(stmt))
+        result = await conn.execute(text(last))
+        if not result.returns_rows:
+            return None
+        return result.fetchall()
+
+
+# ---------------------------------------------------------
+# Bounded variants (AI Run_SQL): row cap + statement timeout
+# ---------------------------------------------------------
+# Queries starting with SELECT/VALUES/TABLE/WITH are read through a
+# server-side cursor, so only max_rows + 1 rows ever leave the database,
+# unless they mention INSERT/UPDATE/DELETE/MERGE/INTO: PostgreSQL won't
+# declare a cursor for data-modifying WITH or SELECT INTO. The query is
+# timed here around execute + fetch and logged with QueryLog.record: with a
+# server-side cursor the engine events would only see the cursor being declared.
+_STREAMABLE = re.compile(r"^[\s(]*(select|values|table|with)\b", re.IGNORECASE)
+_DATA_MODIFYING = re.compile(r"\b(insert|update|delete|merge|into)\b", re.IGNORECASE)
+_MANUAL_LOG = {"query_log": "manual"}
+
+
+def _prelude(schema, statement_timeout_ms):
+    stmts = []
+    if schema:
+        stmts.append(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        stmts.append(f"SET LOCAL search_path TO {schema}")
+    if statement_timeout_ms:
+        stmts.append(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+    return stmts
+
+
+def _streamable(query: str) -> bool:
+    query = re.sub(r"^(\s*(--[^\n]*|/\*.*?\*/))+", "", query, flags=re.DOTALL)
+    # a false positive (e.g. a column named "update") only costs the cursor
+    return bool(_STREAMABLE.match(query)) and not _DATA_MODIFYING.search(query)
+
+
+def _ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+def _limit(columns, rows, max_rows):
+    truncated = bool(max_rows) and len(rows) > max_rows
+    if truncated:
+        rows = rows[:max_rows]
+    return {"columns": columns, "rows": [list(r) for r in rows], "truncated": truncated}
+
+
+def run_sql_limited(query: str, schema: str | None = None, max_rows: int | None = None,
+                    statement_timeout_ms: int | None = None, tag: str | None = None):
+    """Run `query` with a row cap and timeout.
+
+    Returns {"columns", "rows", "truncated"} for the last statement, or None
+    if it returns no rows; earlier statements run first in the same
+    transaction. Errors are raised. `tag` labels the statements in
+    QueryLog (e.g. "ai").
+    """
+    head, query = _split_last(query)
+    with engine.begin() as conn:
+        if tag:
+            conn.execution_options(query_tag=tag)
+        for stmt in _prelude(schema, statement_timeout_ms) + head:
+            conn.execute(text(stmt))
+
+        options = dict(_MANUAL_LOG)
+        if max_rows and _streamable(query):
+            options["stream_results"] = True
+        started, started_ns = time.perf_counter(), time.time_ns()
+        try:
+            result = conn.execute(text(query), execution_options=options)
+            columns, rows = None, None
+            if result.returns_rows:
+                columns = list(result.keys())
+                rows = result.fetchmany(max_rows + 1) if max_rows else result.fetchall()
+                result.close()
+        except Exception as e:
+            QueryLog.record("sync", tag or "app", query, _ms(started), started_ns, error=str(e)[:500])
+            raise
+        QueryLog.record("sync", tag or "app", query, _ms(started), started_ns,
+                        result.rowcount if rows is None else len(rows),
+                        explain=lambda: QueryLog.explain(conn, query))
+        if rows is None:
+            return None
+        return _limit(columns, rows, max_rows)
+
+
+async def run_sql_limited_async(query: str, schema: str | None = None, max_rows: int | None = None,
+                                statement_timeout_ms: int | None = None, tag: str | None = None):
+    """Async run_sql_limited on the asyncpg engine."""
+    head, query = _split_last(query)
+    async with async_engine.begin() as conn:
+        if tag:
+            await conn.execution_options(query_tag=tag)
+        for stmt in _prelude(schema, statement_timeout_ms) + head:
+            await conn.execute(text(stmt))
+
+        started, started_ns = time.perf_counter(), time.time_ns()
+        try:
+            columns, rows, rowcount = None, None, None
+            if max_rows and _streamable(query):
+                result = await conn.stream(text(query), execution_options=_MANUAL_LOG)
+                columns = list(result.keys())
+                rows = await result.fetchmany(max_rows + 1)
+                await result.close()
+            else:
+                result = await conn.execute(text(query), execution_options=_MANUAL_LOG)
+                if result.returns_rows:
+                    columns = list(result.keys())
+                    rows = result.fetchmany(max_rows + 1) if max_rows else result.fetchall()
+                else:
+                    rowcount = result.rowcount
+        except Exception as e:
+            QueryLog.record("async", tag or "app", query, _ms(started), started_ns, error=str(e)[:500])
+            raise
+        ms = _ms(started)
+        # record() calls explain() synchronously; the asyncpg connection needs run_sync
+        plan = await conn.run_sync(QueryLog.explain, query) if QueryLog.is_slow(tag or "app", ms) else None
+        QueryLog.record("async", tag or "app", query, ms, started_ns,
+                        rowcount if rows is None else len(rows), explain=lambda: plan)
+        if rows is None:
+            return None
+        return _limit(columns, rows, max_rows)
@@ -0,0 +1,186 @@
+# RunnerPool.py
+# Runs user code through python_runner/runner.py in a subprocess, on a
+# bounded thread pool. Shared by the /run endpoint and AskAI's Run_Python
+# tool, so AI runs go straight to the local runner instead of looping back
+# over HTTP to the public deployment.
+#
+# With tracing on, each run is a "runner" span; its traceparent goes to the
+# subprocess in the stdin payload, and the spans the runner returns are
+# exported from here.
+#
+# When the dataset has a Parquet version (files.parquet_url, see Ingestion.py)
+# its path goes in the payload too and the runner loads that instead of the CSV.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import concurrent.futures
+
+from Timing import record, record_all
+from Tracing import span, current_traceparent, export_spans
+import DatasetCache
+from Metrics import (
+    RUNNER_QUEUED, RUNNER_ACTIVE, RUNNER_RUNS, RUNNER_SECONDS, record_download,
+)
+
+RUNNER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "python_runner",
+    "runner.py"
+)
+
+RUNNER_WORKERS = int(os.getenv("RUNNER_WORKERS", "10"))
+
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=RUNNER_WORKERS)
+
+
+class RunnerError(Exception):
+    """Runner subprocess failed or did not return valid JSON."""
+
+
+class RunnerUnavailable(RunnerError):
+    """The code never ran: the subprocess could not start or the pool is shut down."""
+
+
+def run_runner_subprocess(payload: bytes, timeout: float | None = None):
+    """Runs runner.py synchronously inside a separate thread."""
+    try:
+        process = subprocess.Popen(
+            [sys.executable, RUNNER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        raise RunnerUnavailable(f"Could not start the runner: {e}")
+
+    try:
+        stdout, stderr = process.communicate(payload, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise RunnerError(f"Runner timed out after {timeout}s")
+
+    return stdout.decode("utf-8").strip(), stderr.decode("utf-8").strip()
+
+
+def _parse_result(stdout: str, stderr: str, bucket_url: str) -> dict:
+    if not stdout:
+        raise RunnerError(f"Runner produced no output. stderr:\n{stderr}")
+
+    try:
+        result = json.loads(stdout)
+    except Exception:
+        raise RunnerError(
+            "Invalid JSON from runner.\n"
+            f"stdout:\n{stdout}\n\nstderr:\n{stderr}"
+        )
+
+    return {
+        "output": result.get("output"),
+        "error": result.get("error") or stderr or None,
+        "images": result.get("images") or [],
+        "bucket_url": result.get("bucket_url", bucket_url),
+        "timings": result.get("timings") or {},
+        "download_bytes": result.get("download_bytes") or 0,
+        "profile": result.get("profile"),
+        "format": result.get("format"),
+        "spans": result.get("spans") or [],
+    }
+
+
+def _timed_run(payload: bytes, timeout: float | None):
+    RUNNER_QUEUED.dec()
+    RUNNER_ACTIVE.inc()
+    started = time.perf_counter()
+    try:
+        stdout, stderr = run_runner_subprocess(payload, timeout)
+    except RunnerUnavailable:
+        RUNNER_RUNS.inc("unavailable")
+        raise
+    except RunnerError:
+        RUNNER_RUNS.inc("timeout")
+        raise
+    finally:
+        RUNNER_ACTIVE.dec()
+    finished = time.perf_counter()
+    RUNNER_SECONDS.observe(finished - started)
+    return started, finished, stdout, stderr
+
+
+def _parse_and_record(submitted, started, finished, stdout, stderr, bucket_url) -> dict:
+    try:
+        result = _parse_result(stdout, stderr, bucket_url)
+    except RunnerError:
+        RUNNER_RUNS.inc("invalid_output")
+        raise
+    RUNNER_RUNS.inc("error" if result["error"] else "ok")
+    if result["download_bytes"]:
+        record_download("runner", result["download_bytes"])
+    _record_timings(submitted, started, finished, result)
+    export_spans(result.pop("spans"))
+    return result
+
+
+def _record_timings(submitted: float, started: float, finished: float, result: dict):
+    """runner-queue: waiting for a pool slot; runner-spawn: interpreter start and
+    JSON I/O (subprocess wall time not covered by the runner's own phases)."""
+    inner = result["timings"]
+    record("runner-queue", (started - submitted) * 1000)
+    record("runner-spawn", max(0.0, (finished - started) * 1000 - sum(inner.values())))
+    record_all(inner, prefix="runner-")
+
+
+def _payload(code: str, bucket_url: str, profile: bool = False,
+             parquet_url: str | None = None) -> bytes:
+    return json.dumps({
+        "code": code,
+        "bucket_url": bucket_url,
+        "parquet_url": parquet_url,
+        "profile": profile,
+        "traceparent": current_traceparent(),
+    }).encode("utf-8")
+
+
+async def execute_code(code: str, bucket_url: str, timeout: float | None = None,
+                       profile: bool = False) -> dict:
+    """Run `code` against `bucket_url` on the pool. Raises RunnerError.
+
+    profile=True runs it under cProfile/tracemalloc (result["profile"]).
+    """
+    loop = asyncio.get_running_loop()
+    with span("runner", **{"runner.profile": profile}):
+        submitted = time.perf_counter()
+        parquet_url = await DatasetCache.parquet_url(bucket_url) if bucket_url else None
+        RUNNER_QUEUED.inc()
+        try:
+            future = loop.run_in_executor(
+                executor,
+                _timed_run,
+                _payload(code, bucket_url, profile, parquet_url),
+                timeout
+            )
+        except RuntimeError as e:   # executor shut down
+            RUNNER_QUEUED.dec()
+            raise RunnerUnavailable(str(e))
+        started, finished, stdout, stderr = await future
+        return _parse_and_record(submitted, started, finished, stdout, stderr, bucket_url)
+
+
+def execute_code_sync(code: str, bucket_url: str, timeout: float | None = None,
+                      profile: bool = False) -> dict:
+    """Blocking variant of execute_code (still bounded by the shared pool)."""
+    with span("runner", **{"runner.profile": profile}):
+        submitted = time.perf_counter()
+        parquet_url = DatasetCache.parquet_url_sync(bucket_url) if bucket_url else None
+        RUNNER_QUEUED.inc()
+        try:
+            future = executor.submit(_timed_run, _payload(code, bucket_url, profile, parquet_url), timeout)
+        except RuntimeError as e:   # executor shut down
+            RUNNER_QUEUED.dec()
+            raise RunnerUnavailable(str(e))
+        started, finished, stdout, stderr = future.result()
+        return _parse_and_record(submitted, started, finished, stdout, stderr, bucket_url)
@@ -0,0 +1,131 @@
+# Timing.py
+# Per-request phase timings, returned as a Server-Timing header.
+#
+#   with phase("db"):
+#       rows = await session.execute(...)
+#
+#   @timed("db")
+#   async def read_rows(...): ...
+#
+# ServerTimingMiddleware starts a Timings object per request (held in a
+# contextvar, so tasks spawned with asyncio.gather / to_thread share it) and
+# adds every recorded phase plus "total" to the response headers:
+#
+#   Server-Timing: db;dur=4.1, runner-exec;dur=120.3, total;dur=131.9
+#
+# Phases with the same name are summed (e.g. several Run_SQL calls in one
+# Ask_AI turn). Streaming responses only carry the phases recorded before the
+# first byte. With SERVER_TIMING_BODY=on, or ?timings=1 on the request,
+# /run and /ask_ai also return the timings in the body.
+#
+# Every phase is also a trace span (Tracing.py) when tracing is enabled.
+
+import os
+import time
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from starlette.datastructures import MutableHeaders
+
+import Tracing
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "on")             # on | off
+SERVER_TIMING_BODY = os.getenv("SERVER_TIMING_BODY", "off")  # on | off
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}   # name -> total ms, in first-seen order
+
+    def add(self, name: str, ms: float):
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self) -> dict:
+        out = {name: round(ms, 2) for name, ms in self.phases.items()}
+        out["total"] = round(self.total_ms(), 2)
+        return out
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={ms:.2f}" for name, ms in self.as_dict().items())
+
+
+def current() -> Timings | None:
+    return _current.get()
+
+
+def record(name: str, ms: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, ms)
+
+
+@contextmanager
+def phase(name: str, **attributes):
+    start = time.perf_counter()
+    try:
+        with Tracing.span(name, **attributes):
+            yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name: str):
+    """Decorator: record the whole call of an async function as `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with phase(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_all(timings: dict | None, prefix: str = ""):
+    """Record durations (ms) reported by something else, e.g. the runner subprocess."""
+    for name, ms in (timings or {}).items():
+        if isinstance(ms, (int, float)):
+            record(prefix + name, ms)
+
+
+def body_timings(request) -> dict | None:
+    """Timings to put in the response body, if the client (or config) asked for them."""
+    timings = _current.get()
+    if timings is None:
+        return None
+    if SERVER_TIMING_BODY == "on" or request.query_params.get("timings") in ("1", "true"):
+        return timings.as_dict()
+    return None
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware, so streaming is untouched)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SERVER_TIMING == "off":
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header())
+                headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
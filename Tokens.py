@@ -0,0 +1,29 @@
+# Tokens.py
+# Token counting for prompt budgeting (RAG context, chat history, tool output).
+# Uses tiktoken when installed, otherwise a ~4 chars/token estimate.
+
+import os
+from functools import lru_cache
+
+TOKEN_MODEL = os.getenv("TOKEN_MODEL", "gpt-3.5-turbo")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(TOKEN_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
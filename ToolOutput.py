@@ -0,0 +1,113 @@
+# ToolOutput.py
+# Shapes Run_SQL / Run_Python results before they go into the LLM prompt.
+#
+# The client still gets the full result (sql_res / py_res, up to
+# AI_SQL_CLIENT_ROW_CAP rows); the model gets a compact table or a
+# head+tail excerpt that fits in AI_TOOL_OUTPUT_TOKENS.
+
+import os
+
+from Tokens import count_tokens
+
+AI_SQL_ROW_CAP = int(os.getenv("AI_SQL_ROW_CAP", "50"))                 # rows shown to the model
+AI_SQL_CLIENT_ROW_CAP = int(os.getenv("AI_SQL_CLIENT_ROW_CAP", "5000"))  # rows fetched at all
+AI_SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("AI_SQL_STATEMENT_TIMEOUT_MS", "15000"))
+AI_TOOL_OUTPUT_TOKENS = int(os.getenv("AI_TOOL_OUTPUT_TOKENS", "1500"))
+AI_MAX_COLUMNS = int(os.getenv("AI_MAX_COLUMNS", "20"))
+AI_CELL_CHARS = int(os.getenv("AI_CELL_CHARS", "60"))
+
+
+def _cell(value, width: int) -> str:
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\n", "\\n").replace("|", "/")
+    return text if len(text) <= width else text[: width - 1] + "…"
+
+
+def render_table(columns, rows, truncated: bool = False,
+                 row_cap: int | None = None, token_budget: int | None = None) -> str:
+    """Compact pipe-separated table, trimmed by columns, cell width and rows."""
+    row_cap = AI_SQL_ROW_CAP if row_cap is None else row_cap
+    token_budget = AI_TOOL_OUTPUT_TOKENS if token_budget is None else token_budget
+
+    columns = list(columns or [])
+    hidden_cols = max(0, len(columns) - AI_MAX_COLUMNS)
+    shown_cols = columns[:AI_MAX_COLUMNS] if columns else None
+
+    # narrower cells when there are many columns
+    width = AI_CELL_CHARS if len(columns) <= 8 else max(16, AI_CELL_CHARS // 2)
+
+    header = " | ".join(str(c) for c in shown_cols) if shown_cols else ""
+    if hidden_cols:
+        header += f" | … (+{hidden_cols} more columns)"
+
+    lines = [header] if header else []
+    used = count_tokens(header)
+    shown = 0
+    for row in rows[:row_cap]:
+        values = list(row)[:AI_MAX_COLUMNS] if columns else list(row)
+        line = " | ".join(_cell(v, width) for v in values)
+        tokens = count_tokens(line) + 1
+        if used + tokens > token_budget:
+            break
+        lines.append(line)
+        used += tokens
+        shown += 1
+
+    total = f"{len(rows)}+" if truncated else str(len(rows))
+    if shown < len(rows) or truncated:
+        lines.append(f"(showing {shown} of {total} rows)")
+    else:
+        lines.append(f"({total} rows)")
+    return "\n".join(lines)
+
+
+def truncate_text(text: str, token_budget: int | None = None) -> str:
+    """Keep the head and tail of long text (both usually matter for output/errors)."""
+    token_budget = AI_TOOL_OUTPUT_TOKENS if token_budget is None else token_budget
+    if not text or count_tokens(text) <= token_budget:
+        return text or ""
+
+    # ~4 chars/token; split the allowance 2:1 between head and tail
+    chars = token_budget * 4
+    head, tail = text[: chars * 2 // 3], text[-(chars // 3):]
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n… [{omitted} characters omitted] …\n{tail}"
+
+
+def shape_sql_output(out) -> str:
+    if isinstance(out, dict) and "rows" in out:
+        return render_table(out.get("columns"), out["rows"], truncated=out.get("truncated", False))
+    return truncate_text(str(out))
+
+
+def shape_python_output(out) -> str:
+    if not isinstance(out, dict):
+        return truncate_text(str(out))
+
+    parts = []
+    if out.get("output"):
+        parts.append("stdout:\n" + truncate_text(out["output"]))
+    if out.get("error"):
+        parts.append("error:\n" + truncate_text(out["error"], AI_TOOL_OUTPUT_TOKENS // 2))
+    images = out.get("images") or []
+    if images:
+        # never put base64 image data in the prompt
+        parts.append(f"[{len(images)} image(s) returned to the user]")
+    return "\n".join(parts) or "(no output)"
+
+
+def shape_tool_output(tool_name: str, out) -> str:
+    """Text the model sees for one tool call."""
+    if tool_name == "Run_SQL":
+        return shape_sql_output(out)
+    if tool_name == "Run_Python":
+        return shape_python_output(out)
+    return truncate_text(str(out))
+
+
+def client_sql_rows(out):
+    """What goes into sql_res for the client: the rows (list of lists) or the message."""
+    if isinstance(out, dict) and "rows" in out:
+        return out["rows"]
+    return out
@@ -0,0 +1,264 @@
+# Tracing.py
+# Lightweight distributed tracing with W3C trace context.
+#
+#   with span("llm", model="gpt-3.5-turbo"):
+#       ...
+#
+# The current span lives in a contextvar, so asyncio tasks and to_thread
+# calls inherit it. Context crosses process boundaries as a `traceparent`:
+#   - HTTP: TracingMiddleware continues an incoming traceparent header, and
+#     AskAI sends one to the remote runner
+#   - runner subprocess: sent in the stdin payload; the runner returns its
+#     own spans (download / parse / exec / images) in its JSON and they are
+#     exported from here
+#
+# Finished spans are batched by a background thread and written as OTLP/JSON
+# (ExportTraceServiceRequest), the same format the OpenTelemetry collector's
+# file exporter uses:
+#   TRACE_EXPORT=off (default) | file | otlp
+#   TRACE_FILE=.traces/spans.jsonl                 (file: one request per line)
+#   OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318   (otlp: POST /v1/traces)
+#   TRACE_SAMPLE_RATE=1.0                          (decided at the root span)
+
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+
+from starlette.datastructures import MutableHeaders
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off")
+TRACE_FILE = os.getenv(
+    "TRACE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".traces", "spans.jsonl")
+)
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "xbase-api")
+TRACE_FLUSH_SECONDS = 1.0
+TRACE_BATCH_SIZE = 512
+
+ENABLED = TRACE_EXPORT != "off"
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def _hex(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _attr(key, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "sampled", "name", "start_ns",
+                 "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id, sampled, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _hex(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.attributes = dict(attributes)
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self, end_ns: int) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [_attr(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+
+class _RemoteParent:
+    """Parent context received from another process (traceparent)."""
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id, self.span_id, self.sampled = trace_id, span_id, sampled
+
+
+def parse_traceparent(header: str | None):
+    try:
+        version, trace_id, span_id, flags = (header or "").strip().split("-")
+        if len(trace_id) != 32 or len(span_id) != 16 or int(trace_id, 16) == 0:
+            return None
+        return _RemoteParent(trace_id, span_id, bool(int(flags, 16) & 1))
+    except ValueError:
+        return None
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent() -> str | None:
+    """traceparent of the current span, to send to another process."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return None
+    return f"00-{parent.trace_id}-{parent.span_id}-01"
+
+
+@contextmanager
+def span(name: str, parent=None, **attributes):
+    """Child of `parent` (a Span / remote parent) or of the current span;
+    a new trace if there is neither."""
+    if not ENABLED:
+        yield None
+        return
+
+    parent = parent or _current.get()
+    if parent is None:
+        s = Span(name, _hex(128), None, random.random() < TRACE_SAMPLE_RATE, attributes)
+    else:
+        s = Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        _current.reset(token)
+        if s.sampled:
+            _exporter.submit(s.to_otlp(time.time_ns()))
+
+
+def record_span(name: str, start_ns: int, end_ns: int, error: str | None = None, **attributes):
+    """Child span of the current span for something already timed (e.g. a SQL statement)."""
+    parent = _current.get()
+    if not ENABLED or parent is None or not parent.sampled:
+        return
+    s = Span(name, parent.trace_id, parent.span_id, True, attributes)
+    s.start_ns = start_ns
+    s.error = error
+    _exporter.submit(s.to_otlp(end_ns))
+
+
+def export_spans(spans):
+    """Spans produced by another process (already in OTLP/JSON form)."""
+    if ENABLED:
+        for s in spans or []:
+            _exporter.submit(s)
+
+
+# ---------------------------------------------------------
+# Exporter
+# ---------------------------------------------------------
+class _Exporter:
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, otlp_span: dict):
+        self._queue.put(otlp_span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+
+    def _drain(self, first=None):
+        batch = [first] if first is not None else []
+        while len(batch) < TRACE_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            time.sleep(TRACE_FLUSH_SECONDS)   # let the rest of the request's spans arrive
+            self.flush(self._drain(first))
+
+    def flush(self, batch=None):
+        batch = self._drain() if batch is None else batch
+        if not batch:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "xbase"}, "spans": batch}],
+        }]}
+        try:
+            if TRACE_EXPORT == "file":
+                os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+                with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(request, separators=(",", ":")) + "\n")
+            elif TRACE_EXPORT == "otlp":
+                req = urllib.request.Request(
+                    OTLP_ENDPOINT.rstrip("/") + "/v1/traces",
+                    data=json.dumps(request).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                )
+                urllib.request.urlopen(req, timeout=5).close()
+        except Exception as e:
+            print("TRACE EXPORT ERROR:", e)
+
+
+_exporter = _Exporter()
+atexit.register(_exporter.flush)
+
+
+# ---------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------
+class TracingMiddleware:
+    """Root span per HTTP request; continues an incoming traceparent and
+    returns the trace id as X-Trace-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        remote = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        with span(f"{scope['method']} {scope['path']}", parent=remote,
+                  **{"http.method": scope["method"], "http.target": scope["path"]}) as root:
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    root.set(**{"http.status_code": message["status"]})
+                    MutableHeaders(scope=message).append("X-Trace-Id", root.trace_id)
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+            route = scope.get("route")
+            if getattr(route, "path", None):
+                root.name = f"{scope['method']} {route.path}"
@@ -0,0 +1,85 @@
+# Warmup.py
+# Optional warm-up of the lazily loaded subsystems.
+#
+# main.py imports none of the heavy pieces (AskAI with LangChain / OpenAI /
+# FAISS, python_runner.runner with pandas + supabase) until a request needs
+# them. To pay that cost before traffic arrives instead, list the parts in
+#
+#   WARMUP=ask_ai,rag,runner,db
+#   WARMUP_WAIT=on   # block startup until done (default: warm in background)
+#
+# or call POST /admin/warmup.
+
+import os
+import sys
+import time
+import asyncio
+import importlib
+
+from sqlalchemy import text
+
+WARMUP = [p.strip() for p in os.getenv("WARMUP", "").split(",") if p.strip()]
+WARMUP_WAIT = os.getenv("WARMUP_WAIT", "off") == "on"
+
+
+async def load_module(name: str):
+    """Import `name` off the event loop (first import of AskAI takes seconds)."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return await asyncio.to_thread(importlib.import_module, name)
+
+
+async def _ask_ai():
+    AskAI = await load_module("AskAI")
+    # builds the chat model + prompt chain (no network call)
+    await asyncio.to_thread(AskAI.get_llm_chain)
+
+
+async def _rag():
+    RAGIndex = await load_module("RAGIndex")
+    for name in ("sql", "csv"):
+        await asyncio.to_thread(RAGIndex.get_store, name)
+
+
+async def _runner():
+    # in-process loader (DatasetCache), then one subprocess run so the
+    # runner's imports are in the OS page cache
+    await load_module("python_runner.runner")
+    RunnerPool = await load_module("RunnerPool")
+    await RunnerPool.execute_code("pass", "", timeout=60)
+
+
+async def _db():
+    from ConnectToDB import engine as async_engine
+    from RunSQL import engine as sync_engine
+
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    def sync_ping():
+        with sync_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    await asyncio.to_thread(sync_ping)
+
+
+PARTS = {"ask_ai": _ask_ai, "rag": _rag, "runner": _runner, "db": _db}
+
+
+async def warmup(parts=None) -> dict:
+    """Warm `parts` in order; returns {part: ms or error message}."""
+    results = {}
+    for part in parts or PARTS:
+        fn = PARTS.get(part)
+        if fn is None:
+            results[part] = "unknown part"
+            continue
+        start = time.perf_counter()
+        try:
+            await fn()
+            results[part] = round((time.perf_counter() - start) * 1000, 1)
+        except Exception as e:
+            results[part] = f"failed: {e}"
+    print("WARMUP:", results)
+    return results
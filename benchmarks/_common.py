@@ -0,0 +1,81 @@
+# _common.py
+# Shared helpers for the benchmark scripts in this folder.
+
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def offline_env(**overrides):
+    """Env for importing the app without OpenAI / a real database.
+
+    Engines are created lazily by SQLAlchemy, so dummy URLs are fine as long
+    as nothing actually connects.
+    """
+    defaults = {
+        "LLM_BACKEND": "fake",
+        "RAG_EMBEDDINGS": "local",
+        "LLM_CACHE": "off",
+        "SYNC_DATABASE_URL": "postgresql+psycopg2://bench@127.0.0.1:1/bench",
+        "DATABASE_URL": "postgresql+asyncpg://bench@127.0.0.1:1/bench",
+    }
+    defaults.update(overrides)
+    for key, value in defaults.items():
+        os.environ.setdefault(key, str(value))
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_summary(latencies_ms, wall_s: float, errors: int = 0) -> dict:
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(values) / wall_s, 2) if wall_s else 0.0,
+        "mean_ms": round(statistics.mean(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def make_standin_tools(latency: float):
+    """Run_SQL / Run_Python stand-ins that just sleep for `latency` seconds."""
+    from langchain_core.tools import StructuredTool
+
+    def run_sql(parent_id: str, input: str):
+        time.sleep(latency)
+        return {"columns": ["n"], "rows": [[1]], "truncated": False}
+
+    async def arun_sql(parent_id: str, input: str):
+        await asyncio.sleep(latency)
+        return {"columns": ["n"], "rows": [[1]], "truncated": False}
+
+    def run_python(bucket_url: str, input: str):
+        time.sleep(latency)
+        return {"output": "ok", "error": None, "images": []}
+
+    async def arun_python(bucket_url: str, input: str):
+        await asyncio.sleep(latency)
+        return {"output": "ok", "error": None, "images": []}
+
+    return {
+        "Run_SQL": StructuredTool.from_function(func=run_sql, coroutine=arun_sql,
+                                                name="Run_SQL", description="stand-in"),
+        "Run_Python": StructuredTool.from_function(func=run_python, coroutine=arun_python,
+                                                   name="Run_Python", description="stand-in"),
+    }
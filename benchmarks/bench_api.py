@@ -0,0 +1,354 @@
+# bench_api.py
+# End-to-end API benchmark: starts the FastAPI app (uvicorn subprocess)
+# against a local PostgreSQL and a fake Supabase storage server, drives the
+# endpoints in main.py at several concurrency levels and writes p50/p95/p99
+# and throughput per endpoint as JSON (one file per run, tagged with the git
+# commit, so two runs can be diffed).
+#
+#   # use an existing local database (the app's tables are created in it)
+#   python benchmarks/bench_api.py --database-url postgresql://me@localhost/xbase_bench
+#
+#   # or let the script initdb/start a throwaway cluster (needs initdb/pg_ctl on PATH)
+#   python benchmarks/bench_api.py --start-postgres --concurrency 1 8 32 --requests 200
+#
+#   --endpoints root files folders table_read table_write get_rows run
+#   --output results/api-<commit>.json
+#
+# Ask_AI is excluded (see bench_ask_ai.py); the app runs with LLM_BACKEND=fake.
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _common import ROOT, latency_summary
+
+import httpx
+
+BUCKET_PATH = "bench/data.csv"
+FAKE_SUPABASE_KEY = "bench.fake.key"   # create_client only checks the JWT shape
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------
+# Fake Supabase storage
+# ---------------------------------------------------------
+def make_csv(rows: int) -> bytes:
+    lines = ["id,name,city,amount,created"]
+    cities = ["Pune", "Delhi", "Mumbai", "Chennai", "Kolkata"]
+    for i in range(rows):
+        lines.append(f"{i},name_{i},{cities[i % 5]},{(i * 37) % 1000 / 10},2024-01-{i % 28 + 1:02d}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class FakeStorage:
+    """Serves one CSV for any `GET .../storage/v1/object/<bucket>/<path>`."""
+
+    def __init__(self, csv_rows: int):
+        self.body = make_csv(csv_rows)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.port = free_port()
+        storage = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if "/storage/v1/object/" not in self.path:
+                    self.send_error(404)
+                    return
+                storage.requests += 1
+                storage.bytes_sent += len(storage.body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(storage.body)))
+                self.end_headers()
+                self.wfile.write(storage.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# ---------------------------------------------------------
+# Local PostgreSQL
+# ---------------------------------------------------------
+class LocalPostgres:
+    """Throwaway cluster via initdb + pg_ctl (trust auth, no TLS)."""
+
+    def __init__(self):
+        for tool in ("initdb", "pg_ctl"):
+            if not shutil.which(tool):
+                raise SystemExit(f"--start-postgres needs `{tool}` on PATH")
+        self.dir = tempfile.mkdtemp(prefix="xbase-bench-pg-")
+        self.port = free_port()
+
+    @property
+    def url(self) -> str:
+        return f"postgresql://postgres@127.0.0.1:{self.port}/postgres"
+
+    def start(self):
+        data = os.path.join(self.dir, "data")
+        subprocess.run(["initdb", "-D", data, "-U", "postgres", "-A", "trust"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run(["pg_ctl", "-D", data, "-w", "-l", os.path.join(self.dir, "pg.log"),
+                        "-o", f"-p {self.port} -k {self.dir} -c listen_addresses=127.0.0.1",
+                        "start"], check=True, stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        subprocess.run(["pg_ctl", "-D", os.path.join(self.dir, "data"), "-m", "fast", "stop"],
+                       stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def database_urls(url: str):
+    """(asyncpg URL, sync URL) for the app from one postgresql:// URL."""
+    rest = url.split("://", 1)[1]
+    return f"postgresql+asyncpg://{rest}", f"postgresql+psycopg2://{rest}"
+
+
+# ---------------------------------------------------------
+# App under test
+# ---------------------------------------------------------
+class App:
+    def __init__(self, env: dict, workers: int, log_path: str):
+        self.env = {**os.environ, **env}
+        self.workers = workers
+        self.port = free_port()
+        self.log = open(log_path, "w")
+        self.proc = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 60):
+        # creates the ORM tables / indexes, same as a deploy
+        subprocess.run([sys.executable, "startup.py"], cwd=ROOT, env=self.env,
+                       check=True, stdout=self.log, stderr=subprocess.STDOUT)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=ROOT, env=self.env, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise SystemExit(f"app exited early, see {self.log.name}")
+            try:
+                httpx.get(self.url + "/docs", timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.25)
+        raise SystemExit(f"app did not start in {timeout}s, see {self.log.name}")
+
+    def stop(self):
+        if self.proc:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.log.close()
+
+
+# ---------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------
+async def setup_fixtures(client: httpx.AsyncClient, args) -> dict:
+    """User root with --listing-size folders and files, and one table with rows."""
+    user_id = f"bench-{uuid.uuid4().hex[:8]}"
+    root_id = (await client.post("/root", json={"user_id": user_id})).json()["root_id"]
+    root_id = str(root_id)
+
+    for i in range(args.listing_size):
+        await client.post("/folder/create", json={"folder_name": f"folder_{i}", "parent_id": root_id})
+        await client.post("/files/create", json={
+            "current_folder_id": root_id, "name": f"file_{i}.csv", "bucket_url": BUCKET_PATH,
+        })
+
+    table = f"bench_{uuid.uuid4().hex[:8]}"
+    await client.post("/table/create", json={
+        "table_name": table, "parent_id": root_id, "columns": ["name:TEXT", "amount:INT"],
+    })
+    for i in range(args.table_rows):
+        await client.post("/table/insert", json={
+            "table_name": table, "values": {"name": f"row_{i}", "amount": str(i)},
+        })
+    return {"user_id": user_id, "root_id": root_id, "table": table}
+
+
+def scenarios(ctx: dict, args):
+    root_id, table = ctx["root_id"], ctx["table"]
+    page = {"limit": args.page_size} if args.page_size else {}
+
+    return {
+        "root": lambda c, i: c.post("/root", json={"user_id": ctx["user_id"]}),
+        "files": lambda c, i: c.post("/files", json={"current_folder_id": root_id, **page}),
+        "folders": lambda c, i: c.post("/folders", json={"current_folder_id": root_id, **page}),
+        "table_read": lambda c, i: c.post("/table/read", json={"table_name": table}),
+        "table_write": lambda c, i: c.post("/table/update", json={
+            "table_name": table, "row_id": i % max(args.table_rows, 1) + 1,
+            "column": "name", "value": f"updated_{i}",
+        }),
+        "get_rows": lambda c, i: c.post("/getRows", json={"parent_id": root_id, "table_name": table}),
+        "run": lambda c, i: c.post("/run", json={
+            "code": "print(df.groupby('city')['amount'].mean())", "bucket_url": BUCKET_PATH,
+        }),
+    }
+
+
+async def run_scenario(base_url: str, request, concurrency: int, total: int, timeout: float):
+    latencies, statuses, errors = [], {}, 0
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await request(client, i)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                    errors += 1
+                    continue
+                elapsed = (time.perf_counter() - start) * 1000
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    return {**latency_summary(latencies, wall, errors), "status_codes": statuses}
+
+
+async def drive(base_url: str, args):
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        ctx = await setup_fixtures(client, args)
+    available = scenarios(ctx, args)
+
+    results = []
+    for name in args.endpoints:
+        for concurrency in args.concurrency:
+            # warm-up (connection pools, runner workers, imports)
+            await run_scenario(base_url, available[name], concurrency, concurrency, args.timeout)
+            summary = await run_scenario(base_url, available[name], concurrency,
+                                         args.requests, args.timeout)
+            results.append({"endpoint": name, "concurrency": concurrency, **summary})
+            print(f"{name:12s} c={concurrency:<4d} p50={summary['p50_ms']:>8.1f}ms "
+                  f"p99={summary['p99_ms']:>8.1f}ms {summary['throughput_rps']:>8.1f} req/s "
+                  f"errors={summary['errors']}", file=sys.stderr)
+    return results
+
+
+def main():
+    all_endpoints = ["root", "files", "folders", "table_read", "table_write", "get_rows", "run"]
+
+    parser = argparse.ArgumentParser()
+    db = parser.add_mutually_exclusive_group()
+    db.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                    help="postgresql://... of a local database the app may write to")
+    db.add_argument("--start-postgres", action="store_true")
+    parser.add_argument("--endpoints", nargs="+", choices=all_endpoints, default=all_endpoints)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--listing-size", type=int, default=200, help="files and folders in the root")
+    parser.add_argument("--page-size", type=int, default=None, help="limit for /files and /folders")
+    parser.add_argument("--table-rows", type=int, default=500)
+    parser.add_argument("--csv-rows", type=int, default=10000)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", default=None, help="default: benchmarks/results/api-<commit>.json")
+    args = parser.parse_args()
+    if not (args.database_url or args.start_postgres):
+        parser.error("pass --database-url (or BENCH_DATABASE_URL) or --start-postgres")
+
+    commit = git_commit()
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"api-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    postgres = LocalPostgres() if args.start_postgres else None
+    storage = FakeStorage(args.csv_rows)
+    app = None
+    try:
+        if postgres:
+            postgres.start()
+        async_url, sync_url = database_urls(postgres.url if postgres else args.database_url)
+        storage.start()
+
+        app = App({
+            "DATABASE_URL": async_url,
+            "SYNC_DATABASE_URL": sync_url,
+            "DATABASE_SSL": "disable",
+            "SUPABASE_URL": storage.url,
+            "SUPABASE_SERVICE_ROLE_KEY": FAKE_SUPABASE_KEY,
+            "LLM_BACKEND": "fake",
+            "RAG_EMBEDDINGS": "local",
+            "LLM_CACHE": "off",
+        }, args.workers, output.removesuffix(".json") + ".app.log")
+        app.start()
+
+        results = asyncio.run(drive(app.url, args))
+    finally:
+        if app:
+            app.stop()
+        storage.stop()
+        if postgres:
+            postgres.stop()
+
+    report = {
+        "benchmark": "api",
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {k: v for k, v in vars(args).items() if k not in ("database_url", "output")},
+        "storage": {"downloads": storage.requests, "bytes": storage.bytes_sent},
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"wrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
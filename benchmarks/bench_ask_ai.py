@@ -0,0 +1,105 @@
+# bench_ask_ai.py
+# Offline load test of one Ask_AI turn (history compaction, RAG retrieval,
+# planning call, tool fan-out, summary call) under concurrency.
+#
+#   python benchmarks/bench_ask_ai.py --concurrency 1 8 32 --requests 200 \
+#       --llm-latency-ms 300 --tool-latency-ms 100 [--stream] [--db-info SQL]
+#
+# Runs with LLM_BACKEND=fake and RAG_EMBEDDINGS=local, and Run_SQL/Run_Python
+# replaced by sleeping stand-ins, so no OpenAI key, database or runner is
+# needed. Results measure the orchestration, not model or query speed.
+
+import json
+import time
+import asyncio
+import argparse
+
+from _common import offline_env, latency_summary, make_standin_tools
+
+PARENT_ID = "00000000-0000-0000-0000-000000000000"
+DB_INFO = {
+    "SQL": "SQL: postgres schema for this folder",
+    "CSV": "CSV: uploaded dataset\nbucket_url: bench/data.csv",
+}
+
+
+def make_history(turns: int):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i}: how many rows are in the table?"})
+        history.append({"role": "assistant", "content": f"answer {i}: there are {i * 10} rows."})
+    return history
+
+
+async def one_request(AskAI, args, db_info, history):
+    if args.stream:
+        async for _ in AskAI.Ask_AI_stream(db_info, PARENT_ID, "How many rows?", history):
+            pass
+        return
+    await AskAI.Ask_AI_async(db_info, PARENT_ID, "How many rows?", history)
+
+
+async def run_level(AskAI, args, concurrency: int):
+    db_info = DB_INFO[args.db_info]
+    history = make_history(args.history_turns)
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await one_request(AskAI, args, db_info, history)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print("first error:", repr(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"concurrency": concurrency,
+            **latency_summary(latencies, time.perf_counter() - start, errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--tool-latency-ms", type=float, default=100)
+    parser.add_argument("--tool-calls", type=int, default=2)
+    parser.add_argument("--history-turns", type=int, default=4)
+    parser.add_argument("--db-info", choices=sorted(DB_INFO), default="SQL")
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args()
+
+    offline_env(
+        DATA_CONTEXT="off",
+        FAKE_LLM_LATENCY_MS=args.llm_latency_ms,
+        FAKE_LLM_TOKEN_LATENCY_MS=args.token_latency_ms,
+        FAKE_LLM_TOOL_CALLS=args.tool_calls,
+    )
+    import AskAI
+
+    AskAI.TOOLS_BY_NAME = make_standin_tools(args.tool_latency_ms / 1000)
+
+    results = [asyncio.run(run_level(AskAI, args, c)) for c in args.concurrency]
+    print(json.dumps({
+        "benchmark": "ask_ai",
+        "mode": "stream" if args.stream else "json",
+        "db_info": args.db_info,
+        "llm_latency_ms": args.llm_latency_ms,
+        "tool_latency_ms": args.tool_latency_ms,
+        "tool_calls": args.tool_calls,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_listing_serialization.py
+# Micro-benchmark: /files listing serialization, old path vs orjson path.
+#
+#   python benchmarks/bench_listing_serialization.py --rows 10000
+#
+# old:  per-row dict with str(uuid) / isoformat() -> jsonable_encoder -> json.dumps
+# new:  per-row dict of raw column values       -> orjson.dumps (FastJSONResponse)
+
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:  # FastAPI not installed: measure the stdlib json part only
+    jsonable_encoder = None
+
+
+def make_rows(n: int):
+    parent = uuid.uuid4()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        (uuid.uuid4(), f"dataset_{i}.csv", parent, start + timedelta(seconds=i), f"{parent}/{i}_dataset.csv")
+        for i in range(n)
+    ]
+
+
+def old_path(rows):
+    content = {
+        "files": [
+            {
+                "id": str(r[0]),
+                "name": r[1],
+                "parent_id": str(r[2]),
+                "created_at": r[3].isoformat() if r[3] else None,
+                "bucket_url": r[4],
+            }
+            for r in rows
+        ]
+    }
+    if jsonable_encoder is not None:
+        content = jsonable_encoder(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+KEYS = ("id", "name", "parent_id", "created_at", "bucket_url")
+
+
+def new_path(rows):
+    content = {"files": [dict(zip(KEYS, r)) for r in rows], "next_cursor": None}
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.rows:
+        rows = make_rows(n)
+        assert json.loads(old_path(rows))["files"] == json.loads(new_path(rows))["files"]
+
+        number = max(1, 20000 // n)
+        old = min(timeit.repeat(lambda: old_path(rows), number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: new_path(rows), number=number, repeat=args.repeat)) / number
+        results.append({
+            "rows": n,
+            "old_ms": round(old * 1000, 3),
+            "new_ms": round(new * 1000, 3),
+            "speedup": round(old / new, 2),
+        })
+
+    print(json.dumps({
+        "benchmark": "listing_serialization",
+        "jsonable_encoder": jsonable_encoder is not None,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
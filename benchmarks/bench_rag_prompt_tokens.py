@@ -0,0 +1,69 @@
+# bench_rag_prompt_tokens.py
+# Prompt tokens spent on RAG context per /ask_ai question, before vs after
+# chunked retrieval.
+#
+#   python benchmarks/bench_rag_prompt_tokens.py            # offline (local embeddings)
+#   RAG_EMBEDDINGS=openai python benchmarks/bench_rag_prompt_tokens.py
+#
+# before: whole doc indexed as one Document -> str(list[Document]) in the prompt
+# after:  RAGIndex.retrieve_context() under RAG_TOKEN_BUDGET
+
+import os
+import sys
+import json
+import statistics
+
+os.environ.setdefault("RAG_EMBEDDINGS", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+import RAGIndex
+from Tokens import count_tokens
+
+QUESTIONS = {
+    "csv": [
+        "show columns",
+        "describe df",
+        "how many rows and columns are there",
+        "group sales by region and average them",
+        "filter rows where age > 30 and sort by name",
+        "count missing values in every column",
+    ],
+    "sql": [
+        "show all rows in the orders table",
+        "add a column email of type text to users",
+        "delete the row with id 4 from users",
+        "create a table products with name text and price int",
+        "update the price of row 2",
+        "drop the table temp_data",
+    ],
+}
+
+
+def main():
+    report = {"benchmark": "rag_prompt_tokens", "budget": RAGIndex.RAG_TOKEN_BUDGET, "docs": {}}
+
+    for name, questions in QUESTIONS.items():
+        full_text = RAGIndex._read_doc(name)
+        # what the old single-document retriever put into {context}
+        before = count_tokens(str([Document(page_content=full_text)]))
+
+        after = []
+        for q in questions:
+            after.append(count_tokens(RAGIndex.retrieve_context(name, q)))
+
+        report["docs"][name] = {
+            "chunks": len(RAGIndex.split_documents(name)[0]),
+            "before_tokens": before,
+            "after_tokens_mean": round(statistics.mean(after), 1),
+            "after_tokens_max": max(after),
+            "reduction": round(1 - statistics.mean(after) / before, 3),
+            "per_question": dict(zip(questions, after)),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
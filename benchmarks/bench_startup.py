@@ -0,0 +1,117 @@
+# bench_startup.py
+# Cold-start cost of the API: `import main` in a fresh interpreter, the
+# slowest modules by cumulative import time (-X importtime), and
+# time-to-first-request of a uvicorn process (spawn -> first 200 on /metrics).
+#
+#   python benchmarks/bench_startup.py --runs 5
+#   python benchmarks/bench_startup.py --warmup ask_ai,rag   # WARMUP=... WARMUP_WAIT=on
+#
+# Runs offline (LLM_BACKEND=fake, dummy database URLs): nothing connects
+# until a request needs it, which is exactly what this measures.
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+from _common import ROOT, offline_env
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(env) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1]) * 1000
+
+
+def slowest_imports(env, top: int):
+    """Top-level-ish modules by cumulative import time, from -X importtime."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <name indented 2 spaces per level>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # one space after "|", then two per nesting level (measured before strip)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((int(cumulative_us), depth, name.strip()))
+    # depth <= 1: `main` and what it imports directly
+    rows = [r for r in rows if r[1] <= 1]
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, _, name in rows[:top]]
+
+
+def time_to_first_request(env, timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise SystemExit("uvicorn exited:\n" + proc.stderr.read().decode())
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.02)
+        raise SystemExit(f"no response within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def summary(values):
+    return {
+        "min_ms": round(min(values), 1),
+        "median_ms": round(statistics.median(values), 1),
+        "max_ms": round(max(values), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warmup", default="", help="WARMUP parts, e.g. ask_ai,rag")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    offline_env(DATABASE_SSL="disable", SUPABASE_SERVICE_ROLE_KEY="bench.fake.key")
+    env = dict(os.environ)
+    if args.warmup:
+        env.update(WARMUP=args.warmup, WARMUP_WAIT="on")
+
+    imports = [time_import(env) for _ in range(args.runs)]
+    first_request = [time_to_first_request(env, args.timeout) for _ in range(args.runs)]
+
+    print(json.dumps({
+        "benchmark": "startup",
+        "runs": args.runs,
+        "warmup": args.warmup or None,
+        "import_main": summary(imports),
+        "time_to_first_request": summary(first_request),
+        "slowest_imports": slowest_imports(env, args.top),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_tool_concurrency.py
+# Wall-clock time of one multi-tool Ask_AI turn: sequential loop (old path)
+# vs AskAI.run_tool_calls / run_tool_calls_async.
+#
+#   python benchmarks/bench_tool_concurrency.py --calls 1 2 4 --latency-ms 200
+#
+# Tools are replaced by stand-ins that sleep for --latency-ms, so this
+# measures the dispatch strategy only (no DB / runner / network needed).
+
+import json
+import time
+import asyncio
+import argparse
+
+from _common import offline_env, make_standin_tools
+
+offline_env()
+
+import AskAI
+
+
+def make_calls(n: int):
+    calls = []
+    for i in range(n):
+        if i % 2 == 0:
+            calls.append({"name": "Run_SQL", "args": {"input": f"SELECT {i}"}, "id": f"call_{i}"})
+        else:
+            calls.append({"name": "Run_Python", "args": {"bucket_url": "b", "input": "print(1)"},
+                          "id": f"call_{i}"})
+    return calls
+
+
+def sequential_sync(calls, parent_id):
+    return [AskAI.execute_tool(AskAI.TOOLS_BY_NAME[c["name"]], AskAI._tool_args(c, parent_id))
+            for c in calls]
+
+
+async def sequential_async(calls, parent_id):
+    return [await AskAI.execute_tool_async(AskAI.TOOLS_BY_NAME[c["name"]], AskAI._tool_args(c, parent_id))
+            for c in calls]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    AskAI.TOOLS_BY_NAME = make_standin_tools(args.latency_ms / 1000)
+    parent_id = "00000000-0000-0000-0000-000000000000"
+
+    results = []
+    for n in args.calls:
+        calls = make_calls(n)
+        seq_s, seq_s_ms = timed(lambda: sequential_sync(calls, parent_id))
+        con_s, con_s_ms = timed(lambda: AskAI.run_tool_calls(calls, parent_id))
+        seq_a, seq_a_ms = timed(lambda: asyncio.run(sequential_async(calls, parent_id)))
+        con_a, con_a_ms = timed(lambda: asyncio.run(AskAI.run_tool_calls_async(calls, parent_id)))
+        assert seq_s == con_s and seq_a == con_a  # order preserved
+
+        results.append({
+            "tool_calls": n,
+            "sync_sequential_ms": round(seq_s_ms, 1),
+            "sync_concurrent_ms": round(con_s_ms, 1),
+            "async_sequential_ms": round(seq_a_ms, 1),
+            "async_concurrent_ms": round(con_a_ms, 1),
+        })
+
+    print(json.dumps({
+        "benchmark": "tool_concurrency",
+        "tool_latency_ms": args.latency_ms,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
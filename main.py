@@ -1,15 +1,12 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select, text
 import uuid
 from datetime import datetime
-from AskAI import Ask_AI
-from python_runner.runner import run_code
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from schemas import RunCodeRequest, RunCodeResponse
-import subprocess
-import json
 import sys
 import asyncio
 import os
@@ -24,6 +21,12 @@ from CRUD import (
     add_column,
     delete_column,
     delete_table,
+    bump_folder_version,
+    folder_listing_etag,
+    page_etag,
+    list_folder_page,
+    get_file_bucket_url,
+    get_file_profile,
 )
 from schemas import (
     CreateFolderRequest, CreateTableRequest,
@@ -32,14 +35,26 @@ from schemas import (
     AddColumnWithTableRequest, DeleteColumnWithTableRequest, DeleteTableRequest,
     GetFilesRequest, GetFoldersRequest,
     FilesCreateRequest, AskAISchema,  # added
-    GetColumnsRequest, GetRowsRequest
+    GetColumnsRequest, GetRowsRequest,
+    CSVQueryRequest, CSVSQLRequest,
 )
 from ConnectToDB import AsyncSessionLocal
 from models import File, Folder
-from runner import run_any
 from RunSQL import run_sql
-
-app = FastAPI(title="XBASE API", version="1.0")
+from RunnerPool import execute_code, RunnerError
+from responses import FastJSONResponse, sse_event
+from Timing import ServerTimingMiddleware, phase, body_timings
+import Metrics
+import Tracing
+import QueryLog
+import DatasetCache
+import Warmup
+import Ingestion
+from Warmup import load_module
+from ConnectToDB import engine as async_engine
+from RunSQL import engine as sync_engine
+
+app = FastAPI(title="XBASE API", version="1.0", default_response_class=FastJSONResponse)
 
 # -------------------------------------------------------
 # 🔥 CORS SETTINGS (THE FIX)
@@ -50,7 +65,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing", "X-Trace-Id"],
 )
+# Each add_middleware wraps the ones before it, so a request passes
+# Tracing -> Metrics -> ServerTiming -> CORS -> endpoint. ServerTiming's
+# "total" covers CORS and the endpoint; Metrics also counts ServerTiming.
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(Metrics.MetricsMiddleware)
+# outermost: the root span per request (continues an incoming traceparent)
+# is open for everything below; off unless TRACE_EXPORT is set
+app.add_middleware(Tracing.TracingMiddleware)
+
+Metrics.register_collector(Metrics.pool_collector({"async": async_engine, "sync": sync_engine}))
+Metrics.register_collector(Metrics.stats_collector(
+    "xbase_dataset_cache", "Dataset cache", DatasetCache.cache_stats,
+    counters=("hits", "misses", "evictions", "load_errors"),
+))
+Metrics.register_collector(Metrics.stats_collector(
+    "xbase_llm_cache", "LLM response cache",
+    # AskAI is imported lazily; nothing to report until it is loaded
+    lambda: sys.modules["AskAI"].LLM_CACHE.stats() if "AskAI" in sys.modules else {},
+    counters=("hits", "misses", "sets", "evictions"),
+))
+Metrics.register_collector(Metrics.stats_collector(
+    "xbase_csv_sql", "DuckDB datasets",
+    lambda: sys.modules["CSVSQL"].cache_stats() if "CSVSQL" in sys.modules else {},
+    counters=("hits", "loads", "evictions", "load_errors"),
+))
+
+
+# -------------------------------------------------------
+# STARTUP: heavy subsystems load on first use (see Warmup.py)
+# -------------------------------------------------------
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if not Warmup.WARMUP:
+        return
+    if Warmup.WARMUP_WAIT:
+        await Warmup.warmup(Warmup.WARMUP)
+    else:
+        app.state.warmup_task = asyncio.create_task(Warmup.warmup(Warmup.WARMUP))
+
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(request: Request):
+    """Admin endpoints are disabled unless ADMIN_TOKEN is set and sent as X-Admin-Token."""
+    if not ADMIN_TOKEN or request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
 
 
 # -------------------------------------------------------
@@ -59,7 +133,7 @@ app.add_middleware(
 @app.post("/root")
 async def api_get_or_create_user_root(body: GetRootRequest):
     root_id = await get_or_create_user_root(body.user_id)
-    return {"user_id": body.user_id, "root_id": str(root_id)}
+    return FastJSONResponse({"user_id": body.user_id, "root_id": root_id})
 
 
 # -------------------------------------------------------
@@ -86,7 +160,7 @@ async def api_create_table(body: CreateTableRequest):
 @app.post("/table/read")
 async def api_read_table(body: ReadTableRequest):
     rows = await read_rows(body.table_name)
-    return {"table": body.table_name, "rows": rows}
+    return FastJSONResponse({"table": body.table_name, "rows": [list(r) for r in rows]})
 
 
 # -------------------------------------------------------
@@ -144,52 +218,50 @@ async def api_delete_table(body: DeleteTableRequest):
 
 
 # -------------------------------------------------------
-# GET FILES IN FOLDER
+# FOLDER LISTINGS (shared by /files and /folders)
 # -------------------------------------------------------
-@app.post("/files")
-async def api_get_files(body: GetFilesRequest):
+async def folder_listing(model, key: str, body, request: Request):
+    """/files and /folders: one listing page with an ETag / 304."""
     parent_uuid = uuid.UUID(body.current_folder_id)
+    variant = (body.limit, body.cursor, body.sort)
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(File).where(File.parent_id == parent_uuid))
-        files = result.scalars().all()
+    etag = None
+    if body.limit is None:
+        # whole folder: cheap aggregate first, 304 without loading any rows
+        etag = await folder_listing_etag(model, parent_uuid, *variant)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
 
-    return {
-        "files": [
-            {
-                "id": str(f.id),
-                "name": f.name,
-                "parent_id": str(f.parent_id),
-                "created_at": f.created_at.isoformat() if f.created_at else None,
-                "bucket_url": getattr(f, "bucket_url", None),
-            }
-            for f in files
-        ]
-    }
+    try:
+        rows, next_cursor = await list_folder_page(
+            model, parent_uuid, limit=body.limit, cursor=body.cursor, sort=body.sort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if etag is None:
+        # keyset page: ETag from the page itself, no full-folder aggregate
+        etag = page_etag(model, parent_uuid, rows, next_cursor, *variant)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    return FastJSONResponse({key: rows, "next_cursor": next_cursor}, headers={"ETag": etag})
 
 
 # -------------------------------------------------------
-# GET FOLDERS IN FOLDER
+# GET FILES IN FOLDER
 # -------------------------------------------------------
-@app.post("/folders")
-async def api_get_folders(body: GetFoldersRequest):
-    parent_uuid = uuid.UUID(body.current_folder_id)
+@app.post("/files")
+async def api_get_files(body: GetFilesRequest, request: Request):
+    return await folder_listing(File, "files", body, request)
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Folder).where(Folder.parent_id == parent_uuid))
-        folders = result.scalars().all()
 
-    return {
-        "folders": [
-            {
-                "id": str(d.id),
-                "name": d.name,
-                "parent_id": str(d.parent_id),
-                "created_at": d.created_at.isoformat() if d.created_at else None,
-            }
-            for d in folders
-        ]
-    }
+# -------------------------------------------------------
+# GET FOLDERS IN FOLDER
+# -------------------------------------------------------
+@app.post("/folders")
+async def api_get_folders(body: GetFoldersRequest, request: Request):
+    return await folder_listing(Folder, "folders", body, request)
 
 
 # -------------------------------------------------------
@@ -203,33 +275,59 @@ async def api_create_file(body: FilesCreateRequest):
     # Ensure parent_id is UUID
     parent_id = uuid.UUID(body.current_folder_id)
 
-    async with AsyncSessionLocal() as session:
-        await session.execute(
-            text("""
-                INSERT INTO files (id, name, created_at, parent_id, bucket_url)
-                VALUES (:id, :name, :created_at, :parent_id, :bucket_url)
-            """),
-            {
-                "id": str(file_id),
-                "name": body.name,
-                "created_at": created_at,
-                "parent_id": str(parent_id),
-                "bucket_url": body.bucket_url,
-            },
-        )
-        await session.commit()
+    with phase("db"):
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                text("""
+                    INSERT INTO files (id, name, created_at, parent_id, bucket_url)
+                    VALUES (:id, :name, :created_at, :parent_id, :bucket_url)
+                """),
+                {
+                    "id": str(file_id),
+                    "name": body.name,
+                    "created_at": created_at,
+                    "parent_id": str(parent_id),
+                    "bucket_url": body.bucket_url,
+                },
+            )
+            await session.commit()
+
+    bump_folder_version(parent_id)
+    # column profile + Parquet copy in the background (Ingestion.py); GET /files/{id}/profile
+    Ingestion.schedule(file_id, body.bucket_url)
 
     # Return full file info matching your frontend schema
-    return {
+    return FastJSONResponse({
         "status": "file_created",
         "file": {
-            "id": str(file_id),
+            "id": file_id,
             "name": body.name,
-            "created_at": created_at.isoformat(),
-            "parent_id": str(parent_id),
+            "created_at": created_at,
+            "parent_id": parent_id,
             "bucket_url": body.bucket_url,
         },
-    }
+    })
+
+
+# -------------------------------------------------------
+# FILE PROFILE (computed after /files/create)
+# -------------------------------------------------------
+@app.get("/files/{file_id}/profile")
+async def api_get_file_profile(file_id: uuid.UUID):
+    row = await get_file_profile(file_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="No profile for this file")
+    return FastJSONResponse({"file_id": file_id, **row})
+
+
+@app.post("/files/{file_id}/profile")
+async def api_refresh_file_profile(file_id: uuid.UUID):
+    bucket_url = await get_file_bucket_url(file_id)
+    if not bucket_url:
+        raise HTTPException(status_code=404, detail="File not found")
+    if Ingestion.schedule(file_id, bucket_url) is None:
+        raise HTTPException(status_code=503, detail="Ingestion is disabled (INGEST=off)")
+    return {"status": "pending", "file_id": str(file_id)}
 
 # @app.post("/ask_ai")
 # def ask_ai_endpoint(payload: AskAISchema):
@@ -260,7 +358,7 @@ async def api_create_file(body: FilesCreateRequest):
 #     }
 
 @app.post("/ask_ai")
-def ask_ai_endpoint(payload: AskAISchema):
+async def ask_ai_endpoint(payload: AskAISchema, request: Request):
     """
     AI query endpoint.
 
@@ -281,23 +379,29 @@ def ask_ai_endpoint(payload: AskAISchema):
         # Normalize history
         history = payload.chat_history or []
 
-        # Call core AI logic
-        result = Ask_AI(
+        # Call core AI logic (async: LLM, runner HTTP and SQL are awaited)
+        AskAI = await load_module("AskAI")
+        result = await AskAI.Ask_AI_async(
             db_info=payload.db_info,
             query=payload.query,
             chat_history=history,
-            parent_id=payload.parent_id
+            parent_id=payload.parent_id,
+            conversation_id=payload.conversation_id
         )
 
         # ---- MANUAL UNPACKING (EXPLICIT & SAFE) ----
         final_text, updated_history, image_box, sql_res, _ = result
 
-        return {
+        body = {
             "response": final_text,
             "chat_history": updated_history,
             "images": image_box,
             "sql_res": sql_res
         }
+        timings = body_timings(request)
+        if timings:
+            body["timings"] = timings
+        return body
 
     except ValueError as e:
         # Contract mismatch / unpacking error
@@ -315,27 +419,84 @@ def ask_ai_endpoint(payload: AskAISchema):
             detail=f"Ask_AI execution failed: {str(e)}"
         )
 
-RUNNER_PATH = os.path.join(
-    os.path.dirname(__file__),
-    "python_runner",
-    "runner.py"
-)
-import concurrent.futures
+# -------------------------------------------------------
+# ASK AI (STREAMING, Server-Sent Events)
+# -------------------------------------------------------
+@app.post("/ask_ai/stream")
+async def ask_ai_stream_endpoint(payload: AskAISchema):
+    """
+    Same input as /ask_ai, streamed as text/event-stream.
 
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
+    Events: start, planning_token, tool_start, tool_result (with SQL rows /
+    runner output and images), summary_token, done, error.
+    """
 
-def run_runner_subprocess(payload: bytes):
-    """Runs runner.py synchronously inside a separate thread."""
-    process = subprocess.Popen(
-        [sys.executable, RUNNER_PATH],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+    async def events():
+        try:
+            AskAI = await load_module("AskAI")
+            async for event, data in AskAI.Ask_AI_stream(
+                db_info=payload.db_info,
+                query=payload.query,
+                chat_history=payload.chat_history or [],
+                parent_id=payload.parent_id,
+                conversation_id=payload.conversation_id
+            ):
+                yield sse_event(event, data)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {"detail": f"Ask_AI execution failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    stdout, stderr = process.communicate(payload)
 
-    return stdout.decode("utf-8").strip(), stderr.decode("utf-8").strip()
+# -------------------------------------------------------
+# METRICS (Prometheus text format)
+# -------------------------------------------------------
+@app.get("/metrics")
+async def metrics():
+    return Response(Metrics.render(), media_type=Metrics.CONTENT_TYPE)
+
+
+# -------------------------------------------------------
+# ADMIN: SLOW / SAMPLED QUERIES
+# -------------------------------------------------------
+@app.get("/admin/queries")
+async def admin_queries(request: Request, kind: str = "slow", limit: int = 50, tag: str | None = None):
+    require_admin(request)
+    if kind not in ("slow", "sampled"):
+        raise HTTPException(status_code=400, detail="kind must be 'slow' or 'sampled'")
+    return {
+        "kind": kind,
+        "slow_query_ms": QueryLog.SLOW_QUERY_MS,
+        "slow_ai_query_ms": QueryLog.SLOW_AI_QUERY_MS,
+        "sample_rate": QueryLog.QUERY_SAMPLE_RATE,
+        "queries": QueryLog.entries(kind, limit=limit, tag=tag),
+    }
+
+
+# -------------------------------------------------------
+# ADMIN: WARM UP LAZY SUBSYSTEMS
+# -------------------------------------------------------
+@app.post("/admin/warmup")
+async def admin_warmup(request: Request, parts: str | None = None):
+    """parts: comma-separated subset of ask_ai,rag,runner,db (default: all)."""
+    require_admin(request)
+    selected = [p.strip() for p in parts.split(",") if p.strip()] if parts else None
+    return {"warmup_ms": await Warmup.warmup(selected)}
+
+
+# -------------------------------------------------------
+# ASK AI: LLM CACHE STATS
+# -------------------------------------------------------
+@app.get("/ask_ai/cache")
+async def ask_ai_cache_stats():
+    AskAI = await load_module("AskAI")
+    return AskAI.LLM_CACHE.stats()
 
 
 # @app.post("/run", response_model=RunCodeResponse)
@@ -371,44 +532,63 @@ def run_runner_subprocess(payload: bytes):
 #         csv_text=result.get("csv_text")
 #     )
 @app.post("/run", response_model=RunCodeResponse)
-async def run_code(request: RunCodeRequest):
-    payload = json.dumps({
-        "code": request.code,
-        "bucket_url": request.bucket_url
-    }).encode("utf-8")
-
-    loop = asyncio.get_running_loop()
-
-    stdout, stderr = await loop.run_in_executor(
-        executor,
-        run_runner_subprocess,
-        payload
+async def run_code(request: RunCodeRequest, http_request: Request):
+    try:
+        result = await execute_code(request.code, request.bucket_url, profile=request.profile)
+    except RunnerError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return RunCodeResponse(
+        output=result["output"],
+        error=result["error"],
+        images=result["images"],
+        bucket_url=result["bucket_url"],
+        sql_res=None,
+        timings=body_timings(http_request),
+        profile=result["profile"]
     )
 
-    if not stdout:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Runner produced no output. stderr:\n{stderr}"
-        )
 
+# -------------------------------------------------------
+# CSV QUERY (declarative filter / group-by / sort, no runner)
+# -------------------------------------------------------
+@app.post("/csv/query")
+async def csv_query(body: CSVQueryRequest):
+    CSVQuery = await load_module("CSVQuery")
     try:
-        result = json.loads(stdout)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "Invalid JSON from runner.\n"
-                f"stdout:\n{stdout}\n\nstderr:\n{stderr}"
+        with phase("csv-query"):
+            result = await asyncio.to_thread(CSVQuery.query, body.model_dump())
+    except CSVQuery.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Dataset could not be loaded")
+    return FastJSONResponse(result)
+
+
+# -------------------------------------------------------
+# CSV SQL (DuckDB over the dataset as table `df`, see CSVSQL.py)
+# -------------------------------------------------------
+@app.post("/csv/sql")
+async def csv_sql(body: CSVSQLRequest):
+    CSVSQL = await load_module("CSVSQL")
+    import duckdb
+    try:
+        with phase("sql", **{"db.engine": "duckdb"}):
+            result = await asyncio.to_thread(
+                CSVSQL.run_sql_limited, body.bucket_url, body.query,
+                max_rows=body.max_rows,
+                statement_timeout_ms=CSVSQL.CSV_SQL_STATEMENT_TIMEOUT_MS,
+                tag="csv",
             )
-        )
+    except CSVSQL.DatasetNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except duckdb.Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return RunCodeResponse(
-        output=result.get("output"),
-        error=result.get("error") or stderr or None,
-        images=result.get("images") or [],
-        bucket_url=result.get("bucket_url", request.bucket_url),
-        sql_res=None
-    )
+    if result is None:
+        return {"status": "ok"}
+    return FastJSONResponse(result)
 
 # -------------------------------------------------------
 # GET COLUMNS (SYNC via SYNC_DATABASE_URL)
@@ -424,14 +604,15 @@ def get_columns(req: GetColumnsRequest):
     schema_name = "schema" + req.parent_id.replace('-', '_')
 
     # set schema and fetch column names
-    run_sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
-    run_sql(f"SET search_path TO {schema_name}")
+    with phase("db"):
+        run_sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+        run_sql(f"SET search_path TO {schema_name}")
 
-    cols = run_sql(
-        f"SELECT column_name FROM information_schema.columns "
-        f"WHERE table_schema = current_schema() AND table_name = '{req.table_name}' "
-        f"ORDER BY ordinal_position;"
-    ) or []
+        cols = run_sql(
+            f"SELECT column_name FROM information_schema.columns "
+            f"WHERE table_schema = current_schema() AND table_name = '{req.table_name}' "
+            f"ORDER BY ordinal_position;"
+        ) or []
 
     return {"columns": [c[0] for c in cols]}
 
@@ -446,14 +627,15 @@ def get_rows(req: GetRowsRequest):
         raise HTTPException(status_code=400, detail="Invalid table_name")
 
     schema_name = "schema" + req.parent_id.replace('-', '_')
-    run_sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
-    run_sql(f"SET search_path TO {schema_name}")
+    with phase("db"):
+        run_sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+        run_sql(f"SET search_path TO {schema_name}")
 
-    rows = run_sql(f"SELECT * FROM {req.table_name};") or []
+        rows = run_sql(f"SELECT * FROM {req.table_name};") or []
     # convert tuples to lists for JSON serialization
     try:
         rows_list = [list(r) for r in rows]
     except Exception:
         rows_list = rows
 
-    return {"rows": rows_list}
\ No newline at end of file
+    return FastJSONResponse({"rows": rows_list})
\ No newline at end of file
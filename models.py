@@ -1,6 +1,6 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, String, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 from sqlalchemy.sql import func
 
@@ -11,23 +11,60 @@ class Folder(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # parent folder UUID (no foreign key restriction)
     parent_id = Column(UUID(as_uuid=True), nullable=False)
 
+    # keyset pagination indexes for /folders
+    __table_args__ = (
+        Index("ix_folders_parent_created", "parent_id", "created_at", "id"),
+        Index("ix_folders_parent_name", "parent_id", "name", "id"),
+    )
+
 
 class File(Base):
     __tablename__ = "files"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # parent folder UUID (no foreign key restriction)
     parent_id = Column(UUID(as_uuid=True), nullable=False)
     bucket_url = Column(String, nullable=False)
 
+    # Parquet companion of the CSV, written by Ingestion.py after /files/create
+    # (added to existing tables by startup.py)
+    parquet_url = Column(String, nullable=True)
+    parquet_status = Column(String, nullable=True)   # pending | ready | failed
+
+    # keyset pagination indexes for /files
+    __table_args__ = (
+        Index("ix_files_parent_created", "parent_id", "created_at", "id"),
+        Index("ix_files_parent_name", "parent_id", "name", "id"),
+        # runner / Ask_AI look up the Parquet version by bucket_url
+        Index("ix_files_bucket_url", "bucket_url"),
+    )
+
+class FileProfile(Base):
+    """Column profile of a CSV file, computed in the background after
+    /files/create (see Ingestion.py / DatasetProfile.py)."""
+    __tablename__ = "file_profiles"
+
+    file_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket_url = Column(String, nullable=False)
+    status = Column(String, nullable=False)   # pending | ready | failed
+    profile = Column(JSONB)
+    error = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Ask_AI looks profiles up by bucket_url
+    __table_args__ = (
+        Index("ix_file_profiles_bucket_url", "bucket_url"),
+    )
+
+
 class UserRoot(Base):
     __tablename__ = "user_root"
 
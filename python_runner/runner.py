@@ -512,9 +512,14 @@
 # ---------------------------------------------------------
 import sys
 import io
+import time
 
+_STARTED = time.perf_counter()   # import time is reported as its own phase
+_STARTED_NS = time.time_ns()
 _ORIGINAL_STDOUT = sys.stdout
-sys.stdout = io.StringIO()  # swallow ALL accidental prints
+if __name__ == "__main__":
+    # only as the runner subprocess; the API process also imports this module
+    sys.stdout = io.StringIO()  # swallow ALL accidental prints
 
 # ---------------------------------------------------------
 # Silence logging globally
@@ -532,6 +537,7 @@ import traceback
 import base64
 import os
 import csv
+import random
 
 # ---------------------------------------------------------
 # Third-party imports
@@ -593,39 +599,57 @@ def extract_images():
 # ---------------------------------------------------------
 # Smart CSV parsing
 # ---------------------------------------------------------
-def smart_csv_to_df(csv_text: str):
-    if not csv_text or not csv_text.strip():
-        return None
-
-    # Remove BOM
-    if csv_text.startswith("\ufeff"):
-        csv_text = csv_text.encode().decode("utf-8-sig")
-
-    sample = csv_text[:5000]
+def sniff_delimiter(sample: str) -> str:
     try:
-        delimiter = csv.Sniffer().sniff(sample).delimiter
+        return csv.Sniffer().sniff(sample).delimiter
     except Exception:
-        delimiter = (
+        return (
             ";" if ";" in sample else
             "|" if "|" in sample else
             "\t" if "\t" in sample else
             ","
         )
 
+
+def smart_csv_to_df(csv_text: str):
+    if not csv_text or not csv_text.strip():
+        return None
+
+    # Remove BOM
+    if csv_text.startswith("\ufeff"):
+        csv_text = csv_text.encode().decode("utf-8-sig")
+
     try:
         return pd.read_csv(
             io.StringIO(csv_text),
-            sep=delimiter,
+            sep=sniff_delimiter(csv_text[:5000]),
             engine="python",
             on_bad_lines="skip"
         )
     except Exception:
         return None
 
+
+def iter_csv_chunks(raw: bytes, chunksize: int, dtype=None):
+    """smart_csv_to_df's parse of CSV bytes, as DataFrames of `chunksize` rows.
+    Decodes as it reads, so only the bytes and one chunk are in memory.
+    Errors are raised (empty or unparsable file)."""
+    sample = raw[:20000].decode("utf-8", errors="ignore").lstrip("\ufeff")[:5000]
+    text = io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig", errors="ignore", newline="")
+    yield from pd.read_csv(
+        text,
+        sep=sniff_delimiter(sample),
+        engine="python",
+        on_bad_lines="skip",
+        dtype=dtype,
+        chunksize=chunksize,
+    )
+
 # ---------------------------------------------------------
 # Load CSV from Supabase Storage
 # ---------------------------------------------------------
-def load_csv_from_supabase(bucket_path: str):
+def download_from_supabase(bucket_path: str):
+    """Raw bytes of `bucket_path`, or None."""
     if not bucket_path:
         return None
 
@@ -643,6 +667,10 @@ def load_csv_from_supabase(bucket_path: str):
     elif hasattr(res, "read"):
         raw = res.read()
 
+    return raw or None
+
+
+def csv_bytes_to_df(raw):
     if not raw:
         return None
 
@@ -653,53 +681,216 @@ def load_csv_from_supabase(bucket_path: str):
 
     return smart_csv_to_df(text)
 
+
+def upload_to_supabase(bucket_path: str, data: bytes, content_type: str):
+    """Write `data` to `bucket_path` (overwrites). Errors are raised."""
+    get_supabase().storage.from_(BUCKET_NAME).upload(
+        bucket_path, data, {"content-type": content_type, "upsert": "true"}
+    )
+
+
+def parquet_bytes_to_df(raw):
+    """DataFrame from the Parquet companion written at ingestion, or None."""
+    if not raw:
+        return None
+    try:
+        return pd.read_parquet(io.BytesIO(raw))
+    except Exception:
+        return None
+
+
+def load_csv_from_supabase(bucket_path: str, parquet_path: str | None = None):
+    """The dataset as a DataFrame; from its Parquet version when there is one
+    (no text parsing), else from the CSV."""
+    if parquet_path:
+        df = parquet_bytes_to_df(download_from_supabase(parquet_path))
+        if df is not None:
+            return df
+    return csv_bytes_to_df(download_from_supabase(bucket_path))
+
 # ---------------------------------------------------------
 # Execute user Python code (df injected)
 # ---------------------------------------------------------
-def run_code(code: str, bucket_url: str):
-    local_ns = {}
+def _ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 2)
 
-    df = load_csv_from_supabase(bucket_url)
+# ---------------------------------------------------------
+# Profiling (opt-in: payload "profile": true)
+# ---------------------------------------------------------
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+
+
+def _profile_top(profiler, top_n: int):
+    import pstats
+
+    stats = pstats.Stats(profiler).stats   # (file, line, func) -> (cc, nc, tt, ct, callers)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.items():
+        if "_lsprof" in func:   # the profiler's own enable/disable
+            continue
+        rows.append({
+            "function": func if filename == "~" else f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "primitive_calls": cc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3),
+        })
+    rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+    return rows[:top_n]
+
+
+class _Trace:
+    """Spans recorded here and returned in the result JSON ("spans"), as
+    OTLP/JSON span dicts; the API process exports them (Tracing.py). Parented
+    to the caller's W3C traceparent; a no-op without one."""
+
+    def __init__(self, traceparent: str | None):
+        parts = (traceparent or "").split("-")
+        self.enabled = len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16
+        self.trace_id, self.parent_id = (parts[1], parts[2]) if self.enabled else (None, None)
+        self.spans = []
+
+    def add(self, name: str, start_ns: int, end_ns: int | None = None, error: str | None = None,
+            **attributes):
+        if not self.enabled:
+            return
+        self.spans.append({
+            "traceId": self.trace_id,
+            "spanId": f"{random.getrandbits(64):016x}",
+            "parentSpanId": self.parent_id,
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}}
+                           for k, v in attributes.items() if v is not None],
+            "status": {"code": 2, "message": error[-500:]} if error else {"code": 1},
+        })
+
+
+def run_code(code: str, bucket_url: str, profile: bool = False, traceparent: str | None = None,
+             parquet_url: str | None = None):
+    """Run `code` with the CSV as `df` (read from `parquet_url` when given,
+    falling back to the CSV if that fails).
+
+    `timings` holds download / parse / exec / images durations in ms. With
+    profile=True the code runs under cProfile and tracemalloc, and `profile`
+    holds the top PROFILE_TOP_N functions by cumulative time and peak memory
+    (overall, and during exec alone). With a `traceparent`, the same phases
+    are returned as trace spans in `spans`.
+    """
+    local_ns = {}
+    timings = {}
+    profiler = None
+    trace = _Trace(traceparent)
+
+    if profile:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+
+    t, t_ns = time.perf_counter(), time.time_ns()
+    data_format, raw = "parquet", download_from_supabase(parquet_url) if parquet_url else None
+    if raw is None:
+        data_format, raw = "csv", download_from_supabase(bucket_url)
+    timings["download"] = _ms(t)
+    download_bytes = len(raw or b"")
+    trace.add("runner.download", t_ns, bucket_url=bucket_url, bytes=download_bytes, format=data_format)
+
+    t, t_ns = time.perf_counter(), time.time_ns()
+    df = parquet_bytes_to_df(raw) if data_format == "parquet" else csv_bytes_to_df(raw)
+    if df is None and data_format == "parquet":
+        data_format, raw = "csv", download_from_supabase(bucket_url)
+        download_bytes += len(raw or b"")
+        df = csv_bytes_to_df(raw)
+    timings["parse"] = _ms(t)
+    trace.add("runner.parse", t_ns, rows=None if df is None else len(df), format=data_format)
     local_ns["df"] = df  # df may be None — allowed
 
     stdout_buf = io.StringIO()
     stderr_buf = io.StringIO()
+    error = None
+    images = []
+
+    if profile:
+        _, before_exec_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
 
+    t, t_ns = time.perf_counter(), time.time_ns()
     try:
         orig_stdout, orig_stderr = sys.stdout, sys.stderr
         sys.stdout, sys.stderr = stdout_buf, stderr_buf
 
-        exec(code, {"__name__": "__main__"}, local_ns)
+        if profiler:
+            profiler.enable()
+        try:
+            exec(code, {"__name__": "__main__"}, local_ns)
+        finally:
+            if profiler:
+                profiler.disable()
 
     except Exception:
-        return {
-            "output": None,
-            "error": traceback.format_exc(),
-            "images": [],
-            "bucket_url": bucket_url,
-        }
+        error = traceback.format_exc()
 
     finally:
         sys.stdout, sys.stderr = orig_stdout, orig_stderr
-
-    return {
-        "output": stdout_buf.getvalue(),
-        "error": stderr_buf.getvalue(),
-        "images": extract_images(),
+    timings["exec"] = _ms(t)
+    trace.add("runner.exec", t_ns, error=error, profile=profile)
+    if profile:
+        _, exec_peak = tracemalloc.get_traced_memory()
+
+    if error is None:
+        t, t_ns = time.perf_counter(), time.time_ns()
+        images = extract_images()
+        timings["images"] = _ms(t)
+        trace.add("runner.images", t_ns, count=len(images))
+
+    result = {
+        "output": None if error else stdout_buf.getvalue(),
+        "error": error or stderr_buf.getvalue(),
+        "images": images,
         "bucket_url": bucket_url,
+        "timings": timings,
+        "download_bytes": download_bytes,
+        "format": data_format,
     }
 
+    if profile:
+        _, final_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["profile"] = {
+            "top": _profile_top(profiler, PROFILE_TOP_N),
+            "peak_memory_bytes": max(before_exec_peak, exec_peak, final_peak),
+            "exec_peak_memory_bytes": exec_peak,
+            "timings": dict(timings),
+        }
+
+    if trace.enabled:
+        result["spans"] = trace.spans
+    return result
+
 # ---------------------------------------------------------
 # ENTRY POINT — JSON ONLY, NOTHING ELSE
 # ---------------------------------------------------------
 if __name__ == "__main__":
     try:
+        imported_ms = _ms(_STARTED)
         payload = json.loads(sys.stdin.read())
 
         result = run_code(
             payload.get("code", ""),
-            payload.get("bucket_url", "")
+            payload.get("bucket_url", ""),
+            profile=bool(payload.get("profile")),
+            traceparent=payload.get("traceparent"),
+            parquet_url=payload.get("parquet_url"),
         )
+        result["timings"] = {"import": imported_ms, **result["timings"]}
+        if "spans" in result:
+            # interpreter start + imports, parented like the other phases
+            startup = _Trace(payload["traceparent"])
+            startup.add("runner.import", _STARTED_NS, _STARTED_NS + int(imported_ms * 1e6))
+            result["spans"] = startup.spans + result["spans"]
 
         # Restore stdout and emit PURE JSON
         sys.stdout = _ORIGINAL_STDOUT
@@ -0,0 +1,44 @@
+import uuid
+import decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+# ------------------------------------------------
+# FAST JSON RESPONSE (orjson)
+# ------------------------------------------------
+# orjson serializes uuid.UUID, datetime, date and numpy values natively.
+# Anything it does not know (asyncpg's UUID subclass, Decimal from NUMERIC
+# columns, bytes, sets) goes through _default. Returning FastJSONResponse(...) from an endpoint also skips
+# FastAPI's jsonable_encoder pass over the content.
+def _default(obj):
+    if isinstance(obj, uuid.UUID):   # asyncpg.pgproto.pgproto.UUID is a subclass
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", errors="replace")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+# ------------------------------------------------
+# SERVER-SENT EVENTS
+# ------------------------------------------------
+def sse_event(event: str, data) -> bytes:
+    """One SSE frame; data is JSON on a single line."""
+    payload = orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + payload + b"\n\n"
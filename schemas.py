@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 
 class CreateFolderRequest(BaseModel):
     folder_name: str
@@ -77,10 +77,17 @@ class DeleteTableRequest(BaseModel):
 
 class GetFilesRequest(BaseModel):
     current_folder_id: str
+    # Pagination (optional): omit limit to get the whole folder
+    limit: Optional[int] = Field(default=None, ge=1, le=1000)
+    cursor: Optional[str] = None
+    sort: str = "created_at"   # created_at | -created_at | name | -name
 
 
 class GetFoldersRequest(BaseModel):
     current_folder_id: str
+    limit: Optional[int] = Field(default=None, ge=1, le=1000)
+    cursor: Optional[str] = None
+    sort: str = "created_at"
 
 
 class FilesCreateRequest(BaseModel):
@@ -93,6 +100,8 @@ class AskAISchema(BaseModel):
     query: str          
     chat_history: List  
     parent_id: str
+    # stable id of the chat; lets the server reuse its cached history summary
+    conversation_id: Optional[str] = None
     # optional image_box can be provided by client; server will return images separately
     
 
@@ -112,6 +121,8 @@ class AskAISchema(BaseModel):
 class RunCodeRequest(BaseModel):
     code: str
     bucket_url: str
+    # run under cProfile + tracemalloc; adds `profile` to the response
+    profile: bool = False
 
 
 class RunCodeResponse(BaseModel):
@@ -120,6 +131,10 @@ class RunCodeResponse(BaseModel):
     images: List[str] = Field(default_factory=list)
     bucket_url: Optional[str] = None
     sql_res: Optional[List] = None
+    # per-phase ms (runner-download, runner-exec, ...) when ?timings=1
+    timings: Optional[Dict[str, float]] = None
+    # top functions by cumulative time, peak memory, phase times (profile=True)
+    profile: Optional[Dict] = None
 
 
 # -----------------------------
@@ -132,3 +147,42 @@ class GetColumnsRequest(BaseModel):
 class GetRowsRequest(BaseModel):
     parent_id: str
     table_name: str
+
+
+# -----------------------------
+# Declarative CSV query (/csv/query, see CSVQuery.py)
+# -----------------------------
+class CSVFilter(BaseModel):
+    column: str
+    # eq ne lt le gt ge in not_in contains startswith is_null not_null
+    op: str
+    value: Any = None
+
+
+class CSVAggregate(BaseModel):
+    column: str = "*"   # "*" only with count
+    func: str           # count sum mean min max median nunique std
+    alias: Optional[str] = None
+
+
+class CSVSort(BaseModel):
+    column: str
+    desc: bool = False
+
+
+class CSVQueryRequest(BaseModel):
+    bucket_url: str
+    select: Optional[List[str]] = None
+    filters: List[CSVFilter] = Field(default_factory=list)
+    group_by: List[str] = Field(default_factory=list)
+    aggregates: List[CSVAggregate] = Field(default_factory=list)
+    sort: List[CSVSort] = Field(default_factory=list)
+    limit: Optional[int] = Field(default=None, ge=1)
+    page_size: int = Field(default=100, ge=1, le=5000)
+    cursor: Optional[str] = None
+
+
+class CSVSQLRequest(BaseModel):
+    bucket_url: str
+    query: str                 # DuckDB SQL; the dataset is the table `df`
+    max_rows: int = Field(default=1000, ge=1, le=100000)
@@ -1,10 +1,33 @@
 from ConnectToDB import engine
 from models import Base
+from sqlalchemy import text
 import asyncio
 
+# columns added to tables that already exist (create_all only creates tables)
+ADDED_COLUMNS = [
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS parquet_url VARCHAR",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS parquet_status VARCHAR",
+]
+
+# keyset pagination skips rows whose sort key is NULL
+NOT_NULL = [
+    "UPDATE folders SET created_at = now() WHERE created_at IS NULL",
+    "ALTER TABLE folders ALTER COLUMN created_at SET NOT NULL",
+    "UPDATE files SET created_at = now() WHERE created_at IS NULL",
+    "ALTER TABLE files ALTER COLUMN created_at SET NOT NULL",
+]
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for stmt in ADDED_COLUMNS + NOT_NULL:
+            await conn.execute(text(stmt))
+        # create_all skips indexes of tables that already exist
+        await conn.run_sync(lambda sync_conn: [
+            index.create(sync_conn, checkfirst=True)
+            for table in Base.metadata.sorted_tables
+            for index in table.indexes
+        ])
         print("ORM tables created!")
 
 asyncio.run(init_db())
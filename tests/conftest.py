@@ -0,0 +1,18 @@
+# Offline defaults so app modules import without a database, LLM or storage.
+# Nothing here connects: the URLs only let the engines be created.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for key, value in {
+    "DATABASE_URL": "postgresql+asyncpg://test@127.0.0.1:1/test",
+    "SYNC_DATABASE_URL": "postgresql+psycopg2://test@127.0.0.1:1/test",
+    "DATABASE_SSL": "disable",
+    "SUPABASE_URL": "http://127.0.0.1:1",
+    "SUPABASE_SERVICE_ROLE_KEY": "test",
+    "LLM_BACKEND": "fake",
+    "RAG_EMBEDDINGS": "local",
+    "LLM_CACHE": "off",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,111 @@
+import asyncio
+
+from langchain_core.messages import SystemMessage
+
+from ChatHistory import SUMMARY_PREFIX, HistoryManager, message_tokens
+
+
+def conversation(turns: int) -> list[dict]:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i}: " + "rows " * 40})
+        history.append({"role": "assistant", "content": f"answer {i}: " + "count " * 40})
+    return history
+
+
+class Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, summary, messages):
+        self.calls.append((summary, [m.content for m in messages]))
+        return f"summary #{len(self.calls)}"
+
+    async def asummarize(self, summary, messages):
+        return self(summary, messages)
+
+
+def manager(summarizer=None, **kwargs):
+    kwargs = {"budget": 400, "keep_recent": 2, "compaction": "summarize", **kwargs}
+    summarizer = summarizer or Summarizer()
+    return HistoryManager(summarize=summarizer, asummarize=summarizer.asummarize, **kwargs)
+
+
+def tokens(messages) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def test_short_history_is_kept_verbatim():
+    summarizer = Summarizer()
+    out = manager(summarizer).compact(conversation(1), "c1")
+    assert [m.content for m in out] == [m["content"] for m in conversation(1)]
+    assert summarizer.calls == []
+
+
+def test_long_history_is_folded_into_a_summary():
+    summarizer = Summarizer()
+    history = conversation(10)
+    out = manager(summarizer).compact(history, "c1")
+
+    assert isinstance(out[0], SystemMessage)
+    assert out[0].content == SUMMARY_PREFIX + "summary #1"
+    tail = out[1:]
+    assert len(tail) >= 2
+    assert [m.content for m in tail] == [m["content"] for m in history[-len(tail):]]
+    assert tokens(out) <= 400
+    # everything before the tail was summarized, oldest first
+    assert summarizer.calls[0][1] == [m["content"] for m in history[:-len(tail)]]
+    assert history == conversation(10)   # the client's history is never modified
+
+
+def test_next_turn_reuses_the_cached_summary():
+    summarizer = Summarizer()
+    history_manager = manager(summarizer)
+    history = conversation(10)
+    history_manager.compact(history, "c1")
+
+    history += conversation(11)[-2:]
+    out = history_manager.compact(history, "c1")
+    assert len(summarizer.calls) == 1
+    assert out[0].content == SUMMARY_PREFIX + "summary #1"
+    assert out[-1].content == history[-1]["content"]
+
+
+def test_summary_is_extended_with_newly_folded_messages():
+    summarizer = Summarizer()
+    history_manager = manager(summarizer)
+    history = conversation(10)
+    history_manager.compact(history, "c1")
+
+    history = conversation(20)
+    history_manager.compact(history, "c1")
+    assert len(summarizer.calls) == 2
+    previous, folded = summarizer.calls[1]
+    assert previous == "summary #1"
+    assert folded[0] not in summarizer.calls[0][1]   # only messages not yet summarized
+
+
+def test_edited_history_starts_over():
+    summarizer = Summarizer()
+    history_manager = manager(summarizer)
+    history_manager.compact(conversation(10), "c1")
+
+    edited = conversation(10)
+    edited[0]["content"] = "a different first question"
+    history_manager.compact(edited, "c1")
+    assert summarizer.calls[1][0] is None
+    assert summarizer.calls[1][1][0] == "a different first question"
+
+
+def test_drop_compaction_has_no_summary():
+    summarizer = Summarizer()
+    out = manager(summarizer, compaction="drop").compact(conversation(10), "c1")
+    assert summarizer.calls == []
+    assert not isinstance(out[0], SystemMessage)
+    assert tokens(out) <= 400
+
+
+def test_async_matches_sync():
+    sync_out = manager().compact(conversation(10), "c1")
+    async_out = asyncio.run(manager().acompact(conversation(10), "c1"))
+    assert [m.content for m in async_out] == [m.content for m in sync_out]
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import CSVQuery
+import DatasetCache
+from CSVQuery import QueryError
+
+
+def sales():
+    return pd.DataFrame({
+        "region": ["EU", "US", "EU", "EU", None],
+        "country": ["DE", "US", "FR", "DE", "X"],
+        "amount": [10, 20, 5.5, np.nan, 1],
+        "day": pd.to_datetime(["2024-01-01"] * 5),
+    })
+
+
+@pytest.fixture
+def dataset(monkeypatch):
+    datasets = {"sales.csv": sales()}
+    monkeypatch.setattr(DatasetCache, "get_dataframe", datasets.get)
+    monkeypatch.setattr(CSVQuery, "_results", CSVQuery.OrderedDict())
+    return datasets
+
+
+def query(**spec):
+    return CSVQuery.query({"bucket_url": "sales.csv", **spec})
+
+
+def test_filters(dataset):
+    out = query(filters=[{"column": "region", "op": "eq", "value": "EU"},
+                         {"column": "amount", "op": "not_null"}])
+    assert out["rows"] == [["EU", "DE", 10.0, "2024-01-01T00:00:00"],
+                           ["EU", "FR", 5.5, "2024-01-01T00:00:00"]]
+    out = query(filters=[{"column": "country", "op": "in", "value": ["FR", "X"]}], select=["country"])
+    assert out["rows"] == [["FR"], ["X"]]
+
+
+def test_group_by_and_aggregates(dataset):
+    out = query(group_by=["region"],
+                aggregates=[{"column": "amount", "func": "sum", "alias": "total"},
+                            {"column": "*", "func": "count"}],
+                sort=[{"column": "total", "desc": True}])
+    assert out["columns"] == ["region", "total", "count"]
+    assert out["rows"] == [["US", 20.0, 1], ["EU", 15.5, 3], [None, 1.0, 1]]
+
+    assert query(group_by=["country"], sort=[{"column": "country"}])["rows"] == \
+        [["DE", 2], ["FR", 1], ["US", 1], ["X", 1]]
+    assert query(aggregates=[{"column": "amount", "func": "mean"}])["rows"] == [[9.125]]
+
+
+def test_sort_and_limit(dataset):
+    out = query(select=["country", "amount"], sort=[{"column": "amount", "desc": True}], limit=3)
+    assert out["rows"] == [["US", 20.0], ["DE", 10.0], ["FR", 5.5]]
+    assert out["total_rows"] == 3
+
+
+def test_cursor_pages_through_the_result(dataset):
+    rows, cursor = [], None
+    while True:
+        out = query(sort=[{"column": "country"}], page_size=2, cursor=cursor)
+        rows += out["rows"]
+        cursor = out["next_cursor"]
+        if cursor is None:
+            break
+    assert [row[1] for row in rows] == ["DE", "DE", "FR", "US", "X"]
+
+
+def test_next_page_reuses_the_result(dataset, monkeypatch):
+    first = query(sort=[{"column": "country"}], page_size=2)
+    calls = []
+    run_query = CSVQuery.run_query
+    monkeypatch.setattr(CSVQuery, "run_query", lambda df, spec: calls.append(spec) or run_query(df, spec))
+    query(sort=[{"column": "country"}], page_size=2, cursor=first["next_cursor"])
+    assert calls == []
+
+    dataset["sales.csv"] = sales()   # reloaded: a new DataFrame
+    query(sort=[{"column": "country"}], page_size=2, cursor=first["next_cursor"])
+    assert len(calls) == 1
+
+
+def test_source_dataframe_is_not_modified(dataset):
+    query(filters=[{"column": "region", "op": "eq", "value": "EU"}],
+          sort=[{"column": "amount"}], select=["amount"])
+    pd.testing.assert_frame_equal(dataset["sales.csv"], sales())
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"filters": [{"column": "nope", "op": "eq", "value": 1}]}, "Unknown column"),
+    ({"filters": [{"column": "amount", "op": "like", "value": 1}]}, "Unknown filter op"),
+    ({"filters": [{"column": "amount", "op": "gt", "value": "x"}]}, "Cannot compare"),
+    ({"aggregates": [{"column": "country", "func": "mean"}]}, "not supported"),
+    ({"aggregates": [{"column": "*", "func": "sum"}]}, "Only count"),
+    ({"cursor": "zzz"}, "Invalid cursor"),
+])
+def test_invalid_specs(dataset, spec, message):
+    with pytest.raises(QueryError, match=message):
+        query(**spec)
+
+
+def test_cursor_for_another_query(dataset):
+    cursor = query(page_size=1)["next_cursor"]
+    with pytest.raises(QueryError, match="different query"):
+        query(page_size=1, cursor=cursor, select=["country"])
+
+
+def test_missing_dataset(dataset):
+    assert CSVQuery.query({"bucket_url": "missing.csv"}) is None
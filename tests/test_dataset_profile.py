@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import DatasetProfile
+from DatasetProfile import PROFILE_SKETCH_SIZE, profile_chunks, profile_csv
+
+
+def columns(profile) -> dict:
+    return {c["name"]: c for c in profile["columns"]}
+
+
+def chunked(df, size):
+    return (df.iloc[i:i + size] for i in range(0, len(df), size))
+
+
+def test_exact_stats_and_null_ratio():
+    df = pd.DataFrame({"x": [3, 1, None, 7, 5], "name": ["a", "b", "a", None, "a"]})
+    profile = profile_chunks([df], nbytes=123)
+    assert (profile["rows"], profile["bytes"], profile["column_count"]) == (5, 123, 2)
+
+    x, name = columns(profile)["x"], columns(profile)["name"]
+    assert (x["type"], x["nulls"], x["null_ratio"], x["min"], x["max"]) == ("float", 1, 0.2, 1.0, 7.0)
+    assert (x["distinct"], x["distinct_exact"]) == (4, True)
+    assert name["type"] == "string"
+    assert name["top_values"][0] == ["a", 3]
+
+
+def test_distinct_is_exact_below_the_sketch_size():
+    df = pd.DataFrame({"v": np.arange(PROFILE_SKETCH_SIZE - 1) % 500})
+    v = columns(profile_chunks(chunked(df, 100)))["v"]
+    assert (v["distinct"], v["distinct_exact"]) == (500, True)
+
+
+def test_distinct_estimate_for_many_values():
+    n = 100_000
+    df = pd.DataFrame({"id": np.arange(n), "label": [f"user-{i}" for i in range(n)]})
+    for column in columns(profile_chunks(chunked(df, 7_000))).values():
+        assert not column["distinct_exact"]
+        assert abs(column["distinct"] - n) / n < 0.1
+    assert "top_values" not in columns(profile_chunks([df]))["label"]   # id-like
+
+
+def test_histogram_covers_min_to_max_and_every_row():
+    values = np.random.default_rng(1).normal(size=50_000)
+    values[::10] = np.nan
+    h = columns(profile_chunks(chunked(pd.DataFrame({"v": values}), 4_000)))["v"]
+    hist = h["histogram"]
+    assert len(hist["counts"]) == DatasetProfile.PROFILE_BINS
+    assert hist["edges"][0] == pytest.approx(np.nanmin(values), abs=1e-6)
+    assert hist["edges"][-1] == pytest.approx(np.nanmax(values), abs=1e-6)
+    assert sum(hist["counts"]) == pytest.approx(45_000, rel=0.001)
+
+
+def test_types_merge_across_chunks():
+    chunks = [
+        pd.DataFrame({"n": [1, 2], "flag": [True, None], "mixed": [1, 2], "empty": [None, None]}),
+        pd.DataFrame({"n": [2.5, None], "flag": [False, True], "mixed": ["a", "b"], "empty": [None, None]}),
+    ]
+    types = {name: c["type"] for name, c in columns(profile_chunks(chunks)).items()}
+    assert types == {"n": "float", "flag": "boolean", "mixed": "string", "empty": "empty"}
+
+
+def test_profile_csv_streams_in_chunks(monkeypatch):
+    monkeypatch.setattr(DatasetProfile, "PROFILE_CHUNK_ROWS", 10)
+    raw = "id,city\n" + "".join(f"{i},{'Paris' if i % 3 else 'Oslo'}\n" for i in range(95))
+    one_pass = profile_csv(raw.encode())
+    whole = profile_chunks([pd.read_csv(io.StringIO(raw))], len(raw))
+    for profile in (one_pass, whole):
+        profile.pop("profiled_at")
+    assert one_pass == whole
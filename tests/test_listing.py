@@ -0,0 +1,148 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+pytest.importorskip("aiosqlite")
+
+import CRUD
+import main
+from CRUD import bump_folder_version, decode_cursor, encode_cursor, folder_version
+from models import File, Folder
+
+# not all digits: SQLite would store the hex as a number
+PARENT = uuid.UUID("aaaaaaaa-aaaa-4aaa-aaaa-aaaaaaaaaaaa")
+OTHER = uuid.UUID("bbbbbbbb-bbbb-4bbb-bbbb-bbbbbbbbbbbb")
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+# ---------------------------------------------------------
+# Cursors
+# ---------------------------------------------------------
+def test_cursor_round_trip():
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor("created_at", T0, row_id), "created_at") == (T0, row_id)
+    assert decode_cursor(encode_cursor("-name", "b.csv", row_id), "-name") == ("b.csv", row_id)
+
+
+def _raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor, sort", [
+    ("not base64 !", "created_at"),
+    (_raw_cursor(["created_at", None, str(uuid.uuid4())]), "created_at"),
+    (_raw_cursor(["created_at", "yesterday", str(uuid.uuid4())]), "created_at"),
+    (_raw_cursor(["name", 5, str(uuid.uuid4())]), "name"),
+    (_raw_cursor(["name", "a", "not-a-uuid"]), "name"),
+])
+def test_invalid_cursor(cursor, sort):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, sort)
+
+
+def test_cursor_for_another_sort():
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_cursor(encode_cursor("name", "a", uuid.uuid4()), "created_at")
+
+
+# ---------------------------------------------------------
+# Folder versions
+# ---------------------------------------------------------
+def test_cold_folder_version_depends_on_the_folder_only(monkeypatch):
+    monkeypatch.setattr(CRUD, "FOLDER_VERSIONS_SIZE", 2)
+    monkeypatch.setattr(CRUD, "_FOLDER_VERSIONS", CRUD.OrderedDict())
+    cold = uuid.uuid4()
+    assert folder_version(cold) == 0
+
+    hot = uuid.uuid4()
+    bump_folder_version(hot)
+    assert folder_version(hot) > 0
+    for _ in range(3):
+        bump_folder_version(uuid.uuid4())
+    assert folder_version(hot) == 0   # evicted: back to cold
+    assert folder_version(cold) == 0  # other folders' writes don't move it
+
+
+# ---------------------------------------------------------
+# /folders and /files over SQLite
+# ---------------------------------------------------------
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'listing.db'}"
+    sync_engine = create_engine(url)
+    Folder.__table__.create(sync_engine)
+    File.__table__.create(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(insert(Folder.__table__), [
+            {"id": uuid.uuid4(), "name": f"f{i}", "parent_id": PARENT, "created_at": T0 + timedelta(minutes=i)}
+            for i in range(5)
+        ])
+        conn.execute(insert(Folder.__table__), [
+            {"id": uuid.uuid4(), "name": "other", "parent_id": OTHER, "created_at": T0},
+        ])
+
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    monkeypatch.setattr(CRUD, "AsyncSessionLocal",
+                        sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False))
+    monkeypatch.setattr(CRUD, "_FOLDER_VERSIONS", CRUD.OrderedDict())
+    client = TestClient(main.app)
+    client.sync_engine = sync_engine
+    return client
+
+
+def _names(response):
+    return [row["name"] for row in response.json()["folders"]]
+
+
+def test_keyset_pages_cover_the_folder_once(client):
+    names, cursor = [], None
+    while True:
+        response = client.post("/folders", json={
+            "current_folder_id": str(PARENT), "limit": 2, "cursor": cursor, "sort": "-created_at",
+        })
+        assert response.status_code == 200
+        names += _names(response)
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+    assert names == ["f4", "f3", "f2", "f1", "f0"]
+
+
+def test_bad_cursor_is_a_400(client):
+    response = client.post("/folders", json={"current_folder_id": str(PARENT), "limit": 2, "cursor": "x"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("limit", [None, 2])
+def test_etag_and_304(client, limit):
+    body = {"current_folder_id": str(PARENT), "limit": limit, "sort": "-created_at"}
+    first = client.post("/folders", json=body)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    again = client.post("/folders", json=body, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+    # a write to another folder doesn't change this one's ETag
+    bump_folder_version(OTHER)
+    assert client.post("/folders", json=body, headers={"If-None-Match": etag}).status_code == 304
+
+    # a new folder, listed first, changes it
+    with client.sync_engine.begin() as conn:
+        conn.execute(insert(Folder.__table__), [{
+            "id": uuid.uuid4(), "name": "new", "parent_id": PARENT, "created_at": T0 + timedelta(days=1),
+        }])
+    bump_folder_version(PARENT)
+    changed = client.post("/folders", json=body, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert _names(changed)[0] == "new"
@@ -0,0 +1,88 @@
+import pytest
+
+import LLMCache
+from LLMCache import MemoryLLMCache, SQLiteLLMCache, make_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds=1.0):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(LLMCache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**limits):
+        limits = {"ttl": 60, "max_entries": 1000, "max_bytes": 10 ** 6, **limits}
+        if request.param == "memory":
+            return MemoryLLMCache(**limits)
+        return SQLiteLLMCache(path=str(tmp_path / "cache.sqlite3"), **limits)
+    return make
+
+
+def test_make_key_is_order_independent():
+    assert make_key(a=1, b=[1, 2]) == make_key(b=[1, 2], a=1)
+    assert make_key(a=1) != make_key(a=2)
+
+
+def test_hit_miss_and_ttl(make_cache, clock):
+    cache = make_cache(ttl=60)
+    assert cache.get("k") is None
+    cache.set("k", "v")
+    clock.tick(59)
+    assert cache.get("k") == "v"
+    clock.tick(2)
+    assert cache.get("k") is None   # expired, and dropped
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses, cache.sets) == (1, 2, 1)
+
+
+def test_least_recently_used_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=10)
+    for i in range(10):
+        cache.set(f"k{i}", "v")
+        clock.tick()
+    assert cache.get("k0") == "v"   # now the most recently used
+    clock.tick()
+    cache.set("k10", "v")
+
+    assert cache.get("k0") == "v"
+    assert cache.get("k1") is None
+    assert cache.get("k10") == "v"
+    assert cache.stats()["entries"] <= 10
+    assert cache.evictions >= 1
+
+
+def test_byte_limit(make_cache, clock):
+    cache = make_cache(max_bytes=100)
+    for i in range(5):
+        cache.set(f"k{i}", "x" * 30)
+        clock.tick()
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("k4") == "x" * 30
+    assert cache.get("k0") is None
+
+
+def test_sqlite_evicts_in_batches(tmp_path, clock):
+    cache = SQLiteLLMCache(path=str(tmp_path / "cache.sqlite3"), ttl=3600, max_entries=100, max_bytes=10 ** 6)
+    for i in range(101):
+        cache.set(f"k{i}", "v")
+        clock.tick()
+    # one eviction pass takes the cache down to LLM_CACHE_EVICT_TO of the limit
+    assert cache.stats()["entries"] == int(100 * LLMCache.LLM_CACHE_EVICT_TO)
+    for i in range(9):
+        cache.set(f"more{i}", "v")
+        clock.tick()
+    assert cache.evictions == 11   # no eviction until the limit is crossed again
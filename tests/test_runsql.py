@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import create_engine
+
+import RunSQL
+from RunSQL import split_statements
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("select 1", ["select 1"]),
+    ("select 1;", ["select 1"]),
+    ("create table t (a int); select * from t", ["create table t (a int)", "select * from t"]),
+    ("select 'a;b'; select 2", ["select 'a;b'", "select 2"]),
+    ("select 'it''s;'", ["select 'it''s;'"]),
+    ("select E'x\\';y'; select 4", ["select E'x\\';y'", "select 4"]),
+    ('select 1 as "a;b"', ['select 1 as "a;b"']),
+    ("select 1 -- c;x\n; select 2", ["select 1 -- c;x", "select 2"]),
+    ("select /* ; */ 1; /* only a comment */", ["select /* ; */ 1"]),
+    ("do $$ begin perform 1; end $$; select 7", ["do $$ begin perform 1; end $$", "select 7"]),
+    (" ; ; ", []),
+])
+def test_split_statements(query, expected):
+    assert split_statements(query) == expected
+
+
+def test_run_sql_limited_returns_the_last_statement(monkeypatch):
+    monkeypatch.setattr(RunSQL, "engine", create_engine("sqlite://"))
+    out = RunSQL.run_sql_limited(
+        "create table t (a int); insert into t values (1), (2), (3); select a from t order by a",
+        max_rows=2,
+    )
+    assert out == {"columns": ["a"], "rows": [[1], [2]], "truncated": True}
+
+
+@pytest.mark.parametrize("query, streamed", [
+    ("select * from t", True),
+    ("  (select 1) union (select 2)", True),
+    ("with x as (select 1) select * from x", True),
+    ("-- recent first\nWITH x AS (SELECT 1) SELECT * FROM x", True),
+    ("/* c */ values (1), (2)", True),
+    ("with x as (delete from t returning *) select * from x", False),
+    ("select * into t2 from t", False),
+    ("insert into t values (1) returning *", False),
+    ("show search_path", False),
+])
+def test_streamable(query, streamed):
+    assert RunSQL._streamable(query) is streamed
@@ -0,0 +1,63 @@
+from ToolOutput import (
+    AI_MAX_COLUMNS, client_sql_rows, render_table, shape_tool_output, truncate_text,
+)
+from Tokens import count_tokens
+
+
+def test_small_result_is_shown_whole():
+    out = render_table(["id", "name"], [[1, "a"], [2, None]])
+    assert out.splitlines() == ["id | name", "1 | a", "2 | NULL", "(2 rows)"]
+
+
+def test_row_cap_and_truncated_result():
+    rows = [[i] for i in range(100)]
+    out = render_table(["id"], rows, truncated=True, row_cap=10)
+    assert out.splitlines()[-1] == "(showing 10 of 100+ rows)"
+    assert out.splitlines()[1:-1] == [str(i) for i in range(10)]
+
+
+def test_token_budget_stops_rows():
+    rows = [["word " * 20] for _ in range(50)]
+    out = render_table(["text"], rows, row_cap=50, token_budget=200)
+    assert count_tokens(out) <= 200 + count_tokens(out.splitlines()[-1])
+    assert "(showing" in out.splitlines()[-1]
+
+
+def test_wide_results_hide_columns_and_cells_are_clipped():
+    columns = [f"c{i}" for i in range(AI_MAX_COLUMNS + 5)]
+    out = render_table(columns, [["x" * 500] * len(columns)])
+    header, row = out.splitlines()[:2]
+    assert header.endswith("… (+5 more columns)")
+    cells = row.split(" | ")
+    assert len(cells) == AI_MAX_COLUMNS
+    assert all(len(cell) < 500 and cell.endswith("…") for cell in cells)
+
+
+def test_cells_cannot_break_the_table():
+    out = render_table(["a"], [["x|y\nz"]])
+    assert out.splitlines()[1] == "x/y\\nz"
+
+
+def test_truncate_text_keeps_head_and_tail():
+    assert truncate_text("short", 100) == "short"
+    text = "HEAD " + "x" * 10_000 + " TAIL"
+    out = truncate_text(text, 100)
+    assert out.startswith("HEAD") and out.endswith("TAIL")
+    assert "characters omitted" in out
+    assert len(out) < 1000
+
+
+def test_python_output_never_includes_images():
+    out = shape_tool_output("Run_Python", {"output": "done", "images": ["iVBORw0KGgo" * 1000]})
+    assert out == "stdout:\ndone\n[1 image(s) returned to the user]"
+    assert shape_tool_output("Run_Python", {}) == "(no output)"
+
+
+def test_sql_error_text_is_passed_through():
+    assert shape_tool_output("Run_SQL", "SQL error: boom") == "SQL error: boom"
+
+
+def test_client_gets_every_fetched_row():
+    rows = [[i] for i in range(1000)]
+    assert client_sql_rows({"columns": ["id"], "rows": rows, "truncated": False}) is rows
+    assert client_sql_rows("SQL error: boom") == "SQL error: boom"